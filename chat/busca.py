@@ -0,0 +1,159 @@
+# chat/busca.py
+"""
+Busca no histórico do chat e salto para uma mensagem.
+
+No PostgreSQL usa a coluna `busca` (tsvector na configuração chat_portugues
+= português sem acentos, índice GIN, ver migração 0006): websearch_to_tsquery ("nota 1234", -cancelada, "rua x"),
+resultados por relevância com trecho destacado. Em outros bancos (testes em
+SQLite) cai num icontains, do mais novo para o mais antigo.
+
+Paginação por cursor "<rank>:<id>" (keyset em rank desc, id desc): a página
+seguinte não depende de OFFSET nem muda se chegarem mensagens novas.
+
+Só a tabela quente entra na busca; mensagens já arquivadas (chat/retencao.py)
+continuam acessíveis pelo "carregar mensagens antigas" da conversa.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.utils.html import escape
+
+from .models import Mensagem
+
+CONFIG = "chat_portugues"
+POR_PAGINA = 20
+RAIO = 25                      # mensagens de cada lado no salto
+MIN_CARACTERES = 2
+# marcadores do ts_headline, trocados por <mark> depois do escape
+_INICIO, _FIM = "\ue000", "\ue001"
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _da_pessoa(usuario_id, com=None):
+    if com is None:
+        return Mensagem.objects.filter(Q(remetente_id=usuario_id) | Q(destinatario_id=usuario_id))
+    return Mensagem.objects.filter(
+        Q(remetente_id=usuario_id, destinatario_id=com) | Q(remetente_id=com, destinatario_id=usuario_id)
+    )
+
+
+def _ler_cursor(cursor):
+    try:
+        rank, ident = cursor.split(":")
+        return float(rank), int(ident)
+    except ValueError:
+        raise CursorInvalido(cursor)
+
+
+def _destacar(texto, termo):
+    """Trecho sem ts_headline: escapa e marca as palavras da busca."""
+    palavras = [re.escape(p) for p in re.findall(r"\w+", termo) if len(p) >= MIN_CARACTERES]
+    texto = escape(texto[:300])
+    if not palavras:
+        return texto
+    return re.sub(f"({'|'.join(palavras)})", r"<mark>\1</mark>", texto, flags=re.IGNORECASE)
+
+
+def pesquisar(usuario_id, termo, com=None, cursor=None, por_pagina=POR_PAGINA):
+    """
+    Mensagens de `usuario_id` (com `com`, se informado) que batem com `termo`.
+    Devolve {"resultados": [...], "proximo": cursor da página seguinte ou None}.
+    Levanta CursorInvalido.
+    """
+    termo = (termo or "").strip()
+    if len(termo) < MIN_CARACTERES:
+        return {"resultados": [], "proximo": None}
+
+    qs = _da_pessoa(usuario_id, com)
+    postgres = connection.vendor == "postgresql"
+    if postgres:
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+        consulta = SearchQuery(termo, config=CONFIG, search_type="websearch")
+        vetor = RawSQL(f"{Mensagem._meta.db_table}.busca", [], output_field=SearchVectorField())
+        # ts_rank é real; em double o valor volta igual no cursor e a comparação bate
+        rank = Cast(SearchRank(vetor, consulta), FloatField())
+        qs = qs.annotate(vetor=vetor).filter(vetor=consulta).annotate(rank=rank)
+    else:
+        qs = qs.filter(conteudo__icontains=termo).annotate(rank=Value(0.0, output_field=FloatField()))
+
+    if cursor:
+        rank, ident = _ler_cursor(cursor)
+        qs = qs.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=ident))
+
+    pagina = list(
+        qs.order_by("-rank", "-id")
+        .select_related("remetente", "destinatario")
+        .only("id", "conteudo", "timestamp", "remetente__username", "destinatario__username")[:por_pagina + 1]
+    )
+    proximo = None
+    if len(pagina) > por_pagina:
+        pagina = pagina[:por_pagina]
+        proximo = f"{pagina[-1].rank!r}:{pagina[-1].id}"
+
+    # ts_headline é caro: só para a página, numa segunda consulta
+    trechos = {}
+    if postgres and pagina:
+        from django.contrib.postgres.search import SearchHeadline
+
+        trechos = dict(
+            Mensagem.objects.filter(id__in=[m.id for m in pagina])
+            .annotate(trecho=SearchHeadline(
+                "conteudo", consulta, config=CONFIG, start_sel=_INICIO, stop_sel=_FIM,
+                max_words=25, min_words=10, max_fragments=2,
+            ))
+            .values_list("id", "trecho")
+        )
+
+    resultados = []
+    for m in pagina:
+        outro = m.destinatario if m.remetente_id == usuario_id else m.remetente
+        if m.id in trechos:
+            trecho = escape(trechos[m.id]).replace(_INICIO, "<mark>").replace(_FIM, "</mark>")
+        else:
+            trecho = _destacar(m.conteudo or "", termo)
+        resultados.append({
+            "id": m.id,
+            "trecho": trecho,
+            "timestamp": m.timestamp.isoformat(),
+            "remetente_id": m.remetente_id,
+            "com_id": outro.id,
+            "com_username": outro.username,
+            "rank": m.rank,
+        })
+    return {"resultados": resultados, "proximo": proximo}
+
+
+def ao_redor(usuario_id, mensagem_id, raio=RAIO):
+    """
+    A mensagem e até `raio` de cada lado na mesma conversa, em ordem
+    cronológica, ou None se ela não existe ou não é da pessoa. Devolve
+    {"alvo", "com_id", "mensagens", "mais_antigas", "mais_novas"}.
+    """
+    alvo = _da_pessoa(usuario_id).select_related("remetente").filter(id=mensagem_id).first()
+    if alvo is None:
+        return None
+    com = alvo.destinatario_id if alvo.remetente_id == usuario_id else alvo.remetente_id
+    conversa = _da_pessoa(usuario_id, com).select_related("remetente")
+
+    antes = list(
+        conversa.filter(Q(timestamp__lt=alvo.timestamp) | Q(timestamp=alvo.timestamp, id__lt=alvo.id))
+        .order_by("-timestamp", "-id")[:raio + 1]
+    )
+    depois = list(
+        conversa.filter(Q(timestamp__gt=alvo.timestamp) | Q(timestamp=alvo.timestamp, id__gt=alvo.id))
+        .order_by("timestamp", "id")[:raio + 1]
+    )
+    return {
+        "alvo": alvo.id,
+        "com_id": com,
+        "mensagens": antes[:raio][::-1] + [alvo] + depois[:raio],
+        "mais_antigas": len(antes) > raio,
+        "mais_novas": len(depois) > raio,
+    }
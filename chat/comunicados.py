@@ -0,0 +1,123 @@
+# chat/comunicados.py
+"""
+Comunicados: uma mensagem para um grupo inteiro (todos os motoboys, todas as
+lojas). Em vez de uma Mensagem por pessoa, uma linha em Comunicado aponta
+para o auth.Group e quem recebe é quem está no grupo. A leitura é por
+pessoa (LeituraComunicado), gravada quando ela abre os comunicados.
+Enviar para 300 motoboys é um INSERT e um group_send.
+
+Entrega em tempo real: cada conexão do ChatConsumer entra no grupo do
+Channels grupo_<id> de cada grupo do usuário. Quem entrou no grupo depois do
+comunicado (EntradaGrupo) não o recebe nem conta como destinatário.
+"""
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from rotas.tarefas import avisar_grupo
+
+from .models import Comunicado, EntradaGrupo, LeituraComunicado
+
+GRUPOS_DESTINO = ("Motoboy", "Loja", "Operador")
+GRUPOS_REMETENTE = ("AdminInterno", "Operador")
+POR_PAGINA = 50
+
+
+def canal(grupo_id):
+    return f"grupo_{grupo_id}"
+
+
+def pode_enviar(user):
+    return user.is_superuser or user.groups.filter(name__in=GRUPOS_REMETENTE).exists()
+
+
+def grupos_destino():
+    return Group.objects.filter(name__in=GRUPOS_DESTINO).order_by("name")
+
+
+def _no_grupo(user):
+    # estava no grupo quando o comunicado saiu
+    return Exists(EntradaGrupo.objects.filter(
+        usuario=user, grupo=OuterRef("grupo_id"), entrou_em__lte=OuterRef("criado_em"),
+    ))
+
+
+def _recebidos(user):
+    return Comunicado.objects.filter(_no_grupo(user))
+
+
+def nao_lidos(user):
+    return _recebidos(user).exclude(remetente=user).exclude(leituras__usuario=user)
+
+
+def serializar(c):
+    return {
+        "id": c.id,
+        "conteudo": c.conteudo,
+        "remetente_id": c.remetente_id,
+        "remetente__username": c.remetente.username,
+        "grupo_id": c.grupo_id,
+        "grupo": c.grupo.name,
+        "timestamp": c.criado_em.isoformat(),
+    }
+
+
+def enviar(remetente, grupo, conteudo):
+    """Grava o comunicado e, no commit, manda para as conexões do grupo."""
+    with transaction.atomic():
+        c = Comunicado.objects.create(remetente=remetente, grupo=grupo, conteudo=conteudo)
+        avisar_grupo.enfileirar(canal(grupo.id), {"type": "chat_comunicado", "comunicado": serializar(c)})
+    return c
+
+
+def listar(user, antes=None, por_pagina=POR_PAGINA):
+    """
+    Recebidos e enviados por `user`, do mais novo para o mais antigo, com
+    "lido" e, nos que ele enviou, "lidos" de "destinatarios". Consultas
+    constantes, qualquer que seja o tamanho do grupo.
+    """
+    # destinatários: quem já estava no grupo quando saiu o comunicado, menos quem enviou
+    membros = (
+        EntradaGrupo.objects
+        .filter(grupo=OuterRef("grupo_id"), entrou_em__lte=OuterRef("criado_em"))
+        .exclude(usuario=OuterRef("remetente_id"))
+        .values("grupo").annotate(n=Count("id")).values("n")
+    )
+    leituras = (
+        LeituraComunicado.objects.filter(comunicado=OuterRef("pk"))
+        .values("comunicado").annotate(n=Count("id")).values("n")
+    )
+    qs = (
+        Comunicado.objects
+        .filter(_no_grupo(user) | Q(remetente=user))
+        .select_related("remetente", "grupo")
+        .annotate(
+            lido=Exists(LeituraComunicado.objects.filter(comunicado=OuterRef("pk"), usuario=user)),
+            lidos=Coalesce(Subquery(leituras), 0),
+            destinatarios=Coalesce(Subquery(membros), 0),
+        )
+        .order_by("-criado_em", "-id")
+    )
+    if antes:
+        qs = qs.filter(id__lt=antes)
+
+    resultado = []
+    for c in qs[:por_pagina]:
+        item = serializar(c)
+        proprio = c.remetente_id == user.id
+        item["lido"] = proprio or c.lido
+        if proprio:
+            item["lidos"] = c.lidos
+            item["destinatarios"] = c.destinatarios
+        resultado.append(item)
+    return resultado
+
+
+def marcar_lidos(user):
+    """Marca como lidos todos os comunicados recebidos ainda não lidos. Devolve quantos."""
+    ids = list(nao_lidos(user).values_list("id", flat=True))
+    LeituraComunicado.objects.bulk_create(
+        [LeituraComunicado(comunicado_id=i, usuario=user) for i in ids], ignore_conflicts=True
+    )
+    return len(ids)
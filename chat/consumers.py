@@ -1,19 +1,139 @@
 import json
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.contrib.auth.models import Group
+
+from . import comunicados, presenca
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    ws/chat/<id>/
+
+    Mensagens e notificações chegam pelo grupo user_<id>; comunicados, por
+    grupo_<id> de cada grupo do usuário ({"tipo": "comunicado", ...}, ver
+    chat/comunicados.py). O cliente manda:
+    - {"tipo": "ping"} a cada presenca.PING segundos (mantém online e
+      confere se o contato da conversa aberta venceu sem desconectar);
+    - {"tipo": "abrir", "com": <id>|null} ao trocar de conversa: passa a
+      receber a presença desse contato ({"tipo": "presenca", ...});
+    - {"tipo": "digitando", "digitando": bool}: vai só para as abas do
+      contato que estão com esta conversa aberta.
+    Presença e "digitando" não tocam no banco (ver chat/presenca.py).
+    """
+
     async def connect(self):
-        self.meu_id = self.scope['user'].id
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        self.meu_id = user.id
+        self.conversa = None
+        self.conversa_online = False
         # Usamos o grupo do usuário logado para centralizar tudo (mensagens e notificações)
         self.user_group = f'user_{self.meu_id}'
 
+        self.grupos = [comunicados.canal(g) for g in await database_sync_to_async(self._grupos)(self.meu_id)]
+
         await self.channel_layer.group_add(self.user_group, self.channel_name)
+        for grupo in self.grupos:
+            await self.channel_layer.group_add(grupo, self.channel_name)
         await self.accept()
+        await self._renovar()
+
+    @staticmethod
+    def _grupos(usuario_id):
+        return list(Group.objects.filter(user__id=usuario_id).values_list('id', flat=True))
 
     async def disconnect(self, close_code):
+        if not hasattr(self, 'meu_id'):
+            return
         await self.channel_layer.group_discard(self.user_group, self.channel_name)
+        for grupo in self.grupos:
+            await self.channel_layer.group_discard(grupo, self.channel_name)
+        await self._abrir(None)
+        if await sync_to_async(presenca.desconectar)(self.meu_id, self.channel_name):
+            await self._avisar_presenca(False)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or "")
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+
+        tipo = data.get('tipo')
+        if tipo == 'ping':
+            await self._renovar()
+            await self._conferir_conversa()
+        elif tipo == 'abrir':
+            try:
+                com = int(data['com']) if data.get('com') else None
+            except (TypeError, ValueError):
+                return
+            await self._abrir(com)
+        elif tipo == 'digitando' and self.conversa:
+            await self.channel_layer.group_send(f'user_{self.conversa}', {
+                'type': 'chat_digitando',
+                'de': self.meu_id,
+                'digitando': bool(data.get('digitando', True)),
+            })
+
+    async def _renovar(self):
+        if await sync_to_async(presenca.renovar)(self.meu_id, self.channel_name):
+            await self._avisar_presenca(True)
+
+    async def _conferir_conversa(self):
+        # conexão que caiu sem disconnect só vence no Redis, ninguém avisa a saída:
+        # cada aba que olha o contato descobre no próprio ping
+        if not (self.conversa and self.conversa_online):
+            return
+        estado = await sync_to_async(presenca.online)([self.conversa])
+        if not estado[self.conversa]:
+            await self._enviar_presenca(self.conversa, False)
+
+    async def _enviar_presenca(self, usuario_id, online):
+        self.conversa_online = online
+        await self.send(text_data=json.dumps({'tipo': 'presenca', 'usuario_id': usuario_id, 'online': online}))
+
+    async def _avisar_presenca(self, online):
+        await self.channel_layer.group_send(presenca.grupo(self.meu_id), {
+            'type': 'chat_presenca', 'usuario_id': self.meu_id, 'online': online,
+        })
+
+    async def _abrir(self, com):
+        if com == self.conversa:
+            return
+        if self.conversa:
+            await self.channel_layer.group_discard(presenca.grupo(self.conversa), self.channel_name)
+        self.conversa = com
+        if com:
+            await self.channel_layer.group_add(presenca.grupo(com), self.channel_name)
+            estado = await sync_to_async(presenca.online)([com])
+            await self._enviar_presenca(com, estado[com])
 
     # ESSA FUNÇÃO É ESSENCIAL: Ela recebe o sinal da View e envia para o JS
     async def chat_message(self, event):
         message = event['message']
-        await self.send(text_data=json.dumps(message))
\ No newline at end of file
+        await self.send(text_data=json.dumps(message))
+
+    async def chat_presenca(self, event):
+        # a saída pode já ter sido vista no ping (conexão vencida): não repete
+        if event['usuario_id'] != self.conversa or event['online'] == self.conversa_online:
+            return
+        await self._enviar_presenca(event['usuario_id'], event['online'])
+
+    async def chat_digitando(self, event):
+        # a mesma pessoa pode ter várias abas: só a que está nesta conversa mostra
+        if event['de'] != self.conversa:
+            return
+        await self.send(text_data=json.dumps({
+            'tipo': 'digitando', 'usuario_id': event['de'], 'digitando': event['digitando'],
+        }))
+
+    async def chat_comunicado(self, event):
+        await self.send(text_data=json.dumps({'tipo': 'comunicado', 'comunicado': event['comunicado']}))
@@ -1,7 +1,9 @@
+from . import comunicados
 from .models import Mensagem
 
 def contador_mensagens(request):
     if request.user.is_authenticated:
         contagem = Mensagem.objects.filter(destinatario=request.user, lida=False).count()
-        return {'mensagens_nao_lidas': contagem > 0}
+        # comunicado não lido também acende o aviso do chat
+        return {'mensagens_nao_lidas': contagem > 0 or comunicados.nao_lidos(request.user).exists()}
     return {'mensagens_nao_lidas': False}
\ No newline at end of file
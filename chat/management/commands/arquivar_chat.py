@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from chat import retencao
+
+
+class Command(BaseCommand):
+    help = (
+        "Move as mensagens do chat mais antigas que --dias (padrão CHAT_RETENCAO_DIAS) para o "
+        "arquivo comprimido e os anexos para CHAT_ARQUIVO_FRIO. Pode rodar de novo sem duplicar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=None, help="Idade mínima das mensagens arquivadas.")
+        parser.add_argument("--lote", type=int, default=retencao.LOTE, help="Mensagens por transação.")
+
+    def handle(self, *args, **options):
+        total = {"mensagens": 0, "conversas": 0, "anexos": 0}
+        while True:
+            feito = retencao.arquivar(dias=options["dias"], lote=options["lote"])
+            if not feito["mensagens"]:
+                break
+            for chave, valor in feito.items():
+                total[chave] += valor
+            self.stdout.write(f"lote: {feito['mensagens']} mensagens, {feito['anexos']} anexos")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total['mensagens']} mensagens arquivadas ({total['anexos']} anexos)."
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_alter_mensagem_arquivo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArquivoConversa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('inicio', models.DateTimeField()),
+                ('fim', models.DateTimeField()),
+                ('dados', models.BinaryField()),
+                ('usuario_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('usuario_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario_a', 'usuario_b', 'mes'), name='chat_arquivo_conversa_mes')],
+            },
+        ),
+    ]
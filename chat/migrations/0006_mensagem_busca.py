@@ -0,0 +1,56 @@
+from django.db import DatabaseError, migrations, transaction
+
+# Busca textual do chat (só PostgreSQL): coluna tsvector gerada a partir de
+# conteudo e índice GIN. Gerada pelo próprio banco (STORED), acompanha INSERT
+# e edição sem signal nem trigger. Fica fora do model de propósito: o Django
+# não a lê nem escreve, só chat/busca.py a usa.
+#
+# Configuração chat_portugues = portuguese + unaccent ("transferencia" acha
+# "transferência"). Sem a extensão unaccent no servidor, vira uma cópia do
+# portuguese (com acento); para ganhar depois: CREATE EXTENSION unaccent e
+# ALTER TEXT SEARCH CONFIGURATION chat_portugues ... (abaixo) + reindex.
+
+TABELA = "chat_mensagem"
+INDICE = "chat_mensagem_busca_gin"
+CONFIG = "chat_portugues"
+
+
+def criar(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+            schema_editor.execute(f"CREATE TEXT SEARCH CONFIGURATION {CONFIG} (COPY = pg_catalog.portuguese)")
+            schema_editor.execute(
+                f"ALTER TEXT SEARCH CONFIGURATION {CONFIG} "
+                f"ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem"
+            )
+    except DatabaseError:
+        schema_editor.execute(f"CREATE TEXT SEARCH CONFIGURATION {CONFIG} (COPY = pg_catalog.portuguese)")
+
+    schema_editor.execute(
+        f"ALTER TABLE {TABELA} ADD COLUMN busca tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{CONFIG}', coalesce(conteudo, ''))) STORED"
+    )
+    schema_editor.execute(f"CREATE INDEX {INDICE} ON {TABELA} USING gin (busca)")
+
+
+def remover(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDICE}")
+    schema_editor.execute(f"ALTER TABLE {TABELA} DROP COLUMN IF EXISTS busca")
+    schema_editor.execute(f"DROP TEXT SEARCH CONFIGURATION IF EXISTS {CONFIG}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_arquivoconversa'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar, remover),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('chat', '0006_mensagem_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Comunicado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conteudo', models.TextField()),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('grupo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comunicados', to='auth.group')),
+                ('remetente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comunicados_enviados', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-criado_em'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeituraComunicado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lida_em', models.DateTimeField(auto_now_add=True)),
+                ('comunicado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leituras', to='chat.comunicado')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='comunicado',
+            index=models.Index(fields=['grupo', '-criado_em'], name='chat_comunicado_grupo_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='leituracomunicado',
+            constraint=models.UniqueConstraint(fields=('comunicado', 'usuario'), name='chat_leitura_comunicado_unica'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:43
+
+import gzip
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def indexar_anexos(apps, schema_editor):
+    # meses já arquivados: os nomes até aqui só existiam dentro do JSON comprimido
+    ArquivoConversa = apps.get_model("chat", "ArquivoConversa")
+    AnexoArquivado = apps.get_model("chat", "AnexoArquivado")
+    for arquivo in ArquivoConversa.objects.iterator(chunk_size=4):
+        registros = json.loads(gzip.decompress(bytes(arquivo.dados)))
+        AnexoArquivado.objects.bulk_create(
+            [AnexoArquivado(arquivo=arquivo, nome=r["anexo"]) for r in registros if r.get("anexo")],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_comunicado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnexoArquivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(db_index=True, max_length=255)),
+                ('arquivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anexos', to='chat.arquivoconversa')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('arquivo', 'nome'), name='chat_anexo_arquivado_unico')],
+            },
+        ),
+        migrations.RunPython(indexar_anexos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def entradas_existentes(apps, schema_editor):
+    # a data real de entrada não existe: quem já está no grupo conta desde o cadastro
+    User = apps.get_model("auth", "User")
+    EntradaGrupo = apps.get_model("chat", "EntradaGrupo")
+    membros = User.groups.through.objects.values_list("user_id", "group_id", "user__date_joined")
+    EntradaGrupo.objects.bulk_create(
+        [EntradaGrupo(usuario_id=u, grupo_id=g, entrou_em=quando) for u, g, quando in membros.iterator()],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('chat', '0008_anexoarquivado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntradaGrupo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entrou_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('grupo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auth.group')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['grupo', 'entrou_em'], name='chat_entrada_grupo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'grupo'), name='chat_entrada_grupo_unica')],
+            },
+        ),
+        migrations.RunPython(entradas_existentes, migrations.RunPython.noop),
+    ]
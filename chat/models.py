@@ -1,9 +1,8 @@
 from django.db import models
-from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from django.utils import timezone
 
 class Mensagem(models.Model):
     remetente = models.ForeignKey(User, on_delete=models.CASCADE, related_name='enviadas')
@@ -20,11 +19,110 @@ class Mensagem(models.Model):
 
     def __str__(self):
         return f"{self.remetente} -> {self.destinatario}: {self.conteudo[:20]}"
-    
+
+
+class ArquivoConversa(models.Model):
+    """
+    Mensagens antigas de uma conversa num mês, fora da tabela quente: lista de
+    dicts (formato de buscar_mensagens) em JSON + gzip. Ver chat/retencao.py.
+    """
+    usuario_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')  # menor id
+    usuario_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    mes = models.DateField()
+    quantidade = models.PositiveIntegerField(default=0)
+    inicio = models.DateTimeField()
+    fim = models.DateTimeField()
+    dados = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario_a', 'usuario_b', 'mes'], name='chat_arquivo_conversa_mes'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_a_id}/{self.usuario_b_id} {self.mes:%m/%Y} ({self.quantidade})"
+
+
+class AnexoArquivado(models.Model):
+    # nome (caminho relativo no diretório frio) de cada anexo dentro de um
+    # ArquivoConversa: o download confere a conversa sem descomprimir os meses
+    arquivo = models.ForeignKey(ArquivoConversa, on_delete=models.CASCADE, related_name='anexos')
+    nome = models.CharField(max_length=255, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['arquivo', 'nome'], name='chat_anexo_arquivado_unico'),
+        ]
+
+
+class Comunicado(models.Model):
+    """
+    Mensagem para um grupo inteiro (todos os motoboys, todas as lojas): uma
+    linha só, quem recebe é quem está no grupo. Ver chat/comunicados.py.
+    """
+    remetente = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comunicados_enviados')
+    grupo = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='comunicados')
+    conteudo = models.TextField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['grupo', '-criado_em'], name='chat_comunicado_grupo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.remetente} -> {self.grupo}: {self.conteudo[:20]}"
+
+
+class LeituraComunicado(models.Model):
+    # criada quando a pessoa lê: enviar não gera uma linha por destinatário
+    comunicado = models.ForeignKey(Comunicado, on_delete=models.CASCADE, related_name='leituras')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    lida_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['comunicado', 'usuario'], name='chat_leitura_comunicado_unica'),
+        ]
+
+
+class EntradaGrupo(models.Model):
+    # quando o usuário entrou no grupo (auth não guarda): só recebe os comunicados
+    # de depois. Mantida pelo signal de User.groups logo abaixo.
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    grupo = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='+')
+    entrou_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'grupo'], name='chat_entrada_grupo_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['grupo', 'entrou_em'], name='chat_entrada_grupo_idx'),
+        ]
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def registrar_entrada_grupo(sender, instance, action, reverse, pk_set, **kwargs):
+    # user.groups.add(g) chega com instance=user; group.user_set.add(u), com instance=group
+    if action == 'post_add':
+        pares = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        EntradaGrupo.objects.bulk_create(
+            [EntradaGrupo(usuario_id=u, grupo_id=g) for u, g in pares], ignore_conflicts=True
+        )
+    elif action == 'post_remove':
+        campo = 'usuario_id' if reverse else 'grupo_id'
+        dono = 'grupo_id' if reverse else 'usuario_id'
+        EntradaGrupo.objects.filter(**{dono: instance.pk, f'{campo}__in': pk_set}).delete()
+    elif action == 'post_clear':
+        EntradaGrupo.objects.filter(**{'grupo_id' if reverse else 'usuario_id': instance.pk}).delete()
+
+
 @receiver(post_save, sender=Mensagem) # Certifique-se que o nome do model é Mensagem
 def enviar_mensagem_websocket(sender, instance, created, **kwargs):
     if created:
-        channel_layer = get_channel_layer()
+        from rotas.tarefas import avisar_grupo
         # Ordena os IDs para garantir que a sala seja a mesma para os dois
         ids = sorted([instance.remetente.id, instance.destinatario.id])
         room_group_name = f'chat_{ids[0]}_{ids[1]}'
@@ -38,8 +136,8 @@ def enviar_mensagem_websocket(sender, instance, created, **kwargs):
             'arquivo_url': instance.arquivo.url if instance.arquivo else None,
         }
 
-        # Manda para o Channels
-        async_to_sync(channel_layer.group_send)(
+        # Manda para o Channels (pelo worker, depois do commit)
+        avisar_grupo.enfileirar(
             room_group_name,
             {
                 'type': 'chat_message', # Isso chama o método chat_message no consumers.py
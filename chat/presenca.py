@@ -0,0 +1,90 @@
+# chat/presenca.py
+"""
+Presença (online/offline) do chat, só no Redis: nada é gravado no banco.
+
+Cada conexão do ChatConsumer (aba, celular) é um membro do sorted set
+presenca:<usuario_id> com score = instante em que vence. O cliente manda
+{"tipo": "ping"} a cada PING segundos e a conexão ganha mais TTL segundos;
+a que caiu sem avisar (rede, worker reiniciado) vence sozinha. Online = ao
+menos uma conexão não vencida, em qualquer aba ou aparelho.
+
+Só as transições viram aviso: a primeira conexão viva (entrou) e a saída da
+última (saiu). O consumer manda o aviso para o grupo presenca_<id>, onde
+estão só as conexões com a conversa com <id> aberta. Conexão que vence sem
+disconnect não gera aviso: quem olha o contato confere com `online` a cada
+ping e vê a saída em até PING segundos. A lista de contatos
+consulta todos de uma vez com `online(ids)` (um pipeline, uma ida ao Redis).
+
+Sem Redis todo mundo aparece offline e o chat continua funcionando.
+"""
+import logging
+import time
+
+from redis.exceptions import RedisError
+
+from rotas.services.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+TTL = 60                     # segundos que uma conexão vale sem ping
+PING = 25                    # intervalo do ping no cliente (bem abaixo do TTL)
+MAX_IDS = 500
+
+
+def _chave(usuario_id):
+    return f"presenca:{usuario_id}"
+
+
+def grupo(usuario_id):
+    """Grupo do Channels de quem está com a conversa com `usuario_id` aberta."""
+    return f"presenca_{usuario_id}"
+
+
+def renovar(usuario_id, canal, agora=None):
+    """Registra/renova a conexão `canal`. True se o usuário estava offline."""
+    agora = agora or time.time()
+    chave = _chave(usuario_id)
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.zremrangebyscore(chave, "-inf", agora)
+        pipe.zcard(chave)
+        pipe.zadd(chave, {canal: agora + TTL})
+        pipe.expire(chave, TTL)
+        _, vivas, _, _ = pipe.execute()
+    except RedisError:
+        logger.warning("presenca: Redis indisponível ao registrar %s", usuario_id)
+        return False
+    return vivas == 0
+
+
+def desconectar(usuario_id, canal, agora=None):
+    """Remove a conexão `canal`. True se era a última (o usuário ficou offline)."""
+    agora = agora or time.time()
+    chave = _chave(usuario_id)
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.zrem(chave, canal)
+        pipe.zremrangebyscore(chave, "-inf", agora)
+        pipe.zcard(chave)
+        removida, _, vivas = pipe.execute()
+    except RedisError:
+        logger.warning("presenca: Redis indisponível ao desconectar %s", usuario_id)
+        return False
+    return bool(removida) and vivas == 0
+
+
+def online(ids, agora=None):
+    """{id: True/False} para até MAX_IDS usuários, numa ida só ao Redis."""
+    agora = agora or time.time()
+    ids = list(dict.fromkeys(ids))[:MAX_IDS]
+    if not ids:
+        return {}
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for usuario_id in ids:
+            pipe.zcount(_chave(usuario_id), agora, "+inf")
+        contagens = pipe.execute()
+    except RedisError:
+        logger.warning("presenca: Redis indisponível, todos offline")
+        return {usuario_id: False for usuario_id in ids}
+    return {usuario_id: n > 0 for usuario_id, n in zip(ids, contagens)}
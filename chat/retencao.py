@@ -0,0 +1,186 @@
+# chat/retencao.py
+"""
+Retenção do chat: mensagens com mais de CHAT_RETENCAO_DIAS saem da tabela
+quente (Mensagem) e vão para ArquivoConversa — um registro por conversa e
+mês, com as mensagens em JSON comprimido. Anexos saem de MEDIA_ROOT para
+CHAT_ARQUIVO_FRIO (mesmo caminho relativo) e passam a ser servidos pela view
+chat:anexo_arquivado, só para quem está na conversa (conferido em
+AnexoArquivado, que guarda os nomes fora do JSON comprimido).
+
+Rodar pelo cron: manage.py arquivar_chat. Ordem segura: copia os anexos,
+grava o arquivo e apaga as mensagens na mesma transação, e só depois do
+commit apaga os anexos originais. Deu erro no meio, nada some.
+
+Leitura sob demanda: buscar_mensagens?arquivo=1&antes=<iso>&antes_id=<id> ->
+`historico`.
+"""
+import datetime
+import gzip
+import json
+import os
+import shutil
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AnexoArquivado, ArquivoConversa, Mensagem
+
+LOTE = 2000
+POR_PAGINA = 100
+
+
+def dias_retencao():
+    return getattr(settings, "CHAT_RETENCAO_DIAS", 180)
+
+
+def diretorio_frio():
+    return getattr(settings, "CHAT_ARQUIVO_FRIO", os.path.join(settings.BASE_DIR, "arquivo_frio"))
+
+
+def _comprimir(mensagens):
+    return gzip.compress(json.dumps(mensagens, ensure_ascii=False).encode(), compresslevel=9)
+
+
+def _descomprimir(dados):
+    return json.loads(gzip.decompress(bytes(dados)))
+
+
+def _par(m):
+    return tuple(sorted((m.remetente_id, m.destinatario_id)))
+
+
+def _registro(m):
+    # mesmo formato de buscar_mensagens; "anexo" = caminho relativo no diretório frio
+    return {
+        "id": m.id,
+        "conteudo": m.conteudo or "",
+        "remetente_id": m.remetente_id,
+        "remetente__username": m.remetente.username,
+        "editada": m.editada,
+        "lida": m.lida,
+        "anexo": m.arquivo.name if m.arquivo else None,
+        "timestamp": m.timestamp.isoformat(),
+    }
+
+
+# =========================
+# ARQUIVAR
+# =========================
+def arquivar(dias=None, agora=None, lote=LOTE):
+    """Arquiva um lote de mensagens vencidas. Devolve {"mensagens", "conversas", "anexos"}."""
+    corte = (agora or timezone.now()) - datetime.timedelta(days=dias if dias is not None else dias_retencao())
+    mensagens = list(
+        Mensagem.objects.filter(timestamp__lt=corte).select_related("remetente").order_by("timestamp", "id")[:lote]
+    )
+    if not mensagens:
+        return {"mensagens": 0, "conversas": 0, "anexos": 0}
+
+    grupos = defaultdict(list)
+    for m in mensagens:
+        mes = timezone.localdate(m.timestamp).replace(day=1)
+        grupos[(*_par(m), mes)].append(m)
+
+    # 1) cópia dos anexos (o original só sai depois do commit)
+    frio = diretorio_frio()
+    anexos = [m.arquivo.name for m in mensagens if m.arquivo]
+    for nome in anexos:
+        _copiar_para_frio(nome, frio)
+
+    # 2) arquivo + delete, tudo ou nada
+    with transaction.atomic():
+        for (a, b, mes), msgs in grupos.items():
+            registros = [_registro(m) for m in msgs]
+            arquivo = (
+                ArquivoConversa.objects.select_for_update()
+                .filter(usuario_a_id=a, usuario_b_id=b, mes=mes).first()
+            )
+            if arquivo is None:
+                arquivo = ArquivoConversa(usuario_a_id=a, usuario_b_id=b, mes=mes)
+            else:
+                # reexecução depois de falha não duplica: id da mensagem é a chave
+                novos = {r["id"] for r in registros}
+                registros = [r for r in _descomprimir(arquivo.dados) if r["id"] not in novos] + registros
+            registros.sort(key=lambda r: (r["timestamp"], r["id"]))
+
+            arquivo.dados = _comprimir(registros)
+            arquivo.quantidade = len(registros)
+            arquivo.inicio = parse_datetime(registros[0]["timestamp"])
+            arquivo.fim = parse_datetime(registros[-1]["timestamp"])
+            arquivo.save()
+            AnexoArquivado.objects.bulk_create(
+                [AnexoArquivado(arquivo=arquivo, nome=r["anexo"]) for r in registros if r["anexo"]],
+                ignore_conflicts=True,
+            )
+
+        Mensagem.objects.filter(id__in=[m.id for m in mensagens]).delete()
+        transaction.on_commit(lambda: _apagar_originais(anexos))
+
+    return {"mensagens": len(mensagens), "conversas": len(grupos), "anexos": len(anexos)}
+
+
+def _copiar_para_frio(nome, frio):
+    destino = os.path.join(frio, nome)
+    if os.path.exists(destino) or not default_storage.exists(nome):
+        return
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    with default_storage.open(nome, "rb") as origem, open(destino + ".parcial", "wb") as saida:
+        shutil.copyfileobj(origem, saida)
+    os.replace(destino + ".parcial", destino)
+
+
+def _apagar_originais(nomes):
+    for nome in nomes:
+        default_storage.delete(nome)
+
+
+# =========================
+# LER
+# =========================
+def historico(usuario_id, outro_id, antes, antes_id=None, por_pagina=POR_PAGINA):
+    """
+    Até `por_pagina` mensagens arquivadas da conversa anteriores a (`antes`,
+    `antes_id`) — horário e id da mensagem mais antiga já mostrada —, em ordem
+    cronológica (a página mais recente primeiro). Lista vazia = acabou. O id
+    desempata mensagens com o mesmo horário (mesma ordem do `arquivar`); sem
+    ele, vale só o horário.
+    """
+    a, b = sorted((usuario_id, outro_id))
+    cursor = (antes, antes_id if antes_id is not None else 0)
+    pagina = []
+    arquivos = (
+        ArquivoConversa.objects.filter(usuario_a_id=a, usuario_b_id=b, inicio__lte=antes)
+        .order_by("-mes")
+        .iterator(chunk_size=4)
+    )
+    for arquivo in arquivos:
+        registros = [
+            r for r in _descomprimir(arquivo.dados) if (parse_datetime(r["timestamp"]), r["id"]) < cursor
+        ]
+        pagina = registros[-(por_pagina - len(pagina)):] + pagina
+        if len(pagina) >= por_pagina:
+            break
+
+    for r in pagina:
+        anexo = r.pop("anexo", None)
+        r["arquivo_url"] = reverse("chat:anexo_arquivado", args=[a, b, anexo]) if anexo else None
+        r["arquivada"] = True
+    return pagina
+
+
+def caminho_anexo(usuario_id, a, b, nome):
+    """Caminho no diretório frio, se `usuario_id` está na conversa e o anexo é dela; senão None."""
+    if usuario_id not in (a, b) or a > b:
+        return None
+    frio = os.path.realpath(diretorio_frio())
+    caminho = os.path.realpath(os.path.join(frio, nome))
+    if not caminho.startswith(frio + os.sep) or not os.path.isfile(caminho):
+        return None
+    da_conversa = AnexoArquivado.objects.filter(
+        nome=nome, arquivo__usuario_a_id=a, arquivo__usuario_b_id=b,
+    ).exists()
+    return caminho if da_conversa else None
@@ -0,0 +1,500 @@
+const chatBox = document.getElementById('chat-box');
+
+let wavesurfers = {};
+let mediaRecorder = null;
+let audioChunks = [];
+
+// ===== WEBSOCKET =====
+const wsProtocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+const chatSocket = new WebSocket(`${wsProtocol}${window.location.host}/ws/chat/${MEU_ID}/`);
+
+chatSocket.onopen = () => enviarNoSocket({ tipo: 'abrir', com: destinatarioAtivo });
+
+chatSocket.onmessage = (e) => {
+  const data = JSON.parse(e.data);
+  if (tratarEventoChat(data)) return;
+  if (String(data.remetente_id) === String(destinatarioAtivo)) limparDigitando();
+
+  // Mostra mensagens do destinatário ativo ou minhas
+  if (String(data.remetente_id) === String(destinatarioAtivo) || String(data.remetente_id) === String(MEU_ID)) {
+    adicionarMensagemNaTela(data);
+    if (String(data.remetente_id) === String(destinatarioAtivo)) {
+      fetch(`/chat/marcar-lida/${data.remetente_id}/`);
+    }
+  }
+};
+
+// ===== PRESENÇA E "DIGITANDO" (chat/presenca.py): só WebSocket + Redis, nada no banco =====
+const PRESENCA_PING_MS = 25000;   // presenca.PING
+let presencaOnline = false;
+let digitandoTimer = null;
+let ultimoDigitando = 0;
+
+function enviarNoSocket(dados) {
+  if (chatSocket && chatSocket.readyState === WebSocket.OPEN) chatSocket.send(JSON.stringify(dados));
+}
+
+function mostrarStatus() {
+  const el = document.getElementById('chat-status-usuario');
+  if (!el) return;
+  if (digitandoTimer) {
+    el.textContent = 'digitando...';
+    el.style.color = '#28a745';
+    return;
+  }
+  el.textContent = presencaOnline ? 'Online' : 'Offline';
+  el.style.color = presencaOnline ? '#28a745' : '#999';
+}
+
+function limparDigitando() {
+  clearTimeout(digitandoTimer);
+  digitandoTimer = null;
+  mostrarStatus();
+}
+
+// eventos de presença/digitando/comunicado; false = é mensagem, segue o fluxo normal
+function tratarEventoChat(data) {
+  if (data.tipo === 'comunicado') {
+    if (typeof receberComunicado === 'function') receberComunicado(data.comunicado);
+    return true;
+  }
+  const doAtivo = String(data.usuario_id) === String(destinatarioAtivo);
+  if (data.tipo === 'presenca') {
+    if (doAtivo) { presencaOnline = data.online; mostrarStatus(); }
+    if (typeof marcarPresenca === 'function') marcarPresenca(data.usuario_id, data.online);
+    return true;
+  }
+  if (data.tipo === 'digitando') {
+    if (doAtivo) {
+      clearTimeout(digitandoTimer);
+      digitandoTimer = data.digitando ? setTimeout(limparDigitando, 5000) : null;
+      mostrarStatus();
+    }
+    return true;
+  }
+  return false;
+}
+
+// no máximo um aviso a cada 3s enquanto digita
+function avisarDigitando() {
+  const agora = Date.now();
+  if (agora - ultimoDigitando < 3000) return;
+  ultimoDigitando = agora;
+  enviarNoSocket({ tipo: 'digitando', digitando: true });
+}
+
+function pararDigitando() {
+  if (!ultimoDigitando) return;
+  ultimoDigitando = 0;
+  enviarNoSocket({ tipo: 'digitando', digitando: false });
+}
+
+setInterval(() => enviarNoSocket({ tipo: 'ping' }), PRESENCA_PING_MS);
+document.getElementById('chat-input').addEventListener('input', avisarDigitando);
+
+// ===== CARREGAR HISTÓRICO =====
+// ?mensagem=<id> (resultado da busca): abre só a página ao redor dela
+const mensagemInicial = new URLSearchParams(window.location.search).get('mensagem');
+
+function carregarHistorico() {
+  chatBox.innerHTML = '';
+  fetch(`/chat/buscar/${destinatarioAtivo}/`)
+    .then(res => {
+      const temArquivo = res.headers.get('X-Chat-Arquivo') === '1';
+      return res.json().then(data => {
+        data.forEach(m => adicionarMensagemNaTela(m));
+        if (temArquivo) botaoArquivadas();
+        setTimeout(() => { chatBox.scrollTop = chatBox.scrollHeight; }, 250);
+      });
+    });
+}
+
+if (mensagemInicial) carregarAoRedor(mensagemInicial, carregarHistorico);
+else carregarHistorico();
+
+// ===== SALTO PARA UMA MENSAGEM (busca): só a página ao redor, sem o histórico todo =====
+function carregarAoRedor(mensagemId, aoAbrirConversa) {
+  const box = document.getElementById('chat-box');
+  fetch(`/chat/mensagem/${mensagemId}/contexto/`)
+    .then(res => res.json())
+    .then(pagina => {
+      pagina.mensagens.forEach(m => adicionarMensagemNaTela(m));
+      if (pagina.mais_antigas || pagina.mais_novas) {
+        const btn = document.createElement('button');
+        btn.type = 'button';
+        btn.textContent = 'Ver conversa completa';
+        btn.style.cssText = 'align-self: center; margin: 5px 0 15px; border: none; border-radius: 15px; padding: 6px 14px; background: #e0e0e0; cursor: pointer;';
+        btn.onclick = aoAbrirConversa;
+        box.appendChild(btn);
+      }
+      const alvo = document.getElementById(`msg-${pagina.alvo}`);
+      if (alvo) {
+        alvo.classList.add('msg-destacada');
+        alvo.scrollIntoView({ block: 'center' });
+      }
+    });
+}
+
+// ===== HISTÓRICO ARQUIVADO (chat/retencao.py): sob demanda, do mais novo para o mais antigo =====
+function botaoArquivadas() {
+  const box = document.getElementById('chat-box');
+  const btn = document.createElement('button');
+  btn.type = 'button';
+  btn.textContent = 'Carregar mensagens antigas';
+  btn.style.cssText = 'align-self: center; margin-bottom: 15px; border: none; border-radius: 15px; padding: 6px 14px; background: #e0e0e0; cursor: pointer;';
+  btn.onclick = () => carregarArquivadas(btn);
+  box.prepend(btn);
+}
+
+function carregarArquivadas(btn) {
+  const box = document.getElementById('chat-box');
+  const primeira = box.querySelector('[data-ts]');
+  const antes = primeira ? primeira.dataset.ts : new Date().toISOString();
+  // id desempata mensagens com o mesmo horário na virada da página
+  const antesId = primeira ? primeira.id.slice(4) : '';
+  btn.disabled = true;
+
+  fetch(`/chat/buscar/${destinatarioAtivo}/?arquivo=1&antes=${encodeURIComponent(antes)}&antes_id=${antesId}`)
+    .then(res => res.json())
+    .then(data => {
+      if (!data.length) { btn.remove(); return; }
+      const distanciaDoFim = box.scrollHeight - box.scrollTop;
+      data.slice().reverse().forEach(m => {
+        adicionarMensagemNaTela(m);
+        const el = document.getElementById(`msg-${m.id}`);
+        if (el) box.insertBefore(el, btn.nextSibling);
+      });
+      box.scrollTop = box.scrollHeight - distanciaDoFim;
+      btn.disabled = false;
+    });
+}
+
+function verificarEnter(event) {
+  if (event.key === 'Enter' && !event.shiftKey) {
+    event.preventDefault();
+    enviar();
+  }
+}
+
+// ===== RENDER (igual ao lista.html) =====
+function adicionarMensagemNaTela(m) {
+  if (document.getElementById(`msg-${m.id}`)) return;
+
+  const souEu = String(m.remetente_id) === String(MEU_ID);
+
+  const wrapper = document.createElement('div');
+  wrapper.id = `msg-${m.id}`;
+  if (m.timestamp) wrapper.dataset.ts = m.timestamp;
+  wrapper.style.display = 'flex';
+  wrapper.style.justifyContent = souEu ? 'flex-end' : 'flex-start';
+  wrapper.style.marginBottom = '15px';
+  wrapper.style.position = 'relative';
+
+  const horaExibicao = m.horario || (m.timestamp ? new Date(m.timestamp).toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'}) : "");
+
+  let anexoHtml = '';
+  if (m.arquivo_url) {
+    if (/\.(webm|wav|mp3|ogg|m4a|mp4)$/i.test(m.arquivo_url)) {
+      anexoHtml = `
+        <div class="waveform-container" onclick="event.stopPropagation()">
+          <button class="play-btn" onclick="toggleAudio(${m.id})">
+            <i class="fas fa-play" id="icon-${m.id}"></i>
+          </button>
+          <div id="wave-${m.id}" style="flex: 1; min-width: 160px;"></div>
+        </div>
+      `;
+    } else if (/\.(jpeg|jpg|gif|png|webp)$/i.test(m.arquivo_url)) {
+      anexoHtml = `
+        <img src="${m.arquivo_url}"
+          style="max-width:200px; border-radius:10px; margin-top:5px; cursor:pointer;"
+          onclick="window.open('${m.arquivo_url}')">
+      `;
+    }
+  }
+
+  const menuBtn = (souEu && !m.arquivada) ? `
+    <div style="position:absolute; right:8px; top:5px;">
+      <span class="btn-opcoes" onclick="toggleMenu(event, ${m.id})">⋮</span>
+      <div id="menu-${m.id}" class="chat-menu">
+        <div onclick="prepararEdicao(${m.id})">Editar</div>
+        <div onclick="deletarMsg(${m.id})" style="color:red;">Excluir</div>
+      </div>
+    </div>
+  ` : '';
+
+  const nomeExibicao = souEu ? 'Você' : (m.remetente__username || m.remetente_nome || DESTINATARIO_NOME || 'Usuário');
+  const seloEditada = m.editada ? '<small style="font-size:0.6rem; opacity:0.6; margin-right:5px;">(editada)</small>' : '';
+
+  wrapper.innerHTML = `
+    <div style="
+      max-width:85%;
+      padding:10px 14px;
+      border-radius:15px;
+      background:${souEu ? '#007bff' : 'white'};
+      color:${souEu ? 'white' : '#333'};
+      position:relative;
+      box-shadow:0 1px 3px rgba(0,0,0,0.1);
+    ">
+      ${menuBtn}
+      <small style="opacity:0.7; font-size:0.65rem; display:block; margin-bottom:3px;">
+        ${nomeExibicao}
+      </small>
+
+      <div class="msg-container">
+        <div id="texto-${m.id}" style="white-space: pre-wrap;">${m.conteudo || ''}</div>
+        ${anexoHtml}
+        <div style="display:flex; align-items:center; justify-content:flex-end; margin-top:4px;">
+          ${seloEditada}
+          <span class="msg-horario" style="color:${souEu ? '#e0e0e0' : '#888'}">${horaExibicao}</span>
+        </div>
+      </div>
+    </div>
+  `;
+
+  chatBox.appendChild(wrapper);
+  chatBox.scrollTop = chatBox.scrollHeight;
+
+  // init wavesurfer
+  if (m.arquivo_url && /\.(webm|wav|mp3|ogg|m4a|mp4)$/i.test(m.arquivo_url)) {
+    setTimeout(() => {
+      if (!wavesurfers[m.id]) {
+        wavesurfers[m.id] = WaveSurfer.create({
+          container: `#wave-${m.id}`,
+          waveColor: souEu ? '#80bdff' : '#ccc',
+          progressColor: souEu ? '#fff' : '#007bff',
+          height: 30,
+          barWidth: 2
+        });
+        wavesurfers[m.id].load(m.arquivo_url);
+
+        wavesurfers[m.id].on('play', () => {
+          const ic = document.getElementById(`icon-${m.id}`);
+          if (ic) ic.className = 'fas fa-pause';
+        });
+        wavesurfers[m.id].on('pause', () => {
+          const ic = document.getElementById(`icon-${m.id}`);
+          if (ic) ic.className = 'fas fa-play';
+        });
+        wavesurfers[m.id].on('finish', () => {
+          const ic = document.getElementById(`icon-${m.id}`);
+          if (ic) ic.className = 'fas fa-play';
+        });
+      }
+    }, 150);
+  }
+}
+
+function toggleAudio(id) {
+  if (wavesurfers[id]) wavesurfers[id].playPause();
+}
+
+// ===== MENU (editar/excluir) =====
+function toggleMenu(e, id) {
+  e.stopPropagation();
+  document.querySelectorAll('.chat-menu').forEach(m => m.style.display = 'none');
+  const el = document.getElementById(`menu-${id}`);
+  if (el) el.style.display = 'block';
+}
+
+window.onclick = () => document.querySelectorAll('.chat-menu').forEach(m => m.style.display = 'none');
+
+function deletarMsg(id) {
+  if (!confirm('Deseja realmente excluir esta mensagem?')) return;
+
+  fetch(`/chat/excluir/${id}/`, {
+    method: 'POST',
+    headers: {
+      'X-CSRFToken': CSRF_TOKEN,
+      'Content-Type': 'application/json'
+    }
+  })
+  .then(res => res.json())
+  .then(data => {
+    if (data.status === 'sucesso') {
+      const msgElement = document.getElementById(`msg-${id}`);
+      if (msgElement) msgElement.remove();
+    } else {
+      alert(data.message || 'Erro ao excluir mensagem.');
+    }
+  })
+  .catch(err => console.error("Erro ao excluir:", err));
+}
+
+function prepararEdicao(id) {
+  const textoDiv = document.getElementById(`texto-${id}`);
+  if (!textoDiv) return;
+
+  const conteudoOriginal = textoDiv.innerText;
+
+  textoDiv.innerHTML = `
+    <div id="edit-container-${id}" style="display:flex; gap:5px; margin-top:5px;">
+      <input type="text" id="input-edit-${id}" value="${escapeHtml(conteudoOriginal)}"
+        style="flex:1; border-radius:10px; border:1px solid #ccc; padding:4px 8px; color:#333; font-size:0.85rem;">
+      <button onclick="confirmarEdicao(${id})"
+        style="background:#28a745; color:white; border:none; border-radius:5px; padding:0 8px;">
+        <i class="fas fa-check"></i>
+      </button>
+      <button onclick="cancelarEdicao(${id}, '${escapeJs(conteudoOriginal)}')"
+        style="background:#dc3545; color:white; border:none; border-radius:5px; padding:0 8px;">
+        <i class="fas fa-times"></i>
+      </button>
+    </div>
+  `;
+  const inp = document.getElementById(`input-edit-${id}`);
+  if (inp) inp.focus();
+}
+
+function confirmarEdicao(id) {
+  const input = document.getElementById(`input-edit-${id}`);
+  if (!input) return;
+  const novoConteudo = input.value;
+
+  if (!novoConteudo.trim()) return;
+
+  const fd = new FormData();
+  fd.append('conteudo', novoConteudo);
+  fd.append('csrfmiddlewaretoken', CSRF_TOKEN);
+
+  fetch(`/chat/editar/${id}/`, { method: 'POST', body: fd })
+    .then(res => res.json())
+    .then(data => {
+      if (data.status === 'sucesso') {
+        const textoDiv = document.getElementById(`texto-${id}`);
+        if (textoDiv) textoDiv.innerText = novoConteudo;
+
+        // adiciona selo "(editada)" se ainda não existir
+        const msg = document.getElementById(`msg-${id}`);
+        if (msg && !msg.innerHTML.includes('(editada)')) {
+          const horario = msg.querySelector('.msg-horario');
+          if (horario) {
+            horario.insertAdjacentHTML('beforebegin', '<small style="font-size:0.6rem; opacity:0.6; margin-right:5px;">(editada)</small>');
+          }
+        }
+      } else {
+        alert('Erro ao salvar edição.');
+      }
+    })
+    .catch(err => console.error("Erro ao editar:", err));
+}
+
+function cancelarEdicao(id, textoOriginal) {
+  const textoDiv = document.getElementById(`texto-${id}`);
+  if (textoDiv) textoDiv.innerText = textoOriginal;
+}
+
+// ===== ENVIAR =====
+function enviar() {
+  const input = document.getElementById('chat-input');
+  const file = document.getElementById('file-input');
+
+  if (!input.value.trim() && !file.files[0]) return;
+
+  const fd = new FormData();
+  fd.append('destinatario_id', destinatarioAtivo);
+  fd.append('conteudo', input.value);
+  fd.append('csrfmiddlewaretoken', CSRF_TOKEN);
+  if (file.files[0]) fd.append('arquivo', file.files[0]);
+
+  fetch('/chat/enviar/', { method: 'POST', body: fd });
+  pararDigitando();
+
+  input.value = '';
+  file.value = '';
+  document.getElementById('indicador-anexo').style.display = 'none';
+  input.focus();
+}
+
+// ===== ANEXO =====
+document.getElementById('file-input').addEventListener('change', function() {
+  if (this.files[0]) {
+    document.getElementById('nome-arquivo').innerText = this.files[0].name;
+    document.getElementById('indicador-anexo').style.display = 'flex';
+  }
+});
+
+function removerAnexo() {
+  document.getElementById('file-input').value = "";
+  document.getElementById('indicador-anexo').style.display = 'none';
+}
+
+// ===== GRAVAÇÃO (com timer igual) =====
+let gravacaoTimer = null;
+let gravacaoSegundos = 0;
+
+function formatTimer(secs) {
+  const mm = String(Math.floor(secs / 60)).padStart(2, '0');
+  const ss = String(secs % 60).padStart(2, '0');
+  return `${mm}:${ss}`;
+}
+
+document.getElementById('btn-mic').onclick = async function() {
+  const btn = this;
+
+  if (!mediaRecorder || mediaRecorder.state === 'inactive') {
+    try {
+      const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+      mediaRecorder = new MediaRecorder(stream);
+      audioChunks = [];
+
+      mediaRecorder.ondataavailable = e => audioChunks.push(e.data);
+
+      mediaRecorder.onstop = () => {
+        const blob = new Blob(audioChunks, { type: 'audio/webm' });
+
+        const fd = new FormData();
+        fd.append('destinatario_id', destinatarioAtivo);
+        fd.append('conteudo', '🎤 Áudio');
+        fd.append('arquivo', new File([blob], 'audio.webm', { type: 'audio/webm' }));
+        fd.append('csrfmiddlewaretoken', CSRF_TOKEN);
+        fetch('/chat/enviar/', { method: 'POST', body: fd });
+
+        // encerra stream
+        stream.getTracks().forEach(t => t.stop());
+
+        // UI
+        document.getElementById('status-gravacao').style.display = 'none';
+        btn.style.color = '';
+        if (gravacaoTimer) clearInterval(gravacaoTimer);
+        gravacaoTimer = null;
+        gravacaoSegundos = 0;
+        document.getElementById('timer-gravacao').innerText = '00:00';
+      };
+
+      // start
+      mediaRecorder.start();
+      document.getElementById('status-gravacao').style.display = 'block';
+      btn.style.color = 'red';
+
+      gravacaoSegundos = 0;
+      document.getElementById('timer-gravacao').innerText = '00:00';
+      if (gravacaoTimer) clearInterval(gravacaoTimer);
+
+      gravacaoTimer = setInterval(() => {
+        gravacaoSegundos += 1;
+        document.getElementById('timer-gravacao').innerText = formatTimer(gravacaoSegundos);
+      }, 1000);
+
+    } catch (e) {
+      alert('Erro microfone');
+    }
+  } else {
+    mediaRecorder.stop();
+  }
+};
+
+// ===== helpers para evitar quebrar edição com aspas =====
+function escapeHtml(str) {
+  return String(str)
+    .replaceAll('&', '&amp;')
+    .replaceAll('<', '&lt;')
+    .replaceAll('>', '&gt;')
+    .replaceAll('"', '&quot;')
+    .replaceAll("'", '&#039;');
+}
+function escapeJs(str) {
+  return String(str)
+    .replaceAll('\\', '\\\\')
+    .replaceAll("'", "\\'")
+    .replaceAll('\n', '\\n')
+    .replaceAll('\r', '\\r');
+}
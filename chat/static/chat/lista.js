@@ -0,0 +1,631 @@
+/** ============================
+ *  1) GARANTIA DE VIEWPORT (HEAD)
+ *  ============================
+ *  - Injetamos/ajustamos no <head> mesmo sem mexer no base.html
+ *  - Se já existir, sobrescrevemos para evitar o "980px"
+ */
+(function ensureViewport() {
+    let meta = document.querySelector('meta[name="viewport"]');
+    if (!meta) {
+        meta = document.createElement('meta');
+        meta.name = "viewport";
+        document.head.appendChild(meta);
+    }
+    meta.setAttribute("content", "width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no, viewport-fit=cover");
+})();
+
+let chatSocket = null;
+let destinatarioAtivo = null;
+let wavesurfers = {};
+let mediaRecorder;
+let audioChunks = [];
+
+/** ============================
+ *  2) LÓGICA TECLADO RESPONSIVO (visualViewport) - preservada
+ *  ============================ */
+function ajustarLayoutTeclado() {
+    if (window.innerWidth <= 768 && destinatarioAtivo) {
+        const vv = window.visualViewport;
+        if (!vv) return;
+
+        const janelaChat = document.getElementById('janela-chat');
+        const chatBox = document.getElementById('chat-box');
+
+        janelaChat.style.height = `${vv.height}px`;
+        janelaChat.style.top = `${vv.offsetTop}px`;
+
+        setTimeout(() => {
+            chatBox.scrollTop = chatBox.scrollHeight;
+        }, 100);
+    }
+}
+
+if (window.visualViewport) {
+    window.visualViewport.addEventListener('resize', ajustarLayoutTeclado);
+    window.visualViewport.addEventListener('scroll', ajustarLayoutTeclado);
+}
+
+document.getElementById('chat-input').addEventListener('focus', () => {
+    setTimeout(() => {
+        const chatBox = document.getElementById('chat-box');
+        chatBox.scrollTop = chatBox.scrollHeight;
+    }, 300);
+});
+
+/** ============================
+ *  3) WEBSOCKET - preservado
+ *  ============================ */
+const wsProtocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+chatSocket = new WebSocket(`${wsProtocol}${window.location.host}/ws/chat/${MEU_ID}/`);
+
+chatSocket.onopen = () => {
+    if (destinatarioAtivo) enviarNoSocket({ tipo: 'abrir', com: destinatarioAtivo });
+};
+
+chatSocket.onmessage = (e) => {
+    const data = JSON.parse(e.data);
+    if (tratarEventoChat(data)) return;
+    if (String(data.remetente_id) === String(destinatarioAtivo)) limparDigitando();
+    const idParaMover = (String(data.remetente_id) === String(MEU_ID)) ? data.destinatario_id : data.remetente_id;
+    if (idParaMover) moverParaOTopo(idParaMover);
+
+    if (String(data.remetente_id) === String(destinatarioAtivo) || String(data.remetente_id) === String(MEU_ID)) {
+        adicionarMensagemNaTela(data);
+        if (String(data.remetente_id) === String(destinatarioAtivo)) fetch(`/chat/marcar-lida/${data.remetente_id}/`);
+    } else {
+        let b = document.getElementById(`notificacao-${data.remetente_id}`);
+        if (b) { b.style.display = 'block'; b.innerText = (parseInt(b.innerText) || 0) + 1; }
+    }
+};
+
+// ===== PRESENÇA E "DIGITANDO" (chat/presenca.py): só WebSocket + Redis, nada no banco =====
+const PRESENCA_PING_MS = 25000;   // presenca.PING
+let presencaOnline = false;
+let digitandoTimer = null;
+let ultimoDigitando = 0;
+
+function enviarNoSocket(dados) {
+    if (chatSocket && chatSocket.readyState === WebSocket.OPEN) chatSocket.send(JSON.stringify(dados));
+}
+
+function mostrarStatus() {
+    const el = document.getElementById('chat-status-usuario');
+    if (!el) return;
+    if (digitandoTimer) {
+        el.textContent = 'digitando...';
+        el.style.color = '#28a745';
+        return;
+    }
+    el.textContent = presencaOnline ? 'Online' : 'Offline';
+    el.style.color = presencaOnline ? '#28a745' : '#999';
+}
+
+function limparDigitando() {
+    clearTimeout(digitandoTimer);
+    digitandoTimer = null;
+    mostrarStatus();
+}
+
+// eventos de presença/digitando/comunicado; false = é mensagem, segue o fluxo normal
+function tratarEventoChat(data) {
+    if (data.tipo === 'comunicado') {
+        if (typeof receberComunicado === 'function') receberComunicado(data.comunicado);
+        return true;
+    }
+    const doAtivo = String(data.usuario_id) === String(destinatarioAtivo);
+    if (data.tipo === 'presenca') {
+        if (doAtivo) { presencaOnline = data.online; mostrarStatus(); }
+        if (typeof marcarPresenca === 'function') marcarPresenca(data.usuario_id, data.online);
+        return true;
+    }
+    if (data.tipo === 'digitando') {
+        if (doAtivo) {
+            clearTimeout(digitandoTimer);
+            digitandoTimer = data.digitando ? setTimeout(limparDigitando, 5000) : null;
+            mostrarStatus();
+        }
+        return true;
+    }
+    return false;
+}
+
+// no máximo um aviso a cada 3s enquanto digita
+function avisarDigitando() {
+    const agora = Date.now();
+    if (agora - ultimoDigitando < 3000) return;
+    ultimoDigitando = agora;
+    enviarNoSocket({ tipo: 'digitando', digitando: true });
+}
+
+function pararDigitando() {
+    if (!ultimoDigitando) return;
+    ultimoDigitando = 0;
+    enviarNoSocket({ tipo: 'digitando', digitando: false });
+}
+
+setInterval(() => enviarNoSocket({ tipo: 'ping' }), PRESENCA_PING_MS);
+document.getElementById('chat-input').addEventListener('input', avisarDigitando);
+
+// Lista de contatos: presença de todos numa consulta só (a cada minuto)
+function marcarPresenca(uId, online) {
+    const el = document.getElementById(`presenca-${uId}`);
+    if (!el) return;
+    el.textContent = online ? 'Online' : 'Offline';
+    el.style.color = online ? '#28a745' : '#999';
+}
+
+function atualizarPresencaContatos() {
+    const ids = Array.from(document.querySelectorAll('#lista-contatos [id^="contato-"]')).map(c => c.id.slice(8));
+    if (!ids.length) return;
+    fetch(`/chat/presenca/?ids=${ids.join(',')}`)
+        .then(res => res.json())
+        .then(estados => Object.entries(estados).forEach(([uId, online]) => marcarPresenca(uId, online)));
+}
+
+atualizarPresencaContatos();
+setInterval(atualizarPresencaContatos, 60000);
+
+/** ============================
+ *  4) abrirChat (ÚNICO) - mesclado
+ *  ============================ */
+function abrirChat(id, nome, mensagemId) {
+    const userAgent = navigator.userAgent.toLowerCase();
+    const isMobileUA = /android|webos|iphone|ipad|ipod|blackberry|iemobile|opera mini/i.test(userAgent);
+    const isMobileUAData = (navigator.userAgentData && navigator.userAgentData.mobile) ? true : false;
+    const isMobileDevice = isMobileUAData || isMobileUA;
+
+    // matchMedia costuma ser mais confiável que innerWidth quando o viewport está ok
+    const isSmallScreen = window.matchMedia ? window.matchMedia("(max-width: 992px)").matches : (window.innerWidth <= 992);
+
+    console.log("Detectando... Mobile:", isMobileDevice, "| SmallScreen:", isSmallScreen, "| innerWidth:", window.innerWidth);
+
+    // MOBILE: redireciona para página exclusiva
+    if (isMobileDevice || isSmallScreen) {
+        // Usa URL do Django e substitui /0/ por /id/
+        let urlMobile = CHAT_MOBILE_URL_TEMPLATE.replace("/0/", `/${id}/`);
+
+        // Fallback ultra seguro (se por algum motivo o template vier vazio)
+        if (!urlMobile || urlMobile.indexOf("/chat/m/") === -1) {
+            urlMobile = "/chat/m/" + id + "/";
+        }
+        if (mensagemId) urlMobile += `?mensagem=${mensagemId}`;
+
+        console.log("Redirecionando para:", urlMobile);
+        window.location.href = urlMobile;
+        return;
+    }
+
+    // DESKTOP: abre na mesma página (sua lógica)
+    destinatarioAtivo = id;
+    presencaOnline = false;
+    limparDigitando();
+    enviarNoSocket({ tipo: 'abrir', com: id });
+    document.getElementById('chat-nome-usuario').innerText = nome;
+    document.getElementById('chat-vazio').style.display = 'none';
+    document.getElementById('janela-comunicados').style.display = 'none';
+    document.getElementById('janela-chat').style.display = 'flex';
+
+    document.getElementById('chat-box').innerHTML = '';
+    if (mensagemId) {
+        carregarAoRedor(mensagemId, () => abrirChat(id, nome));
+        return;
+    }
+    fetch(`/chat/buscar/${id}/`).then(res => {
+        const temArquivo = res.headers.get('X-Chat-Arquivo') === '1';
+        return res.json().then(data => {
+            data.forEach(m => {
+                if (typeof adicionarMensagemNaTela === "function") adicionarMensagemNaTela(m);
+            });
+            if (temArquivo) botaoArquivadas();
+            const chatBox = document.getElementById('chat-box');
+            if (chatBox) chatBox.scrollTop = chatBox.scrollHeight;
+        });
+    });
+}
+
+// ===== SALTO PARA UMA MENSAGEM (busca): só a página ao redor, sem o histórico todo =====
+function carregarAoRedor(mensagemId, aoAbrirConversa) {
+    const box = document.getElementById('chat-box');
+    fetch(`/chat/mensagem/${mensagemId}/contexto/`)
+        .then(res => res.json())
+        .then(pagina => {
+            pagina.mensagens.forEach(m => adicionarMensagemNaTela(m));
+            if (pagina.mais_antigas || pagina.mais_novas) {
+                const btn = document.createElement('button');
+                btn.type = 'button';
+                btn.textContent = 'Ver conversa completa';
+                btn.style.cssText = 'align-self: center; margin: 5px 0 15px; border: none; border-radius: 15px; padding: 6px 14px; background: #e0e0e0; cursor: pointer;';
+                btn.onclick = aoAbrirConversa;
+                box.appendChild(btn);
+            }
+            const alvo = document.getElementById(`msg-${pagina.alvo}`);
+            if (alvo) {
+                alvo.classList.add('msg-destacada');
+                alvo.scrollIntoView({ block: 'center' });
+            }
+        });
+}
+
+// ===== HISTÓRICO ARQUIVADO (chat/retencao.py): sob demanda, do mais novo para o mais antigo =====
+function botaoArquivadas() {
+    const box = document.getElementById('chat-box');
+    const btn = document.createElement('button');
+    btn.type = 'button';
+    btn.textContent = 'Carregar mensagens antigas';
+    btn.style.cssText = 'align-self: center; margin-bottom: 15px; border: none; border-radius: 15px; padding: 6px 14px; background: #e0e0e0; cursor: pointer;';
+    btn.onclick = () => carregarArquivadas(btn);
+    box.prepend(btn);
+}
+
+function carregarArquivadas(btn) {
+    const box = document.getElementById('chat-box');
+    const primeira = box.querySelector('[data-ts]');
+    const antes = primeira ? primeira.dataset.ts : new Date().toISOString();
+    // id desempata mensagens com o mesmo horário na virada da página
+    const antesId = primeira ? primeira.id.slice(4) : '';
+    btn.disabled = true;
+
+    fetch(`/chat/buscar/${destinatarioAtivo}/?arquivo=1&antes=${encodeURIComponent(antes)}&antes_id=${antesId}`)
+        .then(res => res.json())
+        .then(data => {
+            if (!data.length) { btn.remove(); return; }
+            const distanciaDoFim = box.scrollHeight - box.scrollTop;
+            data.slice().reverse().forEach(m => {
+                adicionarMensagemNaTela(m);
+                const el = document.getElementById(`msg-${m.id}`);
+                if (el) box.insertBefore(el, btn.nextSibling);
+            });
+            box.scrollTop = box.scrollHeight - distanciaDoFim;
+            btn.disabled = false;
+        });
+}
+
+// ===== COMUNICADOS (chat/comunicados.py): uma mensagem para o grupo todo =====
+function abrirComunicados() {
+    if (destinatarioAtivo) {
+        destinatarioAtivo = null;
+        enviarNoSocket({ tipo: 'abrir', com: null });
+    }
+    document.getElementById('chat-vazio').style.display = 'none';
+    document.getElementById('janela-chat').style.display = 'none';
+    document.getElementById('janela-comunicados').style.display = 'flex';
+    carregarComunicados();
+}
+
+function fecharComunicados() {
+    document.getElementById('janela-comunicados').style.display = 'none';
+    document.getElementById('chat-vazio').style.display = 'flex';
+}
+
+function carregarComunicados() {
+    fetch('/chat/comunicados/').then(res => res.json()).then(data => {
+        const lista = document.getElementById('lista-comunicados');
+        lista.innerHTML = '';
+        if (!data.comunicados.length) {
+            lista.innerHTML = '<div style="color: #999; text-align: center;">Nenhum comunicado.</div>';
+        }
+        data.comunicados.forEach(c => adicionarComunicado(c, false));
+        marcarComunicadosLidos();
+    });
+}
+
+function adicionarComunicado(c, noTopo) {
+    const lista = document.getElementById('lista-comunicados');
+    const div = document.createElement('div');
+    div.id = `comunicado-${c.id}`;
+    div.style.cssText = `background: white; border-radius: 12px; padding: 10px 14px; margin-bottom: 12px; box-shadow: 0 1px 3px rgba(0,0,0,0.1); ${c.lido === false ? 'border-left: 4px solid #007bff;' : ''}`;
+    const quando = new Date(c.timestamp).toLocaleString([], {day: '2-digit', month: '2-digit', hour: '2-digit', minute: '2-digit'});
+    const leitura = c.destinatarios !== undefined ? ` · lido por ${c.lidos} de ${c.destinatarios}` : '';
+    div.innerHTML = `<small style="color: #888; display: block; margin-bottom: 4px;"></small><div style="white-space: pre-wrap;"></div>`;
+    div.querySelector('small').textContent = `${c.remetente__username} → ${c.grupo} · ${quando}${leitura}`;
+    div.querySelector('div').textContent = c.conteudo;
+    if (noTopo) lista.prepend(div); else lista.appendChild(div);
+}
+
+function marcarComunicadosLidos() {
+    const badge = document.getElementById('badge-comunicados');
+    badge.style.display = 'none';
+    badge.innerText = '0';
+    fetch('/chat/comunicados/lidos/', { method: 'POST', headers: { 'X-CSRFToken': CSRF_TOKEN } });
+}
+
+function receberComunicado(c) {
+    if (document.getElementById('janela-comunicados').style.display === 'flex') {
+        adicionarComunicado(c, true);
+        marcarComunicadosLidos();
+        return;
+    }
+    const badge = document.getElementById('badge-comunicados');
+    badge.style.display = '';
+    badge.innerText = (parseInt(badge.innerText) || 0) + 1;
+}
+
+function enviarComunicado() {
+    const texto = document.getElementById('comunicado-texto');
+    if (!texto.value.trim()) return;
+
+    const fd = new FormData();
+    fd.append('grupo_id', document.getElementById('comunicado-grupo').value);
+    fd.append('conteudo', texto.value);
+    fd.append('csrfmiddlewaretoken', CSRF_TOKEN);
+
+    fetch('/chat/comunicados/enviar/', { method: 'POST', body: fd })
+        .then(res => res.json())
+        .then(data => {
+            if (data.status !== 'sucesso') { alert(data.message); return; }
+            texto.value = '';
+            carregarComunicados();
+        });
+}
+
+/** ============================
+ *  5) Render de Mensagens - preservado
+ *  ============================ */
+function adicionarMensagemNaTela(m) {
+    const box = document.getElementById('chat-box');
+    if (document.getElementById(`msg-${m.id}`)) return;
+
+    const souEu = String(m.remetente_id) === String(MEU_ID);
+    const div = document.createElement('div');
+    div.id = `msg-${m.id}`;
+    if (m.timestamp) div.dataset.ts = m.timestamp;
+    div.style.display = 'flex';
+    div.style.justifyContent = souEu ? 'flex-end' : 'flex-start';
+    div.style.marginBottom = '15px';
+    div.style.position = 'relative';
+
+    let horaExibicao = m.horario || (m.timestamp ? new Date(m.timestamp).toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'}) : "");
+
+    let anexoHtml = '';
+    if (m.arquivo_url) {
+        if (/\.(webm|wav|mp3|ogg|m4a|mp4)$/i.test(m.arquivo_url)) {
+            anexoHtml = `<div class="waveform-container" onclick="event.stopPropagation()"><button class="play-btn" onclick="toggleAudio(${m.id})"><i class="fas fa-play" id="icon-${m.id}"></i></button><div id="wave-${m.id}" style="flex: 1; min-width: 160px;"></div></div>`;
+        } else if (/\.(jpeg|jpg|gif|png|webp)$/i.test(m.arquivo_url)) {
+            anexoHtml = `<img src="${m.arquivo_url}" style="max-width:200px; border-radius:10px; margin-top:5px; cursor:pointer;" onclick="window.open('${m.arquivo_url}')">`;
+        }
+    }
+
+    const menuBtn = (souEu && !m.arquivada) ? `<div style="position: absolute; right: 8px; top: 5px;"><span class="btn-opcoes" onclick="toggleMenu(event, ${m.id})">⋮</span><div id="menu-${m.id}" class="chat-menu"><div onclick="prepararEdicao(${m.id})">Editar</div><div onclick="deletarMsg(${m.id})" style="color:red;">Excluir</div></div></div>` : '';
+
+    div.innerHTML = `
+        <div style="max-width: 85%; padding: 10px 14px; border-radius: 15px; background: ${souEu ? '#007bff' : 'white'}; color: ${souEu ? 'white' : '#333'}; position: relative; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
+            ${menuBtn}
+            <small style="opacity: 0.7; font-size: 0.65rem; display: block; margin-bottom: 3px;">${souEu ? 'Você' : m.remetente__username}</small>
+            <div class="msg-container">
+                <div id="texto-${m.id}">${m.conteudo}</div>
+                ${anexoHtml}
+                <span class="msg-horario" style="color: ${souEu ? '#e0e0e0' : '#888'}">${horaExibicao}</span>
+            </div>
+        </div>`;
+    box.appendChild(div);
+    box.scrollTop = box.scrollHeight;
+
+    if (m.arquivo_url && /\.(webm|wav|mp3|ogg|m4a|mp4)$/i.test(m.arquivo_url)) {
+        setTimeout(() => {
+            if (!wavesurfers[m.id]) {
+                wavesurfers[m.id] = WaveSurfer.create({
+                    container: `#wave-${m.id}`,
+                    waveColor: souEu ? '#80bdff' : '#ccc',
+                    progressColor: souEu ? '#fff' : '#007bff',
+                    height: 30,
+                    barWidth: 2
+                });
+                wavesurfers[m.id].load(m.arquivo_url);
+                wavesurfers[m.id].on('play', () => document.getElementById(`icon-${m.id}`).className = 'fas fa-pause');
+                wavesurfers[m.id].on('pause', () => document.getElementById(`icon-${m.id}`).className = 'fas fa-play');
+            }
+        }, 150);
+    }
+}
+
+/** ============================
+ *  6) fecharChatMobile (ÚNICO) - preservado/mesclado
+ *  ============================ */
+function fecharChatMobile() {
+    document.getElementById('janela-chat').style.display = 'none';
+    document.getElementById('sidebar-contatos').style.display = 'block';
+
+    // Destrava o scroll do site (sua melhoria)
+    document.body.style.overflow = '';
+    document.body.style.position = '';
+
+    destinatarioAtivo = null;
+    enviarNoSocket({ tipo: 'abrir', com: null });
+}
+
+/** ============================
+ *  7) Funções auxiliares - preservadas
+ *  ============================ */
+function enviar() {
+    const input = document.getElementById('chat-input');
+    const file = document.getElementById('file-input');
+    if (!destinatarioAtivo || (!input.value.trim() && !file.files[0])) return;
+
+    const fd = new FormData();
+    fd.append('destinatario_id', destinatarioAtivo);
+    fd.append('conteudo', input.value);
+    fd.append('csrfmiddlewaretoken', CSRF_TOKEN);
+    if (file.files[0]) fd.append('arquivo', file.files[0]);
+
+    pararDigitando();
+    fetch('/chat/enviar/', { method: 'POST', body: fd }).then(() => {
+        input.value = '';
+        file.value = '';
+        document.getElementById('indicador-anexo').style.display = 'none';
+    });
+}
+
+function verificarEnter(event) {
+    if (event.key === 'Enter' && !event.shiftKey) {
+        event.preventDefault();
+        enviar();
+    }
+}
+
+function moverParaOTopo(uId) {
+    const lista = document.getElementById('lista-contatos');
+    const card = document.getElementById(`contato-${uId}`);
+    if (card && lista) lista.prepend(card);
+}
+
+function toggleAudio(id) {
+    if(wavesurfers[id]) wavesurfers[id].playPause();
+}
+
+function toggleMenu(e, id) {
+    e.stopPropagation();
+    document.querySelectorAll('.chat-menu').forEach(m => m.style.display = 'none');
+    document.getElementById(`menu-${id}`).style.display = 'block';
+}
+
+window.onclick = () => document.querySelectorAll('.chat-menu').forEach(m => m.style.display = 'none');
+
+// Filtro de busca
+document.getElementById('input-pesquisa').addEventListener('input', e => {
+    const termo = e.target.value.toLowerCase();
+    Array.from(document.getElementById('lista-contatos').children).forEach(c => {
+        c.style.display = c.innerText.toLowerCase().includes(termo) ? "" : "none";
+    });
+});
+
+// Busca nas mensagens (chat/busca.py): resultados no lugar da lista de contatos
+let buscaTimer = null;
+document.getElementById('input-busca-mensagens').addEventListener('input', e => {
+    clearTimeout(buscaTimer);
+    const termo = e.target.value.trim();
+    const resultados = document.getElementById('resultados-busca');
+    if (termo.length < 2) {
+        resultados.style.display = 'none';
+        document.getElementById('lista-contatos').style.display = '';
+        return;
+    }
+    buscaTimer = setTimeout(() => {
+        resultados.innerHTML = '';
+        resultados.style.display = '';
+        document.getElementById('lista-contatos').style.display = 'none';
+        pesquisarMensagens(termo, null);
+    }, 300);
+});
+
+function pesquisarMensagens(termo, cursor) {
+    const resultados = document.getElementById('resultados-busca');
+    let url = `/chat/pesquisar/?q=${encodeURIComponent(termo)}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+
+    fetch(url).then(res => res.json()).then(data => {
+        if (document.getElementById('input-busca-mensagens').value.trim() !== termo) return;  // resposta velha
+        resultados.querySelector('.mais-resultados')?.remove();
+        if (!cursor && !data.resultados.length) {
+            resultados.innerHTML = '<div style="padding: 15px; color: #999; font-size: 0.85rem;">Nenhuma mensagem encontrada.</div>';
+            return;
+        }
+        data.resultados.forEach(r => {
+            const item = document.createElement('div');
+            item.className = 'resultado-busca';
+            const quando = new Date(r.timestamp).toLocaleString([], {day: '2-digit', month: '2-digit', year: '2-digit', hour: '2-digit', minute: '2-digit'});
+            // r.trecho já vem escapado do servidor, só com <mark>
+            item.innerHTML = `<div style="display: flex; justify-content: space-between;"><strong></strong><small style="color: #999;">${quando}</small></div><div style="color: #555;">${r.trecho}</div>`;
+            item.querySelector('strong').textContent = r.com_username;
+            item.onclick = () => abrirChat(r.com_id, r.com_username, r.id);
+            resultados.appendChild(item);
+        });
+        if (data.proximo) {
+            const mais = document.createElement('button');
+            mais.type = 'button';
+            mais.className = 'mais-resultados';
+            mais.textContent = 'Mais resultados';
+            mais.style.cssText = 'display: block; margin: 10px auto; border: none; border-radius: 15px; padding: 6px 14px; background: #e0e0e0; cursor: pointer;';
+            mais.onclick = () => pesquisarMensagens(termo, data.proximo);
+            resultados.appendChild(mais);
+        }
+    });
+}
+
+document.getElementById('file-input').addEventListener('change', function() {
+    if (this.files[0]) {
+        document.getElementById('nome-arquivo').innerText = this.files[0].name;
+        document.getElementById('indicador-anexo').style.display = 'flex';
+    }
+});
+
+function removerAnexo() {
+    document.getElementById('file-input').value = "";
+    document.getElementById('indicador-anexo').style.display = 'none';
+}
+
+/** ============================
+ * 8) EDITAR E EXCLUIR MENSAGENS
+ * ============================ */
+
+function deletarMsg(id) {
+    if (confirm('Deseja realmente excluir esta mensagem?')) {
+        fetch(`/chat/excluir/${id}/`, {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': CSRF_TOKEN,
+                'Content-Type': 'application/json'
+            }
+        })
+        .then(res => res.json())
+        .then(data => {
+            if (data.status === 'sucesso') {
+                const msgElement = document.getElementById(`msg-${id}`);
+                if (msgElement) msgElement.remove();
+            } else {
+                alert(data.message || 'Erro ao excluir mensagem.');
+            }
+        })
+        .catch(err => console.error("Erro ao excluir:", err));
+    }
+}
+
+function prepararEdicao(id) {
+    const textoDiv = document.getElementById(`texto-${id}`);
+    const conteudoOriginal = textoDiv.innerText;
+
+    // Transforma o texto em um campo de input
+    const inputHtml = `
+        <div id="edit-container-${id}" style="display: flex; gap: 5px; margin-top: 5px;">
+            <input type="text" id="input-edit-${id}" value="${conteudoOriginal}" 
+                   style="flex: 1; border-radius: 10px; border: 1px solid #ccc; padding: 4px 8px; color: #333; font-size: 0.85rem;">
+            <button onclick="confirmarEdicao(${id})" style="background: #28a745; color: white; border: none; border-radius: 5px; padding: 0 8px;"><i class="fas fa-check"></i></button>
+            <button onclick="cancelarEdicao(${id}, '${conteudoOriginal}')" style="background: #dc3545; color: white; border: none; border-radius: 5px; padding: 0 8px;"><i class="fas fa-times"></i></button>
+        </div>
+    `;
+    textoDiv.innerHTML = inputHtml;
+    document.getElementById(`input-edit-${id}`).focus();
+}
+
+function confirmarEdicao(id) {
+    const novoConteudo = document.getElementById(`input-edit-${id}`).value;
+
+    if (!novoConteudo.trim()) return;
+
+    const fd = new FormData();
+    fd.append('conteudo', novoConteudo);
+    fd.append('csrfmiddlewaretoken', CSRF_TOKEN);
+
+    fetch(`/chat/editar/${id}/`, {
+        method: 'POST',
+        body: fd
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.status === 'sucesso') {
+            const textoDiv = document.getElementById(`texto-${id}`);
+            textoDiv.innerText = novoConteudo;
+            // Adiciona o selo de editada se não existir
+            const container = textoDiv.closest('.msg-container');
+            if (!container.innerHTML.includes('(editada)')) {
+                container.querySelector('.msg-horario').insertAdjacentHTML('beforebegin', '<small style="font-size:0.6rem; opacity:0.6; margin-right:5px;">(editada)</small>');
+            }
+        } else {
+            alert('Erro ao salvar edição.');
+        }
+    })
+    .catch(err => console.error("Erro ao editar:", err));
+}
+
+function cancelarEdicao(id, textoOriginal) {
+    document.getElementById(`texto-${id}`).innerText = textoOriginal;
+}
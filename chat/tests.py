@@ -1,3 +1,526 @@
-from django.test import TestCase
+import datetime
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import Group, User
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rotas.services.redis_conn import get_redis
+
+from . import busca, comunicados, presenca, retencao
+from .consumers import ChatConsumer
+from .models import Comunicado, LeituraComunicado
+from .models import AnexoArquivado, ArquivoConversa, Mensagem
+
+
+class RetencaoTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.frio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.frio, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media, CHAT_ARQUIVO_FRIO=self.frio, CHAT_RETENCAO_DIAS=180)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        self.ana = User.objects.create_user("ana", password="x")
+        self.beto = User.objects.create_user("beto", password="x")
+        self.agora = timezone.now()
+
+    def _mensagem(self, dias, conteudo="oi", arquivo=None, de=None, para=None):
+        m = Mensagem(remetente=de or self.ana, destinatario=para or self.beto, conteudo=conteudo)
+        if arquivo:
+            m.arquivo.save(arquivo, ContentFile(b"conteudo"), save=False)
+        m.save()
+        Mensagem.objects.filter(pk=m.pk).update(timestamp=self.agora - datetime.timedelta(days=dias))
+        return m
+
+    def test_arquiva_so_as_vencidas_em_bloco_comprimido(self):
+        antigas = [self._mensagem(200 + i, f"antiga {i}") for i in range(3)]
+        nova = self._mensagem(10, "nova")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feito = retencao.arquivar(agora=self.agora)
+
+        self.assertEqual(feito["mensagens"], 3)
+        self.assertEqual(list(Mensagem.objects.values_list("id", flat=True)), [nova.id])
+        registros = [r for a in ArquivoConversa.objects.all() for r in retencao._descomprimir(a.dados)]
+        self.assertEqual(sorted(r["id"] for r in registros), sorted(m.id for m in antigas))
+        self.assertEqual(sum(a.quantidade for a in ArquivoConversa.objects.all()), 3)
+
+    def test_anexo_vai_para_o_frio_e_original_sai_depois_do_commit(self):
+        m = self._mensagem(200, arquivo="nota.pdf")
+        nome = m.arquivo.name
+        original = os.path.join(self.media, nome)
+        self.assertTrue(os.path.exists(original))
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            retencao.arquivar(agora=self.agora)
+        self.assertTrue(os.path.exists(original))
+        for callback in callbacks:
+            callback()
+
+        self.assertFalse(os.path.exists(original))
+        self.assertTrue(os.path.exists(os.path.join(self.frio, nome)))
+
+    def test_reexecucao_nao_duplica(self):
+        m = self._mensagem(200)
+        retencao.arquivar(agora=self.agora)
+        # simula falha depois de gravar o arquivo: a mensagem volta e roda de novo
+        Mensagem.objects.create(id=m.id, remetente=self.ana, destinatario=self.beto, conteudo="oi")
+        Mensagem.objects.filter(pk=m.id).update(timestamp=self.agora - datetime.timedelta(days=200))
+        retencao.arquivar(agora=self.agora)
+        retencao.arquivar(agora=self.agora)
+
+        arquivo = ArquivoConversa.objects.get()
+        self.assertEqual(arquivo.quantidade, 1)
+        self.assertEqual([r["id"] for r in retencao._descomprimir(arquivo.dados)], [m.id])
+
+    def test_historico_paginado_pela_view(self):
+        ids = [self._mensagem(300 - i, f"m{i}", de=self.beto, para=self.ana).id for i in range(5)]
+        retencao.arquivar(agora=self.agora)
+        self.client.force_login(self.ana)
+
+        url = reverse("chat:buscar", args=[self.beto.id])
+        r = self.client.get(url)
+        self.assertEqual(r.json(), [])
+        self.assertEqual(r["X-Chat-Arquivo"], "1")
+
+        pagina = retencao.historico(self.ana.id, self.beto.id, self.agora, por_pagina=3)
+        self.assertEqual([m["id"] for m in pagina], ids[2:])
+        self.assertTrue(all(m["arquivada"] for m in pagina))
+
+        r = self.client.get(url, {"arquivo": 1, "antes": pagina[0]["timestamp"]})
+        self.assertEqual([m["id"] for m in r.json()], ids[:2])
+
+    def test_pagina_nao_pula_mensagens_com_o_mesmo_horario(self):
+        ids = [self._mensagem(200, f"m{i}").id for i in range(5)]      # todas no mesmo instante
+        retencao.arquivar(agora=self.agora)
+        pagina = retencao.historico(self.ana.id, self.beto.id, self.agora, por_pagina=3)
+        self.assertEqual([m["id"] for m in pagina], ids[2:])
+
+        self.client.force_login(self.ana)
+        url = reverse("chat:buscar", args=[self.beto.id])
+        r = self.client.get(url, {"arquivo": 1, "antes": pagina[0]["timestamp"], "antes_id": pagina[0]["id"]})
+        self.assertEqual([m["id"] for m in r.json()], ids[:2])
+        self.assertEqual(self.client.get(url, {"arquivo": 1, "antes_id": "x"}).status_code, 400)
+
+    def test_anexo_arquivado_so_para_quem_esta_na_conversa(self):
+        m = self._mensagem(200, arquivo="nota.pdf")
+        nome = m.arquivo.name
+        retencao.arquivar(agora=self.agora)
+        a, b = sorted((self.ana.id, self.beto.id))
+        url = reverse("chat:anexo_arquivado", args=[a, b, nome])
+
+        self.client.force_login(self.ana)
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(b"".join(r.streaming_content), b"conteudo")
+
+        self.client.force_login(User.objects.create_user("carla", password="x"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.ana)
+        self.assertEqual(
+            self.client.get(reverse("chat:anexo_arquivado", args=[a, b, "../../etc/passwd"])).status_code, 404
+        )
+
+    def test_anexo_de_outra_conversa_nao_sai_pelo_indice(self):
+        carla = User.objects.create_user("carla", password="x")
+        self._mensagem(200, arquivo="nota.pdf")
+        alheio = self._mensagem(200, arquivo="outra.pdf", de=carla)
+        retencao.arquivar(agora=self.agora)
+        a, b = sorted((self.ana.id, self.beto.id))
+
+        with mock.patch.object(retencao, "_descomprimir") as descomprimir, self.assertNumQueries(1):
+            self.assertIsNone(retencao.caminho_anexo(self.ana.id, a, b, alheio.arquivo.name))
+        descomprimir.assert_not_called()
+        self.assertEqual(AnexoArquivado.objects.count(), 2)
+
+
+class BuscaTests(TestCase):
+    def setUp(self):
+        self.ana = User.objects.create_user("ana", password="x")
+        self.beto = User.objects.create_user("beto", password="x")
+        self.carla = User.objects.create_user("carla", password="x")
+        self.client.force_login(self.ana)
+
+    def _conversa(self, textos, de=None, para=None):
+        return [
+            Mensagem.objects.create(remetente=de or self.ana, destinatario=para or self.beto, conteudo=t)
+            for t in textos
+        ]
+
+    def test_pesquisa_pagina_por_cursor_so_nas_conversas_da_pessoa(self):
+        minhas = self._conversa([f"entrega da nota {i}" for i in range(5)])
+        self._conversa(["entrega de outra pessoa"], de=self.beto, para=self.carla)
+
+        r = self.client.get(reverse("chat:pesquisar"), {"q": "entrega"})
+        self.assertEqual(sorted(h["id"] for h in r.json()["resultados"]), sorted(m.id for m in minhas))
+
+        vistos, cursor = [], None
+        while True:
+            pagina = busca.pesquisar(self.ana.id, "entrega", cursor=cursor, por_pagina=2)
+            self.assertLessEqual(len(pagina["resultados"]), 2)
+            vistos += [h["id"] for h in pagina["resultados"]]
+            cursor = pagina["proximo"]
+            if not cursor:
+                break
+        self.assertEqual(sorted(vistos), sorted(m.id for m in minhas))
+
+    def test_trecho_escapado_com_destaque(self):
+        self._conversa(["<script>x</script> endereço da loja"])
+        hit = busca.pesquisar(self.ana.id, "loja")["resultados"][0]
+        self.assertNotIn("<script>", hit["trecho"])
+        self.assertIn("<mark>loja</mark>", hit["trecho"])
+        self.assertEqual((hit["com_id"], hit["com_username"]), (self.beto.id, "beto"))
+
+    def test_cursor_invalido(self):
+        r = self.client.get(reverse("chat:pesquisar"), {"q": "nota", "cursor": "lixo"})
+        self.assertEqual(r.status_code, 400)
+
+    def test_contexto_traz_so_a_pagina_ao_redor(self):
+        msgs = self._conversa([f"m{i}" for i in range(9)])
+        pagina = busca.ao_redor(self.ana.id, msgs[4].id, raio=2)
+        self.assertEqual([m.id for m in pagina["mensagens"]], [m.id for m in msgs[2:7]])
+        self.assertTrue(pagina["mais_antigas"] and pagina["mais_novas"])
+
+        r = self.client.get(reverse("chat:contexto", args=[msgs[0].id]))
+        dados = r.json()
+        self.assertEqual(dados["alvo"], msgs[0].id)
+        self.assertEqual(dados["com_id"], self.beto.id)
+        self.assertEqual(dados["mensagens"][0]["id"], msgs[0].id)
+        self.assertFalse(dados["mais_antigas"])
+
+        self.client.force_login(self.carla)
+        self.assertEqual(self.client.get(reverse("chat:contexto", args=[msgs[0].id])).status_code, 404)
+
+    @skipUnless(connection.vendor == "postgresql", "tsvector só no PostgreSQL")
+    def test_portugues_e_relevancia(self):
+        fraca, forte = self._conversa([
+            "separei as transferências de ontem",
+            "transferência da loja centro: transferências conferidas",
+        ])
+        self._conversa(["transferências de outra conversa"], de=self.beto, para=self.carla)
+
+        hits = busca.pesquisar(self.ana.id, "transferência")["resultados"]
+        self.assertEqual([h["id"] for h in hits], [forte.id, fraca.id])
+        self.assertIn("<mark>", hits[0]["trecho"])
+        # sintaxe de busca web: exclusão
+        hits = busca.pesquisar(self.ana.id, "transferências -centro")["resultados"]
+        self.assertEqual([h["id"] for h in hits], [fraca.id])
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'unaccent'")
+            sem_acento = cursor.fetchone()
+        if sem_acento:
+            self.assertEqual(len(busca.pesquisar(self.ana.id, "transferencia")["resultados"]), 2)
+
+
+class _RedisFalso:
+    """Sorted set + pipeline, o bastante para chat/presenca.py."""
+
+    def __init__(self):
+        self.zsets = {}
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.comandos = []
+
+            def __getattr__(self, nome):
+                return lambda *args: self.comandos.append((getattr(redis, nome), args))
+
+            def execute(self):
+                return [comando(*args) for comando, args in self.comandos]
+
+        return Pipeline()
+
+    def zadd(self, chave, membros):
+        z = self.zsets.setdefault(chave, {})
+        novos = len(set(membros) - set(z))
+        z.update(membros)
+        return novos
+
+    def zrem(self, chave, membro):
+        return int(self.zsets.get(chave, {}).pop(membro, None) is not None)
+
+    def zremrangebyscore(self, chave, minimo, maximo):
+        z = self.zsets.get(chave, {})
+        vencidos = [m for m, score in z.items() if score <= maximo]
+        for m in vencidos:
+            del z[m]
+        return len(vencidos)
+
+    def zcard(self, chave):
+        return len(self.zsets.get(chave, {}))
+
+    def zcount(self, chave, minimo, maximo):
+        return sum(1 for score in self.zsets.get(chave, {}).values() if score >= minimo)
+
+    def expire(self, chave, segundos):
+        return True
+
+
+class PresencaTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("chat.presenca.get_redis", return_value=_RedisFalso())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_varias_abas_so_avisam_na_primeira_e_na_ultima(self):
+        self.assertTrue(presenca.renovar(1, "aba1"))
+        self.assertFalse(presenca.renovar(1, "aba2"))
+        self.assertFalse(presenca.renovar(1, "aba1"))            # ping
+        self.assertFalse(presenca.desconectar(1, "aba1"))
+        self.assertEqual(presenca.online([1, 2]), {1: True, 2: False})
+        self.assertTrue(presenca.desconectar(1, "aba2"))
+        self.assertEqual(presenca.online([1]), {1: False})
+
+    def test_conexao_sem_ping_vence(self):
+        agora = time.time()
+        presenca.renovar(1, "aba", agora=agora)
+        depois = agora + presenca.TTL + 1
+        self.assertEqual(presenca.online([1], agora=depois), {1: False})
+        self.assertTrue(presenca.renovar(1, "aba", agora=depois))  # voltou: avisa de novo
+        self.assertFalse(presenca.desconectar(1, "outra", agora=depois))
+
+
+@override_settings(REDIS_URL="redis://127.0.0.1:1/0")
+class PresencaSemRedisTests(SimpleTestCase):
+    def setUp(self):
+        get_redis.cache_clear()
+        self.addCleanup(get_redis.cache_clear)
+
+    def test_todos_offline_sem_quebrar(self):
+        with self.assertLogs("chat.presenca", level="WARNING"):
+            self.assertFalse(presenca.renovar(1, "aba"))
+            self.assertEqual(presenca.online([1, 2]), {1: False, 2: False})
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ChatConsumerTests(TransactionTestCase):
+    # database_sync_to_async fecha a conexão: TestCase perderia a transação do teste
+    def setUp(self):
+        self.redis = _RedisFalso()
+        patcher = mock.patch("chat.presenca.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _conectar(self, usuario_id, com=None):
+        ws = WebsocketCommunicator(ChatConsumer.as_asgi(), f"/ws/chat/{usuario_id}/")
+        ws.scope["user"] = SimpleNamespace(id=usuario_id, is_authenticated=True)
+        conectado, _ = await ws.connect()
+        self.assertTrue(conectado)
+        if com:
+            await ws.send_json_to({"tipo": "abrir", "com": com})
+        return ws
+
+    async def test_presenca_so_para_quem_tem_a_conversa_aberta(self):
+        beto = await self._conectar(2, com=1)
+        self.assertEqual(await beto.receive_json_from(), {"tipo": "presenca", "usuario_id": 1, "online": False})
+        carla = await self._conectar(3, com=4)
+        await carla.receive_json_from()
+
+        ana1 = await self._conectar(1)
+        self.assertEqual(await beto.receive_json_from(), {"tipo": "presenca", "usuario_id": 1, "online": True})
+        ana2 = await self._conectar(1)
+        await ana1.disconnect()
+        self.assertTrue(await beto.receive_nothing())       # ainda tem uma aba aberta
+        await ana2.disconnect()
+        self.assertEqual(await beto.receive_json_from(), {"tipo": "presenca", "usuario_id": 1, "online": False})
+        self.assertTrue(await carla.receive_nothing())
+
+        await beto.disconnect()
+        await carla.disconnect()
+
+    async def test_conexao_vencida_aparece_offline_no_ping_de_quem_olha(self):
+        beto = await self._conectar(2, com=1)
+        await beto.receive_json_from()
+        ana = await self._conectar(1)
+        self.assertEqual(await beto.receive_json_from(), {"tipo": "presenca", "usuario_id": 1, "online": True})
+
+        await beto.send_json_to({"tipo": "ping"})
+        self.assertTrue(await beto.receive_nothing())
+
+        # a conexão da ana caiu sem disconnect: só o TTL no Redis vence
+        self.redis.zsets[presenca._chave(1)] = dict.fromkeys(self.redis.zsets[presenca._chave(1)], 0)
+        await beto.send_json_to({"tipo": "ping"})
+        self.assertEqual(await beto.receive_json_from(), {"tipo": "presenca", "usuario_id": 1, "online": False})
+
+        await ana.disconnect()
+        self.assertTrue(await beto.receive_nothing())       # saída já avisada
+        await beto.disconnect()
+
+    async def test_digitando_so_na_aba_com_a_conversa(self):
+        beto_com_ana = await self._conectar(2, com=1)
+        await beto_com_ana.receive_json_from()
+        beto_com_carla = await self._conectar(2, com=3)
+        await beto_com_carla.receive_json_from()
+        ana = await self._conectar(1, com=2)
+        await ana.receive_json_from()
+        await beto_com_ana.receive_json_from()              # ana entrou
+
+        await ana.send_json_to({"tipo": "digitando", "digitando": True})
+        self.assertEqual(
+            await beto_com_ana.receive_json_from(), {"tipo": "digitando", "usuario_id": 1, "digitando": True}
+        )
+        self.assertTrue(await beto_com_carla.receive_nothing())
+
+        for ws in (ana, beto_com_ana, beto_com_carla):
+            await ws.disconnect()
+
+    async def test_comunicado_chega_em_todas_as_conexoes_do_grupo(self):
+        motoboys = await Group.objects.acreate(name="Motoboy")
+        moto = await User.objects.acreate(username="moto")
+        await moto.groups.aadd(motoboys)
+        loja = await User.objects.acreate(username="loja")
+
+        celular = await self._conectar(moto.id)
+        painel = await self._conectar(moto.id)
+        da_loja = await self._conectar(loja.id)
+
+        dados = {"id": 1, "conteudo": "Chuva forte, cuidado", "grupo": "Motoboy"}
+        await get_channel_layer().group_send(
+            comunicados.canal(motoboys.id), {"type": "chat_comunicado", "comunicado": dados}
+        )
+        for ws in (celular, painel):
+            self.assertEqual(await ws.receive_json_from(), {"tipo": "comunicado", "comunicado": dados})
+        self.assertTrue(await da_loja.receive_nothing())
+
+        for ws in (celular, painel, da_loja):
+            await ws.disconnect()
+
+    async def test_anonimo_recusado(self):
+        ws = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/1/")
+        ws.scope["user"] = SimpleNamespace(id=None, is_authenticated=False)
+        conectado, _ = await ws.connect()
+        self.assertFalse(conectado)
+
+
+class PresencaViewTests(TestCase):
+    def setUp(self):
+        self.ana = User.objects.create_user("ana", password="x")
+        self.beto, self.carla, self.davi = (User.objects.create_user(n, password="x") for n in ("beto", "carla", "davi"))
+        Mensagem.objects.create(remetente=self.ana, destinatario=self.beto, conteudo="oi")
+        Mensagem.objects.create(remetente=self.carla, destinatario=self.ana, conteudo="oi")
+        self.client.force_login(self.ana)
+
+    def test_consulta_em_lote(self):
+        redis = _RedisFalso()
+        with mock.patch("chat.presenca.get_redis", return_value=redis):
+            presenca.renovar(self.beto.id, "aba")
+            r = self.client.get(reverse("chat:presenca"), {"ids": f"{self.beto.id},{self.carla.id}"})
+        self.assertEqual(r.json(), {str(self.beto.id): True, str(self.carla.id): False})
+        self.assertEqual(self.client.get(reverse("chat:presenca"), {"ids": "7,x"}).status_code, 400)
+
+    def test_so_quem_ja_conversou(self):
+        redis = _RedisFalso()
+        with mock.patch("chat.presenca.get_redis", return_value=redis):
+            presenca.renovar(self.davi.id, "aba")
+            ids = f"{self.beto.id},{self.davi.id},9999"
+            with self.assertNumQueries(3):      # sessão, usuário, conversas
+                r = self.client.get(reverse("chat:presenca"), {"ids": ids})
+        self.assertEqual(r.json(), {str(self.beto.id): False})
+
+
+class ComunicadoTests(TestCase):
+    def setUp(self):
+        self.motoboys = Group.objects.create(name="Motoboy")
+        Group.objects.create(name="Loja")
+        self.operador = User.objects.create_user("op", password="x")
+        self.operador.groups.add(Group.objects.create(name="Operador"))
+        self.motos = [User.objects.create_user(f"moto{i}", password="x") for i in range(5)]
+        self.motoboys.user_set.add(*self.motos)
+        self.loja = User.objects.create_user("loja", password="x")
+
+    def _enviar(self, usuario, conteudo="Pátio fechado às 18h"):
+        self.client.force_login(usuario)
+        with mock.patch("chat.comunicados.avisar_grupo") as avisar, self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post(reverse("chat:enviar_comunicado"), {"grupo_id": self.motoboys.id, "conteudo": conteudo})
+        return r, avisar
+
+    def test_uma_linha_e_um_envio_para_o_grupo(self):
+        r, avisar = self._enviar(self.operador)
+
+        self.assertEqual(r.json()["status"], "sucesso")
+        self.assertEqual(Comunicado.objects.count(), 1)
+        self.assertEqual(LeituraComunicado.objects.count(), 0)
+        self.assertEqual(Mensagem.objects.count(), 0)
+        avisar.enfileirar.assert_called_once()
+        grupo, evento = avisar.enfileirar.call_args.args
+        self.assertEqual(grupo, comunicados.canal(self.motoboys.id))
+        self.assertEqual(evento["comunicado"]["conteudo"], "Pátio fechado às 18h")
+
+    def test_so_operador_ou_admin_envia(self):
+        r, avisar = self._enviar(self.motos[0])
+        self.assertEqual(r.status_code, 403)
+        avisar.enfileirar.assert_not_called()
+        self.assertFalse(Comunicado.objects.exists())
+
+    def test_leitura_por_pessoa(self):
+        self._enviar(self.operador)
+        moto = self.motos[0]
+        self.assertEqual(comunicados.nao_lidos(moto).count(), 1)
+        self.assertEqual(comunicados.nao_lidos(self.loja).count(), 0)
+
+        self.client.force_login(moto)
+        self.assertEqual(self.client.get(reverse("chat:lista")).context["comunicados_nao_lidos"], 1)
+        self.assertFalse(self.client.get(reverse("chat:comunicados")).json()["comunicados"][0]["lido"])
+        self.client.post(reverse("chat:comunicados_lidos"))
+        self.client.post(reverse("chat:comunicados_lidos"))
+        self.assertTrue(self.client.get(reverse("chat:comunicados")).json()["comunicados"][0]["lido"])
+        self.assertEqual(comunicados.nao_lidos(self.motos[1]).count(), 1)
+
+        self.client.force_login(self.loja)
+        self.assertEqual(self.client.get(reverse("chat:comunicados")).json()["comunicados"], [])
+
+        self.client.force_login(self.operador)
+        with self.assertNumQueries(3):      # sessão, usuário, lista
+            enviado = self.client.get(reverse("chat:comunicados")).json()["comunicados"][0]
+        self.assertEqual((enviado["lidos"], enviado["destinatarios"]), (1, 5))
+
+    def test_destinatarios_sem_o_remetente_e_sem_quem_entrou_depois(self):
+        self.operador.groups.add(self.motoboys)
+        self._enviar(self.operador)
+        novato = User.objects.create_user("novato", password="x")
+        self.motoboys.user_set.add(novato)
+
+        enviado = self.client.get(reverse("chat:comunicados")).json()["comunicados"][0]
+        self.assertEqual(enviado["destinatarios"], 5)
+
+    def test_quem_entra_no_grupo_depois_nao_recebe_os_antigos(self):
+        antigo = User.objects.create_user("antigo", password="x")       # conta de antes do comunicado
+        self._enviar(self.operador)
+        self.motoboys.user_set.add(antigo)
+        antigo.groups.add(Group.objects.get(name="Loja"))
+
+        self.assertEqual(comunicados.nao_lidos(antigo).count(), 0)
+        self.client.force_login(antigo)
+        self.assertEqual(self.client.get(reverse("chat:comunicados")).json()["comunicados"], [])
+
+        self._enviar(self.operador, "Novo aviso")
+        self.assertEqual(comunicados.nao_lidos(antigo).count(), 1)
+        self.client.force_login(self.operador)
+        enviados = self.client.get(reverse("chat:comunicados")).json()["comunicados"]
+        self.assertEqual([c["destinatarios"] for c in enviados], [6, 5])
+
+        antigo.groups.remove(self.motoboys)
+        self.assertEqual(comunicados.nao_lidos(antigo).count(), 0)
+
+    def test_grupo_invalido_e_400(self):
+        self.client.force_login(self.operador)
+        r = self.client.post(reverse("chat:enviar_comunicado"), {"grupo_id": "abc", "conteudo": "oi"})
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(Comunicado.objects.exists())
@@ -6,6 +6,13 @@ app_name = 'chat'
 urlpatterns = [
     path('', views.chat_lista, name='lista'),
     path('buscar/<int:destinatario_id>/', views.buscar_mensagens, name='buscar'),
+    path('comunicados/', views.comunicados_lista, name='comunicados'),
+    path('comunicados/enviar/', views.enviar_comunicado, name='enviar_comunicado'),
+    path('comunicados/lidos/', views.comunicados_lidos, name='comunicados_lidos'),
+    path('presenca/', views.presenca_contatos, name='presenca'),
+    path('pesquisar/', views.pesquisar_mensagens, name='pesquisar'),
+    path('mensagem/<int:mensagem_id>/contexto/', views.contexto_mensagem, name='contexto'),
+    path('arquivo/<int:usuario_a>/<int:usuario_b>/<path:nome>', views.anexo_arquivado, name='anexo_arquivado'),
     path('enviar/', views.enviar_mensagem, name='enviar'),
     path('contatos-fragment/', views.contatos_fragment, name='contatos_fragment'),
     path('excluir/<int:mensagem_id>/', views.excluir_mensagem, name='excluir_mensagem'),
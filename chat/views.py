@@ -1,13 +1,16 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.db.models import Max, Q, Count, Value
-from .models import Mensagem
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import busca, comunicados, presenca, retencao
+from .models import ArquivoConversa, Mensagem
+from django.views.decorators.http import require_POST
+from rotas.tarefas import avisar_grupo
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.db.models.functions import Greatest
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from django.db.models.functions import Greatest, Coalesce
 from datetime import datetime
 
@@ -38,33 +41,56 @@ def chat_lista(request):
         )
     ).order_by('-ultima_interacao', 'username')
 
-    return render(request, 'chat/lista.html', {'usuarios': usuarios})
+    return render(request, 'chat/lista.html', {
+        'usuarios': usuarios,
+        'comunicados_nao_lidos': comunicados.nao_lidos(request.user).count(),
+        'pode_enviar_comunicado': comunicados.pode_enviar(request.user),
+        'grupos_comunicado': comunicados.grupos_destino(),
+    })
+
+def _mensagem_json(m):
+    url_arquivo = None
+    if m.arquivo:
+        try: url_arquivo = m.arquivo.url
+        except: url_arquivo = None
+
+    return {
+        'id': m.id,
+        'conteudo': m.conteudo or "",
+        'remetente_id': m.remetente.id,
+        'remetente__username': m.remetente.username,
+        'editada': getattr(m, 'editada', False),
+        'arquivo_url': url_arquivo,
+        'timestamp': m.timestamp.isoformat(), # ADICIONADO PARA O HORÁRIO FUNCIONAR
+    }
 
 @login_required
 def buscar_mensagens(request, destinatario_id):
+    # histórico arquivado (chat/retencao.py), página a página:
+    # ?arquivo=1&antes=<iso>&antes_id=<id da mensagem mais antiga na tela>
+    if request.GET.get("arquivo"):
+        antes = parse_datetime(request.GET.get("antes", "")) or timezone.now()
+        if timezone.is_naive(antes):
+            antes = timezone.make_aware(antes)
+        try:
+            antes_id = int(request.GET.get("antes_id") or 0) or None
+        except ValueError:
+            return JsonResponse({'error': 'Parâmetros inválidos.'}, status=400)
+        return JsonResponse(retencao.historico(request.user.id, destinatario_id, antes, antes_id), safe=False)
+
     try:
         mensagens = Mensagem.objects.filter(
             (Q(remetente=request.user) & Q(destinatario_id=destinatario_id)) |
             (Q(remetente_id=destinatario_id) & Q(destinatario=request.user))
-        ).order_by('timestamp')
-            
-        data = []
-        for m in mensagens:
-            url_arquivo = None
-            if m.arquivo:
-                try: url_arquivo = m.arquivo.url
-                except: url_arquivo = None
-
-            data.append({
-                'id': m.id,
-                'conteudo': m.conteudo or "",
-                'remetente_id': m.remetente.id,
-                'remetente__username': m.remetente.username,
-                'editada': getattr(m, 'editada', False),
-                'arquivo_url': url_arquivo,
-                'timestamp': m.timestamp.isoformat(), # ADICIONADO PARA O HORÁRIO FUNCIONAR
-            })
-        return JsonResponse(data, safe=False)
+        ).select_related('remetente').order_by('timestamp')
+
+        data = [_mensagem_json(m) for m in mensagens]
+        resposta = JsonResponse(data, safe=False)
+        # avisa o JS que há mensagens mais antigas no arquivo (botão "carregar antigas")
+        a, b = sorted((request.user.id, destinatario_id))
+        tem_arquivo = ArquivoConversa.objects.filter(usuario_a_id=a, usuario_b_id=b).exists()
+        resposta["X-Chat-Arquivo"] = "1" if tem_arquivo else "0"
+        return resposta
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
     
@@ -87,7 +113,6 @@ def enviar_mensagem(request):
             )
 
             # 2. Prepara os dados para o Websocket
-            channel_layer = get_channel_layer()
             data_payload = {
                 'id': mensagem.id,
                 'conteudo': mensagem.conteudo,
@@ -99,16 +124,10 @@ def enviar_mensagem(request):
             }
 
             # 3. Envia para o grupo do DESTINATÁRIO (para o contato subir no topo dele)
-            async_to_sync(channel_layer.group_send)(
-                f'user_{destinatario.id}',
-                {'type': 'chat_message', 'message': data_payload}
-            )
-
-            # 4. Envia para o grupo do REMETENTE (para o contato subir no seu próprio topo)
-            async_to_sync(channel_layer.group_send)(
-                f'user_{request.user.id}',
-                {'type': 'chat_message', 'message': data_payload}
-            )
+            #    e 4. para o do REMETENTE (para o contato subir no seu próprio topo).
+            #    O envio é feito pelo worker (rotas/tarefas.py), fora do request.
+            avisar_grupo.enfileirar(f'user_{destinatario.id}', {'type': 'chat_message', 'message': data_payload})
+            avisar_grupo.enfileirar(f'user_{request.user.id}', {'type': 'chat_message', 'message': data_payload})
 
             return JsonResponse({'status': 'sucesso'})
     return JsonResponse({'status': 'erro'}, status=400)
@@ -190,6 +209,94 @@ def marcar_como_lida(request, user_id):
     
     return JsonResponse({'status': 'ok'})
 
+@login_required
+def pesquisar_mensagens(request):
+    # ?q=<termo>&com=<id do contato, opcional>&cursor=<"proximo" da página anterior>
+    com = request.GET.get('com')
+    try:
+        resultado = busca.pesquisar(
+            request.user.id,
+            request.GET.get('q', ''),
+            com=int(com) if com else None,
+            cursor=request.GET.get('cursor') or None,
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetros inválidos.'}, status=400)
+    return JsonResponse(resultado)
+
+@login_required
+def contexto_mensagem(request, mensagem_id):
+    # salto para um resultado da busca: só a página ao redor da mensagem
+    pagina = busca.ao_redor(request.user.id, mensagem_id)
+    if pagina is None:
+        raise Http404
+    pagina['mensagens'] = [_mensagem_json(m) for m in pagina['mensagens']]
+    return JsonResponse(pagina)
+
+def _com_conversa(user, ids):
+    """Dos `ids`, os que já trocaram mensagem com `user` (na tabela ou no arquivo). Uma consulta."""
+    ids = list(dict.fromkeys(ids))[:presenca.MAX_IDS]
+    if not ids:
+        return []
+    # order_by(): Mensagem tem ordering padrão, que o UNION não aceita
+    enviadas = Mensagem.objects.filter(remetente=user, destinatario_id__in=ids).order_by().values_list('destinatario_id')
+    recebidas = Mensagem.objects.filter(destinatario=user, remetente_id__in=ids).order_by().values_list('remetente_id')
+    arquivo_a = ArquivoConversa.objects.filter(usuario_a=user, usuario_b_id__in=ids).values_list('usuario_b_id')
+    arquivo_b = ArquivoConversa.objects.filter(usuario_b=user, usuario_a_id__in=ids).values_list('usuario_a_id')
+    com_conversa = {i for (i,) in enviadas.union(recebidas, arquivo_a, arquivo_b)}
+    return [i for i in ids if i in com_conversa]
+
+@login_required
+def presenca_contatos(request):
+    # ?ids=1,2,3 -> {"1": true, "2": false, ...}; só Redis (chat/presenca.py).
+    # Só de quem já conversou com o usuário: os outros ids ficam fora da resposta
+    # (não dá para vigiar quem está online na base inteira).
+    try:
+        ids = [int(i) for i in request.GET.get('ids', '').split(',') if i]
+    except ValueError:
+        return JsonResponse({'error': 'ids inválidos.'}, status=400)
+    ids = _com_conversa(request.user, ids)
+    return JsonResponse({str(i): on for i, on in presenca.online(ids).items()})
+
+@login_required
+def comunicados_lista(request):
+    # ?antes=<id> para a página seguinte
+    try:
+        antes = int(request.GET.get('antes') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetros inválidos.'}, status=400)
+    return JsonResponse({'comunicados': comunicados.listar(request.user, antes=antes or None)})
+
+@login_required
+@require_POST
+def enviar_comunicado(request):
+    if not comunicados.pode_enviar(request.user):
+        return JsonResponse({'status': 'erro', 'message': 'Sem permissão para enviar comunicados.'}, status=403)
+
+    try:
+        grupo_id = int(request.POST.get('grupo_id') or 0)
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'message': 'Grupo inválido.'}, status=400)
+    conteudo = request.POST.get('conteudo', '').strip()
+    grupo = comunicados.grupos_destino().filter(id=grupo_id).first()
+    if not conteudo or grupo is None:
+        return JsonResponse({'status': 'erro', 'message': 'Escolha o grupo e escreva o comunicado.'}, status=400)
+
+    c = comunicados.enviar(request.user, grupo, conteudo)
+    return JsonResponse({'status': 'sucesso', 'id': c.id})
+
+@login_required
+@require_POST
+def comunicados_lidos(request):
+    return JsonResponse({'status': 'ok', 'marcados': comunicados.marcar_lidos(request.user)})
+
+@login_required
+def anexo_arquivado(request, usuario_a, usuario_b, nome):
+    caminho = retencao.caminho_anexo(request.user.id, usuario_a, usuario_b, nome)
+    if caminho is None:
+        raise Http404
+    return FileResponse(open(caminho, "rb"))
+
 def janela_mobile(request, destinatario_id):
     destinatario = get_object_or_404(User, id=destinatario_id)
     # Adicionamos uma flag no contexto para o HTML saber que é mobile
@@ -8,12 +8,13 @@ django.setup() # <--- ISSO DEVE VIR ANTES DE IMPORTAR O ROUTING
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 import chat.routing 
+import rotas.routing
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
         URLRouter(
-            chat.routing.websocket_urlpatterns
+            chat.routing.websocket_urlpatterns + rotas.routing.websocket_urlpatterns
         )
     ),
 })
\ No newline at end of file
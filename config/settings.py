@@ -35,6 +35,13 @@ DOMAIN_NAME = '172.61.4.180:8000'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Retenção do chat (chat/retencao.py, manage.py arquivar_chat): mensagens mais
+# velhas que isso saem da tabela quente; anexos vão para o diretório frio.
+CHAT_RETENCAO_DIAS = 180
+CHAT_ARQUIVO_FRIO = os.path.join(BASE_DIR, 'arquivo_frio')
+
+
+REDIS_URL = "redis://127.0.0.1:6379/0"
 
 CHANNEL_LAYERS = {
     'default': {
@@ -76,11 +83,14 @@ EMAIL_HOST_PASSWORD = "zewb rwjz bywb dvwp"
 DEFAULT_FROM_EMAIL = "Painel Rotas <no-reply@suaempresa.com.br>"
 
 MIDDLEWARE = [
+    'rotas.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'rotas.db_router.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -110,6 +120,9 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Pool de conexões do psycopg 3 (pacote psycopg-pool); com pool, CONN_MAX_AGE fica 0.
+DB_POOL = {"min_size": 2, "max_size": 10, "timeout": 10}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -118,9 +131,23 @@ DATABASES = {
         "PASSWORD": "admin",
         "HOST": "localhost",
         "PORT": "5432",
-    }
+        "OPTIONS": {"pool": DB_POOL},
+    },
 }
 
+# Réplica de leitura para dashboards/relatórios (ver rotas/db_router.py).
+# Sem DB_REPLICA_HOST aponta para o mesmo servidor — útil para testar local.
+DATABASES["replica"] = {
+    **DATABASES["default"],
+    "HOST": os.environ.get("DB_REPLICA_HOST", DATABASES["default"]["HOST"]),
+    "PORT": os.environ.get("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+    "OPTIONS": {"pool": DB_POOL},
+    "TEST": {"MIRROR": "default"},
+}
+
+DATABASE_ROUTERS = ["rotas.db_router.ReplicaRouter"]
+REPLICA_GRUDAR_SEGUNDOS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -157,3 +184,34 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# collectstatic: nomes com hash + .gz/.br; o WhiteNoise serve com cache longo (rotas/storage.py)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "rotas.storage.EstaticosComprimidos"},
+}
+
+
+# Métricas por view (rotas/metricas.py) e log de requests lentos
+
+METRICAS_LENTA_MS = 500
+LOG_DIR = BASE_DIR / "logs"
+LOG_DIR.mkdir(exist_ok=True)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "lentas": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": LOG_DIR / "lentas.log",
+            "maxBytes": 5 * 1024 * 1024,
+            "backupCount": 5,
+            "encoding": "utf-8",
+        },
+    },
+    "loggers": {
+        "rotas.lentas": {"handlers": ["lentas"], "level": "WARNING", "propagate": False},
+    },
+}
@@ -4,6 +4,9 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 
 from rotas.models import Loja, MovimentoEstoque, Protocolo, Transferencia  # ✅ vem do app rotas
+from rotas.widgets import AutocompleteSelect
+
+from . import provisionamento
 
 
 # -------------------------
@@ -70,6 +73,18 @@ class UsuarioGrupoForm(forms.Form):
     role = forms.ChoiceField(choices=ROLE_CHOICES, label="Grupo")
 
 
+class ImportarUsuariosForm(forms.Form):
+    planilha = forms.FileField(label="Planilha (CSV)", help_text="Colunas: " + ", ".join(provisionamento.COLUNAS))
+
+    def clean_planilha(self):
+        # cleaned_data["planilha"] vira a lista de linhas já validadas
+        linhas = provisionamento.ler_planilha(self.cleaned_data["planilha"])
+        erros = provisionamento.validar(linhas)
+        if erros:
+            raise forms.ValidationError(erros)
+        return linhas
+
+
 # -------------------------
 # LOJAS
 # -------------------------
@@ -78,12 +93,13 @@ class LojaForm(forms.ModelForm):
         model = Loja
         # ✅ Ajuste conforme seu model Loja atual:
         # no zip, Loja tinha "endereco" e "cidade"
-        fields = ["nome", "endereco", "cidade", "ativa"]
+        fields = ["nome", "endereco", "cidade", "ativa", "is_cd"]
         labels = {
             "nome": "Nome",
             "endereco": "Endereço",
             "cidade": "Cidade",
             "ativa": "Ativa",
+            "is_cd": "Centro de distribuição (CD)",
         }
 
 
@@ -131,11 +147,11 @@ class TransferenciaForm(forms.ModelForm):
             "nome_produto": forms.TextInput(attrs={"class": "form-control", "placeholder": "Ex: Cadeira Escritório"}),
             "marca": forms.TextInput(attrs={"class": "form-control"}),
             "quantidade": forms.NumberInput(attrs={"class": "form-control"}),
-            "loja_origem": forms.Select(attrs={"class": "form-control"}),
-            "loja_destino": forms.Select(attrs={"class": "form-control"}),
+            "loja_origem": AutocompleteSelect("painel:autocomplete_lojas", attrs={"class": "form-control"}),
+            "loja_destino": AutocompleteSelect("painel:autocomplete_lojas", attrs={"class": "form-control"}),
             "fornecedor": forms.TextInput(attrs={"class": "form-control"}),
             "responsavel": forms.TextInput(attrs={"class": "form-control"}),
-            "motorista": forms.Select(attrs={"class": "form-control"}),
+            "motorista": AutocompleteSelect("painel:autocomplete_motoristas", attrs={"class": "form-control"}),
             "retirado_por": forms.TextInput(attrs={"class": "form-control"}),
             "data": forms.DateInput(attrs={"type": "date", "class": "form-control"}),
             "numero_documento": forms.TextInput(attrs={"class": "form-control"}),
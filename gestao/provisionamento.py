@@ -0,0 +1,204 @@
+# gestao/provisionamento.py
+"""
+Cadastro em lote de usuários e lojas a partir de uma planilha (CSV exportado
+do Excel/Sheets, separado por ";" ou ","). Uma linha por usuário e/ou loja:
+
+    usuario;email;nome;sobrenome;funcao;telefone;loja;endereco;cidade;uf
+
+- funcao: Admin, Operador, Motoboy ou Loja. Loja vincula o usuário à loja
+  da coluna "loja".
+- linha sem usuario e com loja só cadastra a loja.
+- loja que ainda não existe (pelo nome) é criada e precisa de endereço e cidade.
+
+Tudo ou nada: erro em qualquer linha e nada é gravado. Usuário que já existe
+(pelo login) e loja que já existe (pelo nome) ficam como estão — rodar a
+mesma planilha de novo não duplica nada nem reenvia e-mail. O que é novo
+entra em poucos bulk_create; link de senha e geocodificação vão para a fila.
+"""
+import csv
+import io
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from gestao.tarefas import enviar_link_senha
+from rotas.models import Loja, Perfil
+from rotas.services import geo, paletes, referencia
+from rotas.tarefas import geocodificar_loja
+
+User = get_user_model()
+
+COLUNAS = ("usuario", "email", "nome", "sobrenome", "funcao", "telefone", "loja", "endereco", "cidade", "uf")
+# mesma tradução de gestao.views._set_group
+FUNCOES = {"Admin": "AdminInterno", "Operador": "Operador", "Motoboy": "Motoboy", "Loja": "Loja"}
+MAX_LINHAS = 5000
+LOTE = 500
+
+
+def ler_planilha(arquivo):
+    """[(número da linha, {coluna: valor})]. Levanta ValidationError se não der para ler."""
+    bruto = arquivo.read()
+    try:
+        texto = bruto.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        texto = bruto.decode("cp1252", errors="replace")   # "CSV" do Excel no Windows
+
+    try:
+        dialeto = csv.Sniffer().sniff(texto[:4096], delimiters=";,\t")
+    except csv.Error:
+        dialeto = csv.excel
+
+    leitor = csv.DictReader(io.StringIO(texto), dialect=dialeto)
+    leitor.fieldnames = [(c or "").strip().lower() for c in (leitor.fieldnames or [])]
+    if "usuario" not in leitor.fieldnames and "loja" not in leitor.fieldnames:
+        raise ValidationError(f"Cabeçalho não reconhecido. Colunas esperadas: {', '.join(COLUNAS)}.")
+
+    linhas = []
+    for numero, row in enumerate(leitor, start=2):
+        valores = {c: (row.get(c) or "").strip() for c in COLUNAS}
+        if any(valores.values()):
+            linhas.append((numero, valores))
+    if not linhas:
+        raise ValidationError("A planilha está vazia.")
+    if len(linhas) > MAX_LINHAS:
+        raise ValidationError(f"No máximo {MAX_LINHAS} linhas por planilha.")
+    return linhas
+
+
+def validar(linhas):
+    """Lista de erros ("Linha N: ...") — vazia se dá para provisionar."""
+    erros = []
+    vistos = {}
+    lojas_vinculadas = {}
+
+    nomes_loja = {v["loja"] for _, v in linhas if v["loja"]}
+    existentes = {
+        l.nome: l for l in Loja.objects.filter(nome__in=nomes_loja).select_related("usuario")
+    }
+
+    for numero, v in linhas:
+        def erro(msg):
+            erros.append(f"Linha {numero}: {msg}")
+
+        if v["usuario"]:
+            try:
+                User.username_validator(v["usuario"])
+            except ValidationError:
+                erro(f"usuário \"{v['usuario']}\" inválido (letras, números e @ . + - _).")
+            if v["usuario"] in vistos:
+                erro(f"usuário \"{v['usuario']}\" repetido (linha {vistos[v['usuario']]}).")
+            vistos.setdefault(v["usuario"], numero)
+
+            if v["email"]:
+                try:
+                    validate_email(v["email"])
+                except ValidationError:
+                    erro(f"e-mail \"{v['email']}\" inválido.")
+            if v["funcao"] not in FUNCOES:
+                erro(f"função \"{v['funcao']}\" inválida (use {', '.join(FUNCOES)}).")
+            if v["funcao"] == "Loja":
+                if not v["loja"]:
+                    erro("usuário de Loja precisa da coluna loja.")
+                elif v["loja"] in lojas_vinculadas:
+                    erro(f"loja \"{v['loja']}\" já vinculada na linha {lojas_vinculadas[v['loja']]}.")
+                else:
+                    lojas_vinculadas[v["loja"]] = numero
+                    loja = existentes.get(v["loja"])
+                    if loja and loja.usuario and loja.usuario.username != v["usuario"]:
+                        erro(f"loja \"{v['loja']}\" já pertence ao usuário {loja.usuario.username}.")
+        elif not v["loja"]:
+            erro("informe usuario e/ou loja.")
+
+        if v["loja"] and v["loja"] not in existentes and not (v["endereco"] and v["cidade"]):
+            erro(f"loja nova \"{v['loja']}\" precisa de endereço e cidade.")
+        if len(v["uf"]) > 2:
+            erro("uf deve ter 2 letras.")
+
+    return erros
+
+
+def provisionar(linhas, dominio, https=False):
+    """
+    Cria o que ainda não existe (linhas já validadas). Devolve
+    {"usuarios_criados", "usuarios_existentes", "lojas_criadas", "lojas_existentes", "emails"}.
+    """
+    with transaction.atomic():
+        existentes = set(
+            User.objects.filter(username__in={v["usuario"] for _, v in linhas if v["usuario"]})
+            .values_list("username", flat=True)
+        )
+        lojas = {l.nome: l for l in Loja.objects.filter(nome__in={v["loja"] for _, v in linhas if v["loja"]})}
+        lojas_existentes = set(lojas)
+
+        # usuários (senha fica inutilizável até o link por e-mail)
+        novos = {}
+        for _, v in linhas:
+            if not v["usuario"] or v["usuario"] in existentes or v["usuario"] in novos:
+                continue
+            admin = v["funcao"] == "Admin"
+            u = User(
+                username=v["usuario"], email=v["email"], first_name=v["nome"], last_name=v["sobrenome"],
+                is_active=True, is_staff=admin, is_superuser=admin,
+            )
+            u.set_unusable_password()
+            novos[u.username] = u
+        User.objects.bulk_create(novos.values(), batch_size=LOTE)
+
+        # grupos, perfil
+        grupos = {}
+        for nome in {FUNCOES[v["funcao"]] for _, v in linhas if v["usuario"] in novos}:
+            grupos[nome], _ = Group.objects.get_or_create(name=nome)
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=novos[v["usuario"]].id, group_id=grupos[FUNCOES[v["funcao"]]].id)
+            for _, v in linhas if v["usuario"] in novos
+        ], batch_size=LOTE)
+        Perfil.objects.bulk_create([
+            Perfil(user=novos[v["usuario"]], telefone=v["telefone"])
+            for _, v in linhas if v["usuario"] in novos and v["telefone"]
+        ], batch_size=LOTE)
+
+        # lojas novas já nascem vinculadas; as que existem sem dono ganham o vínculo
+        criar, vincular = [], []
+        for _, v in linhas:
+            if not v["loja"]:
+                continue
+            dono = novos.get(v["usuario"]) if v["funcao"] == "Loja" else None
+            loja = lojas.get(v["loja"])
+            if loja is None:
+                loja = lojas[v["loja"]] = Loja(
+                    nome=v["loja"], endereco=v["endereco"], cidade=v["cidade"], uf=v["uf"].upper() or "SP",
+                    usuario=dono, geocodificacao="pendente",
+                )
+                criar.append(loja)
+            elif dono is not None and loja.usuario_id is None:
+                loja.usuario = dono
+                vincular.append(loja)
+        Loja.objects.bulk_create(criar, batch_size=LOTE)
+        Loja.objects.bulk_update(vincular, ["usuario"], batch_size=LOTE)
+
+        # bulk_* não dispara os signals de rotas/models.py
+        if criar or vincular:
+            geo.invalidar()
+            paletes.invalidar()
+            referencia.invalidar(referencia.LOJAS)
+        if novos:
+            referencia.invalidar(referencia.MOTOBOYS)
+
+        emails = 0
+        for u in novos.values():
+            if u.email:
+                enviar_link_senha.enfileirar(u.id, dominio, https)
+                emails += 1
+        for loja in criar:
+            geocodificar_loja.enfileirar(loja.id)
+
+    return {
+        "usuarios_criados": sorted(novos),
+        "usuarios_existentes": sorted(existentes),
+        "lojas_criadas": sorted(l.nome for l in criar),
+        "lojas_existentes": sorted(lojas_existentes),
+        "emails": emails,
+    }
@@ -0,0 +1,47 @@
+function qs(sel){ return document.querySelector(sel); }
+function qsa(sel){ return [...document.querySelectorAll(sel)]; }
+
+function recomputeCounts(){
+  const cards = qsa('.nota-card');
+
+  const counts = { pendente:0, em_transito:0, confirmada:0 };
+  cards.forEach(c => {
+    const st = c.dataset.status || '';
+    if (counts[st] !== undefined) counts[st] += 1;
+  });
+
+  qs('#kpi-pendente').textContent   = counts.pendente;
+  qs('#kpi-transito').textContent   = counts.em_transito;
+  qs('#kpi-confirmada').textContent = counts.confirmada;
+
+  qs('#count-pendente').textContent   = counts.pendente;
+  qs('#count-transito').textContent   = counts.em_transito;
+  qs('#count-confirmada').textContent = counts.confirmada;
+}
+
+function applyFilters(){
+  const term = (qs('#f_search').value || '').toLowerCase().trim();
+  const st = qs('#f_status').value || '';
+
+  qsa('.nota-card').forEach(card => {
+    const okStatus = !st || card.dataset.status === st;
+    const hay = (card.dataset.search || '').toLowerCase();
+    const okTerm = !term || hay.includes(term);
+
+    card.style.display = (okStatus && okTerm) ? '' : 'none';
+  });
+}
+
+function resetFilters(){
+  qs('#f_search').value = '';
+  qs('#f_status').value = '';
+  applyFilters();
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+  recomputeCounts();
+  applyFilters();
+
+  qs('#f_search').addEventListener('input', applyFilters);
+  qs('#f_status').addEventListener('change', applyFilters);
+});
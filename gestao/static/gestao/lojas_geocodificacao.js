@@ -0,0 +1,43 @@
+// resultado da geocodificação em segundo plano (rotas/tarefas.py -> ws/lojas/geocodificacao/)
+function pintarGeocodificacao(el, d) {
+  el.replaceChildren()
+  const badge = document.createElement('span')
+  badge.className = 'badge'
+  el.appendChild(badge)
+
+  if (d.geocodificacao === 'ok') {
+    badge.textContent = 'OK'
+    el.append(` ${d.latitude.toFixed(6)}, ${d.longitude.toFixed(6)} `)
+    if (d.endereco_normalizado) {
+      const end = document.createElement('span')
+      end.className = 'muted'
+      end.textContent = `• ${d.endereco_normalizado}`
+      el.appendChild(end)
+    }
+  } else if (d.geocodificacao === 'indisponivel') {
+    badge.textContent = 'Serviço de mapas indisponível'
+    const dica = document.createElement('span')
+    dica.className = 'muted'
+    dica.textContent = ' • salve a loja para tentar de novo'
+    el.appendChild(dica)
+  } else {
+    badge.textContent = 'Endereço não encontrado'
+  }
+}
+
+function conectarGeocodificacao(tentativa = 0) {
+  if (!document.querySelector('[data-geo-loja]')) return
+  const wsProtocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://'
+  const socket = new WebSocket(`${wsProtocol}${window.location.host}/ws/lojas/geocodificacao/`)
+
+  socket.onopen = () => { tentativa = 0 }
+  socket.onmessage = (e) => {
+    const d = JSON.parse(e.data)
+    document.querySelectorAll(`[data-geo-loja="${d.loja_id}"]`).forEach((el) => pintarGeocodificacao(el, d))
+  }
+  socket.onclose = () => {
+    setTimeout(() => conectarGeocodificacao(tentativa + 1), Math.min(30000, 1000 * 2 ** tentativa))
+  }
+}
+
+document.addEventListener('DOMContentLoaded', () => conectarGeocodificacao())
@@ -0,0 +1,62 @@
+const $ = (s) => document.querySelector(s);
+const $$ = (s) => [...document.querySelectorAll(s)];
+
+function applyPaleteFilters(){
+  const term = ($('#f_loja').value || '').toLowerCase().trim();
+  const order = $('#f_order').value;
+
+  const cards = $$('.palete-card');
+
+  // filtro
+  cards.forEach(c => {
+    const nome = (c.dataset.loja || '').toLowerCase();
+    c.style.display = (!term || nome.includes(term)) ? '' : 'none';
+  });
+
+  // ordenação (reordena no DOM)
+  const grid = $('#grid-paletes');
+  const visible = cards.filter(c => c.style.display !== 'none');
+
+  visible.sort((a,b) => {
+    const ta = parseInt(a.dataset.total || '0', 10);
+    const tb = parseInt(b.dataset.total || '0', 10);
+    const la = (a.dataset.loja || '').toLowerCase();
+    const lb = (b.dataset.loja || '').toLowerCase();
+
+    if (order === 'desc') return tb - ta;
+    if (order === 'asc') return ta - tb;
+    if (order === 'az') return la.localeCompare(lb);
+    if (order === 'za') return lb.localeCompare(la);
+    return 0;
+  });
+
+  visible.forEach(c => grid.appendChild(c));
+}
+
+// contadores ao vivo: o servidor manda {"contagens": {loja_id: total}} quando algo muda
+function conectarPaletes(tentativa = 0){
+  const wsProtocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+  const socket = new WebSocket(`${wsProtocol}${window.location.host}/ws/paletes/`);
+
+  socket.onopen = () => { tentativa = 0; };
+  socket.onmessage = (e) => {
+    const contagens = JSON.parse(e.data).contagens || {};
+    Object.entries(contagens).forEach(([lojaId, total]) => {
+      const card = document.querySelector(`.palete-card[data-loja-id="${lojaId}"]`);
+      if (!card) return;
+      card.dataset.total = total;
+      card.querySelector('.js-total').textContent = total;
+    });
+    applyPaleteFilters();
+  };
+  socket.onclose = () => {
+    setTimeout(() => conectarPaletes(tentativa + 1), Math.min(30000, 1000 * 2 ** tentativa));
+  };
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+  $('#f_loja').addEventListener('input', applyPaleteFilters);
+  $('#f_order').addEventListener('change', applyPaleteFilters);
+  applyPaleteFilters();
+  conectarPaletes();
+});
@@ -0,0 +1,23 @@
+# gestao/tarefas.py
+"""Tarefas em segundo plano do app gestao (ver rotas/services/fila.py)."""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.forms import PasswordResetForm
+
+from rotas.services import fila
+
+
+@fila.tarefa(tentativas=5)
+def enviar_link_senha(user_id, dominio, https=False):
+    user = get_user_model().objects.filter(id=user_id).first()
+    if user is None or not user.email:
+        return
+
+    form = PasswordResetForm({"email": user.email})
+    if form.is_valid():
+        form.save(
+            domain_override=dominio,
+            use_https=https,
+            from_email=None,
+            email_template_name="registration/password_reset_email.html",
+            subject_template_name="registration/password_reset_subject.txt",
+        )
@@ -1,3 +1,359 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rotas import metricas
+from rotas.models import Loja, Perfil, Transferencia
+from rotas import tarefas
+from rotas.services import fila, geocode, paletes, resiliente
+from rotas.services.redis_conn import get_redis
+from rotas.services.transicoes import coletar_transferencias
+
+User = get_user_model()
+
+
+# porta fechada: o monitor precisa funcionar (contando no banco) sem Redis
+@override_settings(REDIS_URL="redis://127.0.0.1:1/0")
+class MonitorPaletesTests(TestCase):
+    def setUp(self):
+        get_redis.cache_clear()
+        self.addCleanup(get_redis.cache_clear)
+        self.cd = Loja.objects.create(nome="Depósito Central", cidade="SP", is_cd=True)
+        self.loja = Loja.objects.create(nome="Loja Centro", cidade="SP")
+        self.outra = Loja.objects.create(nome="Loja Norte", cidade="SP")
+
+    def _transferencia(self, origem, destino, status="pendente"):
+        return Transferencia.objects.create(
+            tipo="saida", loja_origem=origem, loja_destino=destino, status=status,
+        )
+
+    def test_delta_so_conta_pendente_saindo_do_cd(self):
+        cd, loja = self.cd.id, self.loja.id
+        self.assertEqual(paletes.delta_transicao(("", None, None), ("pendente", cd, loja)), {loja: 1})
+        self.assertEqual(paletes.delta_transicao(("pendente", cd, loja), ("em_transito", cd, loja)), {loja: -1})
+        self.assertEqual(paletes.delta_transicao(("", None, None), ("pendente", self.outra.id, loja)), {})
+        self.assertEqual(paletes.delta_transicao(("pendente", cd, loja), ("pendente", cd, loja)), {})
+
+    def test_save_coleta_e_delete_aplicam_delta_apos_commit(self):
+        with mock.patch.object(paletes, "_incrementar") as incrementar:
+            with self.captureOnCommitCallbacks(execute=True):
+                t1 = self._transferencia(self.cd, self.loja)
+                t2 = self._transferencia(self.cd, self.outra)
+                self._transferencia(self.loja, self.outra)
+            with self.captureOnCommitCallbacks(execute=True):
+                coletar_transferencias(Transferencia.objects.filter(id=t1.id), None)
+            with self.captureOnCommitCallbacks(execute=True):
+                t2.delete()
+
+        self.assertEqual(
+            [c.args[0] for c in incrementar.call_args_list],
+            [{self.loja.id: 1}, {self.outra.id: 1}, {self.loja.id: -1}, {self.outra.id: -1}],
+        )
+
+    def test_monitor_sem_redis_conta_no_banco_e_esconde_cd(self):
+        self._transferencia(self.cd, self.loja)
+        self._transferencia(self.cd, self.loja)
+        self._transferencia(self.cd, self.outra, status="em_transito")
+        self.client.force_login(User.objects.create_superuser("admin", "a@example.com", "x"))
+
+        resp = self.client.get(reverse("gestao:monitor_paletes"))
+
+        self.assertEqual(resp.status_code, 200)
+        totais = {p["nome_loja"]: p["total_notas"] for p in resp.context["paletes"]}
+        self.assertEqual(totais, {"Loja Centro": 2, "Loja Norte": 0})
+
+
+class _VersaoFalsa:
+    def __init__(self):
+        self.versoes = {}
+
+    def get(self, chave):
+        return self.versoes.get(chave)
+
+    def incr(self, chave):
+        self.versoes[chave] = self.versoes.get(chave, 0) + 1
+
+
+class PaletesCompartilhadoTests(TestCase):
+    def setUp(self):
+        from rotas.services import referencia
+
+        self.redis = _VersaoFalsa()
+        patcher = mock.patch.object(referencia, "get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        referencia.limpar()
+        self.addCleanup(referencia.limpar)
+        self.cd = Loja.objects.create(nome="CD", cidade="SP", is_cd=True)
+        self.loja = Loja.objects.create(nome="Loja", cidade="SP")
+
+    def test_cd_marcado_em_outro_processo_vale_aqui(self):
+        self.assertEqual(paletes.ids_cd(), {self.cd.id})
+        # outro worker salvou a loja: aqui só chega a versão nova no Redis
+        Loja.objects.filter(id=self.loja.id).update(is_cd=True)
+        self.assertEqual(paletes.ids_cd(), {self.cd.id})
+        self.redis.incr("referencia:lojas:versao")
+        self.assertEqual(paletes.ids_cd(), {self.cd.id, self.loja.id})
+
+    def test_recontagem_le_do_primario(self):
+        with mock.patch.object(paletes, "get_redis"), \
+                mock.patch.object(paletes, "pendentes_por_destino", return_value={}) as contar:
+            paletes.recontar()
+        self.assertEqual(contar.call_args.args[0].db, "default")
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        metricas.zerar()
+        self.staff = User.objects.create_user("staff", password="x", is_staff=True)
+
+    def test_agrega_por_view_e_exige_staff(self):
+        self.client.force_login(User.objects.create_user("comum", password="x"))
+        self.assertEqual(self.client.get(reverse("gestao:metricas")).status_code, 302)
+
+        self.client.force_login(self.staff)
+        self.client.get(reverse("gestao:monitor_paletes"))
+        dados = self.client.get(reverse("gestao:metricas")).json()
+
+        monitor = dados["views"]["gestao:monitor_paletes"]
+        self.assertEqual(monitor["requests"], 1)
+        self.assertGreater(monitor["queries"]["max"], 0)
+
+    def test_servicos_externos_vem_do_que_os_workers_publicaram(self):
+        resiliente.limpar()
+        self.addCleanup(resiliente.limpar)
+        resiliente.host("nominatim.openstreetmap.org").contadores["ok"] += 2
+        publicado = mock.MagicMock()
+        worker = fila.Worker(redis=publicado)
+        worker.publicar(forcar=True)
+        resiliente.limpar()           # o processo web não chamou ninguém
+
+        redis = mock.MagicMock(**{n + ".return_value": 0 for n in ("llen", "zcard", "zcount")})
+        redis.hgetall.return_value = {worker.nome.encode(): publicado.hset.call_args.args[2]}
+        self.client.force_login(self.staff)
+        with mock.patch.object(fila, "get_redis", return_value=redis):
+            http = self.client.get(reverse("gestao:metricas")).json()["http"]
+
+        self.assertEqual(http["processo"], {})
+        self.assertEqual(
+            http["workers"][worker.nome]["nominatim.openstreetmap.org"]["contadores"], {"ok": 2},
+        )
+
+    @override_settings(METRICAS_LENTA_MS=0)
+    def test_request_lento_vai_para_o_log_com_sql(self):
+        self.client.force_login(self.staff)
+        with self.assertLogs("rotas.lentas", level="WARNING") as log:
+            self.client.get(reverse("gestao:monitor_paletes"))
+
+        self.assertIn('"view": "gestao:monitor_paletes"', log.output[0])
+        self.assertIn("SELECT", log.output[0])
+
+
+class GeocodificacaoLojaTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user("admin", password="x")
+        admin.groups.add(Group.objects.create(name="AdminInterno"))
+        self.client.force_login(admin)
+
+    def test_cadastro_fica_pendente_e_enfileira_depois_do_commit(self):
+        dados = {"nome": "Loja Sul", "endereco": "Rua A, 10", "cidade": "SP", "ativa": "on"}
+        with mock.patch.object(tarefas.geocodificar_loja, "enfileirar") as enfileirar:
+            resp = self.client.post(reverse("gestao:loja_nova"), dados)
+
+        loja = Loja.objects.get(nome="Loja Sul")
+        self.assertRedirects(resp, reverse("gestao:lojas_lista"))
+        self.assertEqual(loja.geocodificacao, "pendente")
+        enfileirar.assert_called_once_with(loja.id)
+
+        resp = self.client.get(reverse("gestao:lojas_lista"))
+        self.assertContains(resp, f'data-geo-loja="{loja.id}"')
+        self.assertContains(resp, "Localizando endereço")
+
+    @override_settings(REDIS_URL="redis://127.0.0.1:1/0")
+    def test_sem_redis_roda_no_processo_e_sai_de_pendente(self):
+        get_redis.cache_clear()
+        self.addCleanup(get_redis.cache_clear)
+        dados = {"nome": "Loja Sul", "endereco": "Rua A, 10", "cidade": "SP", "ativa": "on"}
+        fora = resiliente.Indisponivel("nominatim", "circuito aberto")
+
+        with mock.patch.object(geocode, "geocode_loja_com_fallback", side_effect=fora) as geocodificar, \
+                mock.patch.object(tarefas, "avisar_grupo"), \
+                self.assertLogs("rotas.services.fila", level="WARNING"), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("gestao:loja_nova"), dados)
+
+        self.assertEqual(geocodificar.call_count, tarefas.geocodificar_loja.tentativas)
+        self.assertEqual(Loja.objects.get(nome="Loja Sul").geocodificacao, "indisponivel")
+
+    def test_job_grava_num_update_e_avisa_a_pagina(self):
+        loja = Loja.objects.create(nome="Loja Sul", endereco="Rua A, 10", cidade="SP", geocodificacao="pendente")
+        res = (-23.5, -46.6, "Rua A, 10, São Paulo", {"road": "Rua A", "house_number": "10", "city": "São Paulo"})
+
+        with mock.patch.object(geocode, "geocode_loja_com_fallback", return_value=res), \
+                mock.patch.object(tarefas, "avisar_grupo") as avisar, \
+                self.assertNumQueries(2):
+            tarefas.geocodificar_loja(loja.id)
+
+        loja.refresh_from_db()
+        self.assertEqual((loja.geocodificacao, loja.latitude, loja.longitude), ("ok", -23.5, -46.6))
+        grupo, evento = avisar.call_args.args
+        self.assertEqual(grupo, geocode.GRUPO)
+        self.assertEqual((evento["type"], evento["loja_id"], evento["geocodificacao"]),
+                         ("loja_geocodificada", loja.id, "ok"))
+
+    def test_endereco_editado_no_meio_do_caminho_descarta_o_resultado(self):
+        loja = Loja.objects.create(nome="Loja Sul", endereco="Rua A, 10", cidade="SP", geocodificacao="pendente")
+
+        def geocodificar_e_editar(l):
+            Loja.objects.filter(id=l.id).update(endereco="Rua B, 20")
+            return (-23.5, -46.6, "Rua A, 10", {})
+
+        with mock.patch.object(geocode, "geocode_loja_com_fallback", side_effect=geocodificar_e_editar), \
+                mock.patch.object(tarefas, "avisar_grupo") as avisar:
+            tarefas.geocodificar_loja(loja.id)
+
+        loja.refresh_from_db()
+        self.assertIsNone(loja.latitude)
+        avisar.assert_not_called()
+
+
+    def test_sem_resultado_apaga_as_coordenadas_antigas(self):
+        loja = Loja.objects.create(nome="Loja Sul", endereco="Rua Nova, 1", cidade="SP",
+                                   latitude=-23.5, longitude=-46.6, geocodificacao="pendente")
+
+        with mock.patch.object(geocode, "geocode_loja_com_fallback", return_value=None), \
+                mock.patch.object(tarefas, "avisar_grupo"):
+            tarefas.geocodificar_loja(loja.id)
+
+        loja.refresh_from_db()
+        self.assertEqual((loja.geocodificacao, loja.latitude, loja.longitude), ("sem_resultado", None, None))
+        self.assertContains(self.client.get(reverse("gestao:lojas_lista")), "Endereço não encontrado")
+
+    def test_fila_desiste_e_a_loja_sai_de_pendente(self):
+        loja = Loja.objects.create(nome="Loja Sul", endereco="Rua A, 10", cidade="SP",
+                                   latitude=-23.5, longitude=-46.6, geocodificacao="pendente")
+        job = {"id": "x", "tarefa": tarefas.geocodificar_loja.nome, "args": [loja.id], "kwargs": {},
+               "tentativa": tarefas.geocodificar_loja.tentativas - 1, "enfileirado_em": 0, "disponivel_em": 0}
+
+        with mock.patch.object(geocode, "geocode_loja_com_fallback", side_effect=resiliente.Indisponivel("nominatim", "circuito aberto")), \
+                mock.patch.object(tarefas, "avisar_grupo") as avisar, \
+                mock.patch.object(fila, "close_old_connections"), \
+                self.assertLogs("rotas.services.fila", level="ERROR"):
+            fila.Worker(redis=mock.MagicMock()).rodar(job)
+
+        loja.refresh_from_db()
+        self.assertEqual((loja.geocodificacao, loja.latitude), ("indisponivel", None))
+        self.assertEqual(avisar.call_args.args[1]["geocodificacao"], "indisponivel")
+        self.assertContains(self.client.get(reverse("gestao:lojas_lista")), "Serviço de mapas indisponível")
+
+
+class UsuariosListaTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", password="x")
+        self.admin.groups.add(Group.objects.create(name="AdminInterno"))
+        self.motoboy = Group.objects.create(name="Motoboy")
+        self.grupo_loja = Group.objects.create(name="Loja")
+        self.client.force_login(self.admin)
+
+    def _criar(self, n, inicio=0):
+        for i in range(inicio, inicio + n):
+            u = User.objects.create_user(f"moto{i:02d}", email=f"moto{i}@example.com")
+            u.groups.add(self.motoboy)
+            Perfil.objects.create(user=u, telefone=f"1199999{i:04d}")
+            l = User.objects.create_user(f"loja{i:02d}")
+            l.groups.add(self.grupo_loja)
+            Loja.objects.create(nome=f"Loja {i}", cidade="SP", usuario=l)
+
+    def _queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("gestao:usuarios_lista"))
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx)
+
+    def test_queries_nao_crescem_com_os_usuarios(self):
+        self._criar(2)
+        poucos = self._queries()
+        self._criar(10, inicio=2)
+        self.assertEqual(self._queries(), poucos)
+
+        resp = self.client.get(reverse("gestao:usuarios_lista"))
+        self.assertContains(resp, "Loja: Loja 3")
+        self.assertContains(resp, "119999")
+
+    def test_busca_filtro_e_paginacao(self):
+        self._criar(3)
+
+        resp = self.client.get(reverse("gestao:usuarios_lista"), {"q": "moto1@", "funcao": "Motoboy"})
+        self.assertEqual([u.username for u in resp.context["usuarios"]], ["moto01"])
+
+        resp = self.client.get(reverse("gestao:usuarios_lista"), {"funcao": "Loja"})
+        self.assertEqual([u.username for u in resp.context["usuarios"]], ["loja00", "loja01", "loja02"])
+
+        User.objects.create_superuser("root", "r@example.com", "x")
+        resp = self.client.get(reverse("gestao:usuarios_lista"), {"funcao": "Admin"})
+        self.assertEqual([u.username for u in resp.context["usuarios"]], ["admin", "root"])
+
+        with mock.patch("gestao.views.USUARIOS_POR_PAGINA", 2):
+            resp = self.client.get(reverse("gestao:usuarios_lista"), {"funcao": "Motoboy", "page": 2})
+        self.assertEqual([u.username for u in resp.context["usuarios"]], ["moto02"])
+        self.assertContains(resp, "funcao=Motoboy&amp;page=1")
+
+
+PLANILHA = """usuario;email;nome;sobrenome;funcao;telefone;loja;endereco;cidade;uf
+joao;joao@example.com;João;Silva;Motoboy;11999990000;;;;
+loja_sul;sul@example.com;;;Loja;;Loja Sul;Rua A, 10;Embu;sp
+ana;;Ana;;Operador;;;;;
+;;;;;;Loja Norte;Rua B, 20;Osasco;SP
+"""
+
+
+class ImportarUsuariosTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user("admin", password="x")
+        admin.groups.add(Group.objects.create(name="AdminInterno"))
+        self.client.force_login(admin)
+
+    def _importar(self, texto):
+        arquivo = SimpleUploadedFile("usuarios.csv", texto.encode("utf-8-sig"), content_type="text/csv")
+        with mock.patch("gestao.provisionamento.enviar_link_senha.enfileirar") as email, \
+                mock.patch("gestao.provisionamento.geocodificar_loja.enfileirar") as geocodificar, \
+                self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse("gestao:usuarios_importar"), {"planilha": arquivo})
+        return resp, email, geocodificar
+
+    def test_cria_em_lote_enfileira_e_reimportar_nao_duplica(self):
+        resp, email, geocodificar = self._importar(PLANILHA)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["resultado"]["usuarios_criados"], ["ana", "joao", "loja_sul"])
+        joao = User.objects.get(username="joao")
+        self.assertEqual(list(joao.groups.values_list("name", flat=True)), ["Motoboy"])
+        self.assertEqual(joao.perfil.telefone, "11999990000")
+        self.assertFalse(joao.has_usable_password())
+        sul = Loja.objects.get(nome="Loja Sul")
+        self.assertEqual((sul.usuario.username, sul.uf, sul.geocodificacao), ("loja_sul", "SP", "pendente"))
+        self.assertEqual(email.call_count, 2)
+        self.assertEqual(
+            sorted(c.args[0] for c in geocodificar.call_args_list),
+            sorted(Loja.objects.values_list("id", flat=True)),
+        )
+
+        resp, email, geocodificar = self._importar(PLANILHA)
+        self.assertEqual(resp.context["resultado"]["usuarios_criados"], [])
+        self.assertEqual(resp.context["resultado"]["usuarios_existentes"], ["ana", "joao", "loja_sul"])
+        self.assertEqual((User.objects.count(), Loja.objects.count()), (4, 2))
+        email.assert_not_called()
+        geocodificar.assert_not_called()
+
+    def test_erro_em_uma_linha_nao_grava_nada(self):
+        resp, _, _ = self._importar(PLANILHA + "maria;;;;Gerente;;;;;\njoao;;;;Motoboy;;;;;\n")
+
+        self.assertContains(resp, "Linha 6: função")
+        self.assertContains(resp, "Linha 7: usuário &quot;joao&quot; repetido (linha 2).")
+        self.assertEqual((User.objects.count(), Loja.objects.count()), (1, 0))
@@ -9,6 +9,7 @@ urlpatterns = [
     # usuários
     path("usuarios/", views.usuarios_lista, name="usuarios_lista"),
     path("usuarios/novo/", views.usuario_criar, name="usuario_criar"),
+    path("usuarios/importar/", views.usuarios_importar, name="usuarios_importar"),
     path("usuarios/<int:user_id>/ativar/", views.usuario_toggle_ativo, name="usuario_toggle_ativo"),
     path("usuarios/<int:user_id>/grupo/", views.usuario_trocar_grupo, name="usuario_trocar_grupo"),
     path("usuarios/<int:user_id>/editar/", views.usuario_editar, name="usuario_editar"),
@@ -33,4 +34,7 @@ urlpatterns = [
     path("transferencias/nova/", views.transferencia_nova, name="transferencia_nova"),
     path('separacao/', views.monitor_paletes_cd, name='monitor_paletes'),
     path('separacao/loja/<str:loja_nome>/', views.detalhe_separacao_cd, name='detalhe_separacao'),
+
+    # métricas por view (staff)
+    path("metricas/", views.metricas, name="metricas"),
 ]
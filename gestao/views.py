@@ -1,6 +1,6 @@
 from django.contrib import messages
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import PasswordResetForm, SetPasswordForm
+from django.contrib.auth.forms import SetPasswordForm
 from django.contrib.auth.models import Group
 from django.contrib.auth.tokens import default_token_generator
 from django.shortcuts import get_object_or_404, redirect, render
@@ -9,14 +9,24 @@ from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.db.models import Prefetch, Q
+from . import provisionamento
 from .decorators import admin_interno_required
-from .forms import LojaForm, UsuarioCriarForm, UsuarioEditarForm, UsuarioGrupoForm,ProtocoloConfirmarForm, ProtocoloForm, MovimentoEstoqueForm, TransferenciaForm
+from .tarefas import enviar_link_senha
+from .forms import ImportarUsuariosForm, LojaForm, UsuarioCriarForm, UsuarioEditarForm, UsuarioGrupoForm,ProtocoloConfirmarForm, ProtocoloForm, MovimentoEstoqueForm, TransferenciaForm
 from rotas.models import Loja, Protocolo
 from rotas.models import MovimentoEstoque, Transferencia, Loja, Protocolo
+from rotas.services import paletes as contadores_paletes
+from rotas.services import fila, referencia, resiliente
+from rotas.tarefas import geocodificar_loja
 from django.db import transaction
 from django.core.exceptions import PermissionDenied
 from django.db.models import Count, F
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+from rotas import metricas as rotas_metricas
+from rotas.db_router import usar_replica
 
 User = get_user_model()
 
@@ -39,17 +49,9 @@ def _send_set_password_link(request, user):
     if not user.email:
         return False
 
-    form = PasswordResetForm({"email": user.email})
-    if form.is_valid():
-        form.save(
-            request=request,
-            use_https=False,  # em produção: True
-            from_email=None,
-            email_template_name="registration/password_reset_email.html",
-            subject_template_name="registration/password_reset_subject.txt",
-        )
-        return True
-    return False
+    # SMTP fica com o worker (gestao/tarefas.py); aqui só enfileira
+    enviar_link_senha.enfileirar(user.id, request.get_host(), request.is_secure())
+    return True
 
 
 @admin_interno_required
@@ -67,10 +69,64 @@ def usuario_link_senha(request, user_id):
     return render(request, "gestao/usuario_link_senha.html", {"u": u, "link": link})
 
 
+USUARIOS_POR_PAGINA = 50
+
+# ?funcao= da lista -> grupo (Admin também pega superusuário, ver _set_group)
+FUNCOES_FILTRO = {"Admin": "AdminInterno", "Operador": "Operador", "Motoboy": "Motoboy", "Loja": "Loja"}
+
+
 @admin_interno_required
 def usuarios_lista(request):
-    usuarios = User.objects.all().order_by("username")
-    return render(request, "gestao/usuarios_lista.html", {"usuarios": usuarios})
+    """
+    Lista paginada com busca (?q= em usuário/e-mail) e filtro por função.
+    Grupos, loja vinculada e perfil vêm junto: número de queries não depende
+    de quantos usuários aparecem na página.
+    """
+    termo = request.GET.get("q", "").strip()
+    funcao = request.GET.get("funcao", "")
+
+    usuarios = (
+        User.objects
+        .select_related("loja_perfil", "perfil")
+        .prefetch_related(Prefetch("groups", queryset=Group.objects.order_by("id"), to_attr="grupos"))
+        .order_by("username", "id")
+    )
+    if termo:
+        usuarios = usuarios.filter(Q(username__icontains=termo) | Q(email__icontains=termo))
+    if funcao == "Admin":
+        usuarios = usuarios.filter(Q(is_superuser=True) | Q(groups__name=FUNCOES_FILTRO[funcao])).distinct()
+    elif funcao in FUNCOES_FILTRO:
+        usuarios = usuarios.filter(groups__name=FUNCOES_FILTRO[funcao])
+
+    pagina = Paginator(usuarios, USUARIOS_POR_PAGINA).get_page(request.GET.get("page"))
+    return render(request, "gestao/usuarios_lista.html", {
+        "usuarios": pagina,
+        "termo": termo,
+        "funcao": funcao,
+        "funcoes": FUNCOES_FILTRO,
+    })
+
+
+@admin_interno_required
+def usuarios_importar(request):
+    """Cadastro em lote pela planilha (ver gestao/provisionamento.py)."""
+    resultado = None
+    if request.method == "POST":
+        form = ImportarUsuariosForm(request.POST, request.FILES)
+        if form.is_valid():
+            resultado = provisionamento.provisionar(
+                form.cleaned_data["planilha"], request.get_host(), request.is_secure(),
+            )
+            messages.success(
+                request,
+                f"{len(resultado['usuarios_criados'])} usuário(s) e {len(resultado['lojas_criadas'])} "
+                f"loja(s) cadastrados. Links de senha e geocodificação seguem em segundo plano.",
+            )
+            form = ImportarUsuariosForm()
+    else:
+        form = ImportarUsuariosForm()
+
+    return render(request, "gestao/usuarios_importar.html", {"form": form, "resultado": resultado})
 
 
 @admin_interno_required
@@ -187,7 +243,7 @@ def usuario_enviar_link_senha(request, user_id):
 
     ok = _send_set_password_link(request, u)
     if ok:
-        messages.success(request, f"Link de redefinição enviado para {u.email} (ou exibido no console).")
+        messages.success(request, f"Link de redefinição será enviado para {u.email} em instantes.")
     else:
         messages.error(request, "Não foi possível enviar o link. Verifique se o usuário tem e-mail e se o e-mail está configurado.")
     return redirect("gestao:usuarios_lista")
@@ -234,8 +290,11 @@ def loja_nova(request):
     if request.method == "POST":
         form = LojaForm(request.POST)
         if form.is_valid():
-            form.save()
-            messages.success(request, "Loja cadastrada com sucesso.")
+            loja = form.save(commit=False)
+            loja.geocodificacao = "pendente"
+            loja.save()
+            geocodificar_loja.enfileirar(loja.id)
+            messages.success(request, "Loja cadastrada com sucesso. Localizando o endereço...")
             return redirect("gestao:lojas_lista")
     else:
         form = LojaForm()
@@ -249,7 +308,14 @@ def loja_editar(request, loja_id):
     if request.method == "POST":
         form = LojaForm(request.POST, instance=loja)
         if form.is_valid():
-            form.save()
+            loja = form.save(commit=False)
+            # endereço mudou (ou nunca foi localizada): geocodifica no worker
+            geocodificar = {"endereco", "cidade"} & set(form.changed_data) or loja.latitude is None
+            if geocodificar:
+                loja.geocodificacao = "pendente"
+            loja.save()
+            if geocodificar:
+                geocodificar_loja.enfileirar(loja.id)
             messages.success(request, f"Loja '{loja.nome}' atualizada.")
             return redirect("gestao:lojas_lista")
     else:
@@ -265,6 +331,7 @@ def is_motoboy(user):
     return user.groups.filter(name__iexact="Motoboy").exists()
 
 @admin_interno_required
+@usar_replica
 def protocolos_lista(request):
     protocolos = Protocolo.objects.select_related("loja").order_by("-criado_em")
     return render(request, "gestao/protocolos_lista.html", {"protocolos": protocolos})
@@ -388,14 +455,15 @@ def transferencia_create(request):
 
 def _get_loja_usuario(user):
     # Ajuste aqui se no seu projeto o vínculo for outro.
-    return getattr(user, "loja_perfil", None)
+    return referencia.loja_do_usuario(user.id)
 
 
 def _is_motoboy(user):
-    return user.groups.filter(name="Motoboy").exists()
+    return referencia.eh_motoboy(user.id)
 
 
 @login_required
+@usar_replica
 def monitor_paletes(request):
     user = request.user
     loja_user = _get_loja_usuario(user)
@@ -403,42 +471,24 @@ def monitor_paletes(request):
     is_admin = user.is_staff or user.is_superuser
     is_motoboy = _is_motoboy(user)
 
-    is_cd = False
-    if loja_user and getattr(loja_user, "nome", None):
-        is_cd = "CD" in loja_user.nome.upper()
+    is_cd = bool(loja_user and loja_user.is_cd)
 
     # ✅ Permissão
     if not (is_admin or is_motoboy or loja_user):
         raise PermissionDenied("Acesso negado ao monitor de paletes.")
 
-    # ✅ Lista base de lojas que devem aparecer como card
-    lojas_qs = Loja.objects.filter(ativa=True).order_by("nome")
-
-    # (opcional) se você NÃO quer mostrar "CD" como card:
-    lojas_qs = lojas_qs.exclude(nome__icontains="CD")
+    # ✅ Lista base de lojas que devem aparecer como card (o CD não aparece)
+    lojas = [l for l in referencia.lojas_ativas() if not l.is_cd]
 
     # ✅ Usuário de loja comum vê só o palete da própria loja
     if loja_user and not (is_cd or is_admin or is_motoboy):
-        lojas_qs = lojas_qs.filter(id=loja_user.id)
+        lojas = [l for l in lojas if l.id == loja_user.id]
 
-    lojas = list(lojas_qs)
-
-    # ✅ Contagem de pendentes por loja (CD -> loja), mas SEM perder lojas com 0
-    counts = (
-        Transferencia.objects
-        .filter(
-            loja_origem__nome__icontains="CD",
-            status="pendente",
-            loja_destino__in=lojas
-        )
-        .values("loja_destino_id")
-        .annotate(c=Count("id"))
-    )
-
-    mapa = {row["loja_destino_id"]: row["c"] for row in counts}
+    # ✅ Pendentes por loja (CD -> loja) vêm dos contadores no Redis; loja sem entrada = 0
+    mapa = contadores_paletes.contagens()
 
     paletes = [
-        {"nome_loja": loja.nome, "total_notas": int(mapa.get(loja.id, 0))}
+        {"loja_id": loja.id, "nome_loja": loja.nome, "total_notas": int(mapa.get(loja.id, 0))}
         for loja in lojas
     ]
 
@@ -460,9 +510,7 @@ def detalhe_separacao(request, nome_loja):
     is_admin = user.is_staff or user.is_superuser
     is_motoboy = _is_motoboy(user)
 
-    is_cd = False
-    if loja_user and getattr(loja_user, "nome", None):
-        is_cd = "CD" in loja_user.nome.upper()
+    is_cd = bool(loja_user and loja_user.is_cd)
 
     # precisa ser admin/motoboy ou ter loja vinculada
     if not (is_admin or is_motoboy or loja_user):
@@ -480,7 +528,7 @@ def detalhe_separacao(request, nome_loja):
     notas = (
         Transferencia.objects
         .select_related("loja_origem", "loja_destino")
-        .filter(loja_origem__nome__icontains="CD", loja_destino=loja)
+        .filter(loja_origem__is_cd=True, loja_destino=loja)
         .filter(status__in=["pendente", "em_transito", "confirmada"])
         .order_by("-criado_em")
     )
@@ -495,4 +543,31 @@ def monitor_paletes_cd(request):
     return monitor_paletes(request)
 
 def detalhe_separacao_cd(request, loja_nome):
-    return detalhe_separacao(request, loja_nome)
\ No newline at end of file
+    return detalhe_separacao(request, loja_nome)
+
+
+@user_passes_test(lambda u: u.is_active and u.is_staff)
+@require_http_methods(["GET", "POST"])
+def metricas(request):
+    """
+    Agregados do MetricasMiddleware deste processo (cada worker tem os seus),
+    mais acertos/erros do cache de dados de referência, a fila de tarefas e o
+    estado dos serviços externos (disjuntor, contadores). As chamadas externas
+    rodam nos workers, que publicam o próprio estado junto com as métricas da
+    fila; "processo" é o deste processo (jobs rodados aqui sem worker vivo).
+    POST zera as métricas.
+    """
+    if request.method == "POST":
+        rotas_metricas.zerar()
+    estado_fila = fila.estatisticas()
+    http = {"processo": resiliente.estatisticas()}
+    if estado_fila is not None:
+        http["workers"] = {
+            nome: w.pop("http", {}) for nome, w in estado_fila["workers"].items()
+        }
+    return JsonResponse({
+        **rotas_metricas.snapshot(),
+        "referencia": referencia.estatisticas(),
+        "fila": estado_fila,
+        "http": http,
+    })
@@ -1,14 +1,15 @@
+from rotas.services import referencia
+
+
 def nav_permissions(request):
     user = request.user
     if not user.is_authenticated:
         return {"can_view_paletes": False}
 
-    is_motoboy = user.groups.filter(name="Motoboy").exists()
+    is_motoboy = referencia.eh_motoboy(user.id)
 
-    loja = getattr(user, "loja_perfil", None)
-    is_cd = False
-    if loja and getattr(loja, "nome", None):
-        is_cd = "CD" in loja.nome.upper()
+    loja = referencia.loja_do_usuario(user.id)
+    is_cd = bool(loja and loja.is_cd)
 
     can_view_paletes = user.is_staff or user.is_superuser or is_motoboy or is_cd
 
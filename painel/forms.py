@@ -3,25 +3,38 @@ from django.contrib.auth.models import User
 from rotas.models import Loja, Transferencia
 from django.contrib.auth import get_user_model
 from rotas.models import Rota, Loja, Parada
+from rotas.services import referencia
+from rotas.widgets import AutocompleteSelect, AutocompleteSelectMultiple
 
 User = get_user_model()
 
+
+def _motoboys_ativos():
+    # quem é motoboy vem do cache de referência; o banco só busca o escolhido (pk)
+    return User.objects.filter(id__in=[m["id"] for m in referencia.motoboys()])
+
+
 class CriarRotaForm(forms.ModelForm):
     motoboy = forms.ModelChoiceField(
-        queryset=User.objects.filter(groups__name="Motoboy"),
+        queryset=User.objects.none(),
         required=True,
         label="Motoboy",
-        widget=forms.Select(attrs={"class": "form-control"})
+        widget=AutocompleteSelect(
+            "painel:autocomplete_motoristas",
+            attrs={"class": "form-control"},
+            placeholder="🔍 Digite o nome do motoboy...",
+        )
     )
     
-    # Campo atualizado para usar Select2 (Autocomplete)
+    # Select2 com busca no servidor (só as lojas escolhidas vão no HTML)
     lojas = forms.ModelMultipleChoiceField(
         queryset=Loja.objects.filter(ativa=True).order_by('nome'),
-        # Mudamos de Checkbox para SelectMultiple com uma classe para o JS identificar
-        widget=forms.SelectMultiple(attrs={
-            "class": "form-control select2-multiple",
-            "style": "width: 100%"
-        }),
+        widget=AutocompleteSelectMultiple(
+            "painel:autocomplete_lojas",
+            params={"ativas": 1},
+            attrs={"class": "form-control select2-multiple", "style": "width: 100%"},
+            placeholder="🔍 Comece a digitar o nome da loja...",
+        ),
         required=False,
         label="Adicionar Paradas (Lojas)"
     )
@@ -30,8 +43,16 @@ class CriarRotaForm(forms.ModelForm):
         model = Rota
         fields = ['motoboy', 'lojas']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["motoboy"].queryset = _motoboys_ativos()
+
 class AdicionarLojaRotaForm(forms.Form):
-    loja = forms.ModelChoiceField(queryset=Loja.objects.all(), label="Loja")
+    loja = forms.ModelChoiceField(
+        queryset=Loja.objects.all(),
+        label="Loja",
+        widget=AutocompleteSelect("painel:autocomplete_lojas", placeholder="Digite o nome da loja..."),
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -86,8 +107,9 @@ class TransferenciaForm(forms.ModelForm):
             'numero_transferencia': forms.TextInput(attrs={'class': 'input', 'placeholder': 'Ex: 65456'}),
             'porte_carga': forms.Select(attrs={'class': 'input'}),
             "tipo": forms.Select(attrs={"class": "form-control"}),
-            "loja_origem": forms.Select(attrs={"class": "form-control"}),
-            "loja_destino": forms.Select(attrs={"class": "form-control"}),
+            "loja_origem": AutocompleteSelect("painel:autocomplete_lojas", attrs={"class": "form-control"}),
+            "loja_destino": AutocompleteSelect("painel:autocomplete_lojas", attrs={"class": "form-control"}),
+            "motorista": AutocompleteSelect("painel:autocomplete_motoristas", attrs={"class": "form-control"}),
             "observacoes": forms.Textarea(attrs={"rows": 3, "class": "form-control"}),
         }
         labels = {
@@ -111,17 +133,14 @@ class TransferenciaForm(forms.ModelForm):
         # ✅ 1) Motorista: mostrar somente usuários do grupo Motoboy
         # (não lista operadores, lojas, etc.)
         if 'motorista' in self.fields:
-            self.fields['motorista'].queryset = (
-                self.fields['motorista'].queryset
-                .filter(groups__name="Motoboy", is_active=True)
-                .order_by("username")
-                .distinct()
-            )
+            self.fields['motorista'].queryset = _motoboys_ativos()
 
         if user and not user.is_staff:
             # Filtra a loja de origem baseada no perfil do usuário logado
             user_loja = getattr(user, 'loja_perfil', None)
             if user_loja:
+                # só uma opção: select comum, sem busca
+                self.fields['loja_origem'].widget = forms.Select(attrs={"class": "form-control"})
                 self.fields['loja_origem'].queryset = Loja.objects.filter(id=user_loja.id)
                 self.fields['loja_origem'].initial = user_loja
                 self.fields['loja_origem'].empty_label = None
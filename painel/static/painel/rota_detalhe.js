@@ -0,0 +1,151 @@
+const el = document.getElementById('paradas-list')
+
+function getCookie(name) {
+  let cookieValue = null
+  if (document.cookie && document.cookie !== '') {
+    const cookies = document.cookie.split(';')
+    for (let i = 0; i < cookies.length; i++) {
+      const cookie = cookies[i].trim()
+      if (cookie.substring(0, name.length + 1) === name + '=') {
+        cookieValue = decodeURIComponent(cookie.substring(name.length + 1))
+        break
+      }
+    }
+  }
+  return cookieValue
+}
+
+if (el) {
+  new Sortable(el, {
+    animation: 150,
+    // handle: '.drag-handle',  <-- REMOVA OU COMENTE ESTA LINHA
+    ghostClass: 'dragging',
+    onEnd: async function () {
+      const ids = [...el.querySelectorAll('li[data-id]')].map((li) => li.dataset.id)
+
+      const response = await fetch(`/painel/rotas/${rotaId}/reordenar/`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'X-CSRFToken': getCookie('csrftoken')
+        },
+        body: JSON.stringify({ ids: ids, versao: rotaVersao })
+      })
+
+      const result = await response.json()
+      if (response.ok && result.ok === true) {
+        rotaVersao = result.versao
+        el.querySelectorAll('.ordem-numero').forEach((span, index) => {
+          span.textContent = index + 1
+        })
+      } else if (response.status === 409) {
+        // ✅ outra pessoa reordenou antes: recarrega a ordem atual
+        alert('A ordem desta rota foi alterada por outra pessoa. A lista será atualizada.')
+        location.reload()
+      } else {
+        alert('Erro: ' + (result.error || 'Não foi possível salvar a ordem.'))
+      }
+    }
+  })
+}
+
+// ============================
+// ✅ NOVO: CONFIRMAÇÃO EM LOTE
+// ============================
+
+async function postBulk(url, ids) {
+  const form = new FormData();
+  ids.forEach(id => form.append("ids[]", id));
+
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "X-CSRFToken": getCookie("csrftoken") },
+    body: form
+  });
+
+  const data = await res.json();
+  if (!res.ok || !data.ok) {
+    throw new Error(data.error || "Erro ao confirmar em lote.");
+  }
+  return data;
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+  // Selecionar todos (coleta)
+  document.querySelectorAll(".chk-all-coleta").forEach(all => {
+    all.addEventListener("change", () => {
+      const loja = all.dataset.loja;
+      document.querySelectorAll(`.chk-coleta[data-loja="${loja}"]`).forEach(chk => {
+        chk.checked = all.checked;
+      });
+    });
+  });
+
+  // Selecionar todos (entrega)
+  document.querySelectorAll(".chk-all-entrega").forEach(all => {
+    all.addEventListener("change", () => {
+      const loja = all.dataset.loja;
+      document.querySelectorAll(`.chk-entrega[data-loja="${loja}"]`).forEach(chk => {
+        chk.checked = all.checked;
+      });
+    });
+  });
+
+  // Bulk Coleta (não abre transferência, continua na mesma tela)
+  document.querySelectorAll(".btn-bulk-coleta").forEach(btn => {
+    btn.addEventListener("click", async () => {
+      const loja = btn.dataset.loja;
+      const rota = btn.dataset.rota;
+
+      const ids = [...document.querySelectorAll(`.chk-coleta[data-loja="${loja}"]:checked`)].map(x => x.value);
+
+      if (!ids.length) {
+        alert("Selecione pelo menos um protocolo para confirmar coleta.");
+        return;
+      }
+      if (!confirm(`Confirmar coleta de ${ids.length} protocolo(s)?`)) return;
+
+      btn.disabled = true;
+      try {
+        await postBulk(`/painel/rotas/${rota}/coletas/bulk/`, ids);
+        location.reload(); // ✅ continua na mesma tela
+      } catch (e) {
+        alert(e.message);
+      } finally {
+        btn.disabled = false;
+      }
+    });
+  });
+
+  // Bulk Entrega (não abre transferência, continua na mesma tela)
+  document.querySelectorAll(".btn-bulk-entrega").forEach(btn => {
+    btn.addEventListener("click", async () => {
+      const loja = btn.dataset.loja;
+      const rota = btn.dataset.rota;
+
+      const ids = [...document.querySelectorAll(`.chk-entrega[data-loja="${loja}"]:checked`)].map(x => x.value);
+
+      if (!ids.length) {
+        alert("Selecione pelo menos um protocolo para confirmar entrega.");
+        return;
+      }
+      if (!confirm(`Confirmar entrega de ${ids.length} protocolo(s)?`)) return;
+
+      btn.disabled = true;
+      try {
+        await postBulk(`/painel/rotas/${rota}/entregas/bulk/`, ids);
+        location.reload(); // ✅ continua na mesma tela
+      } catch (e) {
+        alert(e.message);
+      } finally {
+        btn.disabled = false;
+      }
+    });
+  });
+
+  window.addEventListener("pageshow", function (event) {
+    if (event.persisted) {
+      window.location.reload();
+    }
+  });
+});
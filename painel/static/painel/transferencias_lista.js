@@ -0,0 +1,142 @@
+function setParamAndGo(key, value) {
+    const url = new URL(window.location.href);
+
+    if (value === "" || value === null || value === undefined) {
+        url.searchParams.delete(key);
+    } else {
+        url.searchParams.set(key, value);
+    }
+
+    window.location.href = url.toString();
+}
+
+function clearSavedFilters() {
+    try { localStorage.removeItem("transferencias_filtros_v1"); } catch(e) {}
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    // ✅ só selecionáveis (ignora os disabled da seção "Em rota/Entregues")
+    const checkboxes = document.querySelectorAll('.check-input:not([disabled])');
+    const btnSubmit = document.getElementById('btn-submit-rota');
+
+    checkboxes.forEach(input => {
+        input.addEventListener('change', function() {
+            const card = document.getElementById('card-' + this.value);
+
+            if (this.checked) {
+                card.classList.add('selected');
+            } else {
+                card.classList.remove('selected');
+            }
+
+            atualizarBotao();
+        });
+    });
+
+    function atualizarBotao() {
+        const total = document.querySelectorAll('.check-input:not([disabled]):checked').length;
+        if (!btnSubmit) return;
+
+        const rotaAtivaId = btnSubmit.getAttribute('data-rota-ativa-id');
+        btnSubmit.disabled = total === 0;
+
+        if (total > 0) {
+            if (rotaAtivaId) {
+                btnSubmit.innerHTML = `<i class="bi bi-signpost-split-fill"></i> Adicionar à Rota #${rotaAtivaId} (${total})`;
+            } else {
+                btnSubmit.innerHTML = `<i class="bi bi-signpost-split-fill"></i> Criar Rota (${total})`;
+            }
+        } else {
+            if (rotaAtivaId) {
+                btnSubmit.innerHTML = `<i class="bi bi-signpost-split-fill"></i> Adicionar à Rota #${rotaAtivaId} (0)`;
+            } else {
+                btnSubmit.innerHTML = `<i class="bi bi-signpost-split-fill"></i> Criar Rota (0)`;
+            }
+        }
+    }
+
+    // ===== Filtro de datas =====
+    const modeEl = document.getElementById('df_mode');
+    const dayBlock = document.getElementById('df_day_block');
+    const rangeBlock = document.getElementById('df_range_block');
+
+    const dayInput = document.getElementById('df_day');
+    const startInput = document.getElementById('df_start');
+    const endInput = document.getElementById('df_end');
+
+    const btnToday = document.getElementById('df_today');
+    const btnYesterday = document.getElementById('df_yesterday');
+    const btnLast7 = document.getElementById('df_last7');
+
+    function toYMD(d) {
+        const yyyy = d.getFullYear();
+        const mm = String(d.getMonth()+1).padStart(2,'0');
+        const dd = String(d.getDate()).padStart(2,'0');
+        return `${yyyy}-${mm}-${dd}`;
+    }
+
+    function applyModeUI() {
+        const mode = modeEl.value;
+
+        if (mode === 'range') {
+            rangeBlock.style.display = '';
+            dayBlock.style.display = 'none';
+            dayInput.value = '';
+        } else {
+            rangeBlock.style.display = 'none';
+            dayBlock.style.display = '';
+            startInput.value = '';
+            endInput.value = '';
+        }
+    }
+
+    modeEl.addEventListener('change', applyModeUI);
+
+    (function initModeFromGET() {
+        const url = new URL(window.location.href);
+        const mode = url.searchParams.get('mode');
+
+        if (mode === 'range') modeEl.value = 'range';
+        else modeEl.value = 'day';
+
+        applyModeUI();
+    })();
+
+    btnToday.addEventListener('click', () => {
+        modeEl.value = 'day';
+        applyModeUI();
+        dayInput.value = toYMD(new Date());
+        document.getElementById('date-filter-form').submit();
+    });
+
+    btnYesterday.addEventListener('click', () => {
+        modeEl.value = 'day';
+        applyModeUI();
+        const d = new Date();
+        d.setDate(d.getDate() - 1);
+        dayInput.value = toYMD(d);
+        document.getElementById('date-filter-form').submit();
+    });
+
+    btnLast7.addEventListener('click', () => {
+        modeEl.value = 'range';
+        applyModeUI();
+        const end = new Date();
+        const start = new Date();
+        start.setDate(start.getDate() - 6);
+
+        startInput.value = toYMD(start);
+        endInput.value = toYMD(end);
+        document.getElementById('date-filter-form').submit();
+    });
+
+    document.getElementById('date-filter-form').addEventListener('submit', () => {
+        const mode = modeEl.value;
+        if (mode === 'range') {
+            dayInput.value = '';
+        } else {
+            startInput.value = '';
+            endInput.value = '';
+        }
+    });
+});
@@ -1,3 +1,402 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rotas.models import AcaoSincronizada, Loja, Notificacao, Parada, Rota, Transferencia
+
+from . import views
+
+User = get_user_model()
+
+
+class RotaReordenarTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(self.user)
+        loja = Loja.objects.create(nome="Loja 1", cidade="SP")
+        self.rota = Rota.objects.create(nome="R1")
+        Parada.objects.bulk_create(
+            [Parada(rota=self.rota, loja=loja, ordem=i) for i in range(1, 101)]
+        )
+        self.ids = list(self.rota.paradas.order_by("ordem").values_list("id", flat=True))
+        self.url = reverse("painel:rota_reordenar", args=[self.rota.id])
+
+    def _post(self, ids, versao):
+        return self.client.post(
+            self.url,
+            data=json.dumps({"ids": ids, "versao": versao}),
+            content_type="application/json",
+        )
+
+    def test_reordena_e_incrementa_versao(self):
+        novos = list(reversed(self.ids))
+        resp = self._post(novos, 0)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["versao"], 1)
+        ordem = list(self.rota.paradas.order_by("ordem").values_list("id", flat=True))
+        self.assertEqual(ordem, novos)
+
+    def test_versao_desatualizada_retorna_409(self):
+        self._post(list(reversed(self.ids)), 0)
+        resp = self._post(self.ids, 0)
+
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["versao"], 1)
+        ordem = list(self.rota.paradas.order_by("ordem").values_list("id", flat=True))
+        self.assertEqual(ordem, list(reversed(self.ids)))
+
+    def test_sem_versao_retorna_400(self):
+        resp = self.client.post(
+            self.url, data=json.dumps({"ids": list(reversed(self.ids))}), content_type="application/json"
+        )
+        self.assertEqual(resp.status_code, 400)
+        ordem = list(self.rota.paradas.order_by("ordem").values_list("id", flat=True))
+        self.assertEqual(ordem, self.ids)
+
+    def test_lista_incompleta_retorna_400(self):
+        resp = self._post(self.ids[:-1], 0)
+        self.assertEqual(resp.status_code, 400)
+
+    def test_update_unico_para_100_paradas(self):
+        # sessão + usuário + rota + savepoint + ids atuais + versão + UPDATE único
+        # das paradas + release + versão nova
+        with self.assertNumQueries(9):
+            resp = self._post(list(reversed(self.ids)), 0)
+        self.assertEqual(resp.status_code, 200)
+
+
+class RotaSyncTests(TestCase):
+    def setUp(self):
+        self.motoboy = User.objects.create_user("moto", password="x")
+        self.client.force_login(self.motoboy)
+        self.origem = Loja.objects.create(nome="Origem", cidade="SP")
+        self.destino = Loja.objects.create(nome="Destino", cidade="SP")
+        self.rota = Rota.objects.create(nome="R1", motoboy=self.motoboy)
+        self.p1 = Parada.objects.create(rota=self.rota, loja=self.origem, ordem=1)
+        self.p2 = Parada.objects.create(rota=self.rota, loja=self.destino, ordem=2)
+        self.t = Transferencia.objects.create(
+            tipo="saida", rota=self.rota, loja_origem=self.origem, loja_destino=self.destino,
+        )
+        self.url = reverse("painel:rota_sync", args=[self.rota.id])
+
+    def _sync(self, acoes):
+        return self.client.post(self.url, data=json.dumps({"acoes": acoes}), content_type="application/json")
+
+    def test_replay_aplica_em_ordem_e_rejeita_individualmente(self):
+        resp = self._sync([
+            {"chave": "c3", "tipo": "confirmar_entrega", "alvo": self.t.id, "em": "2026-01-01T12:00:00Z"},
+            {"chave": "c1", "tipo": "marcar_coletado", "alvo": self.p1.id, "em": "2026-01-01T10:00:00Z"},
+            {"chave": "c2", "tipo": "confirmar_entrega", "alvo": self.t.id, "em": "2026-01-01T11:00:00Z"},
+            {"chave": "c4", "tipo": "marcar_coletado", "alvo": self.p1.id, "em": "2026-01-01T13:00:00Z"},
+        ])
+
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual([r["chave"] for r in body["resultados"]], ["c1", "c2", "c3", "c4"])
+        self.assertEqual([r["ok"] for r in body["resultados"]], [True, True, False, False])
+
+        self.t.refresh_from_db()
+        self.p1.refresh_from_db()
+        self.assertEqual(self.t.status, "confirmada")
+        self.assertEqual(self.p1.status, "coletado")
+        self.assertEqual(self.p1.collected_at.hour, 10)
+        self.assertIn([self.t.id, "confirmada", self.origem.id, self.destino.id], body["rota"]["transferencias"])
+
+    def test_chave_repetida_nao_reaplica(self):
+        acao = {"chave": "k1", "tipo": "marcar_coletado", "alvo": self.p1.id}
+        self._sync([acao])
+        resp = self._sync([acao])
+
+        self.assertEqual(resp.json()["resultados"], [{"chave": "k1", "ok": True, "erro": "", "repetida": True}])
+        self.assertEqual(AcaoSincronizada.objects.count(), 1)
+
+    def test_lote_trava_a_rota_antes_de_ler_as_chaves(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self._sync([{"chave": "k1", "tipo": "marcar_coletado", "alvo": self.p1.id}])
+        sqls = [q["sql"] for q in ctx.captured_queries]
+        trava = next(i for i, sql in enumerate(sqls) if 'FROM "rotas_rota"' in sql and "rotas_acaosincronizada" not in sql
+                     and (not connection.features.has_select_for_update or "FOR UPDATE" in sql))
+        leitura = next(i for i, sql in enumerate(sqls) if 'FROM "rotas_acaosincronizada"' in sql)
+        self.assertLess(trava, leitura)
+
+    def test_outro_motoboy_nao_sincroniza(self):
+        outro = User.objects.create_user("outro", password="x")
+        self.client.force_login(outro)
+        resp = self._sync([{"chave": "k1", "tipo": "marcar_coletado", "alvo": self.p1.id}])
+        self.assertEqual(resp.status_code, 403)
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        from rotas.db_router import ReplicaRouter
+
+        self.router = ReplicaRouter()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(self.user)
+
+    def _banco_de_leitura(self, **cookies):
+        from django.db import connections
+        from django.test import RequestFactory
+
+        from rotas.db_router import usar_replica
+
+        usado = []
+
+        @usar_replica
+        def view(request):
+            usado.append(self.router.db_for_read(Rota))
+
+        request = RequestFactory().get("/")
+        request.COOKIES.update(cookies)
+        # o TestCase roda dentro de transação; fora dela a leitura iria para a réplica
+        with mock.patch.object(connections["default"], "in_atomic_block", False):
+            view(request)
+        return usado[0]
+
+    def test_view_marcada_le_da_replica(self):
+        self.assertEqual(self._banco_de_leitura(), "replica")
+        self.assertIsNone(self.router.db_for_read(Rota))
+        self.assertEqual(self.router.db_for_write(Rota), "default")
+
+    def test_depois_de_post_le_do_primario(self):
+        resp = self.client.post(reverse("painel:rota_reordenar", args=[Rota.objects.create(nome="R").id]),
+                                data="{}", content_type="application/json")
+        self.assertIn("db_primario", resp.cookies)
+        self.assertIsNone(self._banco_de_leitura(db_primario="1"))
+
+    def test_dashboard_funciona_com_replica(self):
+        self.assertEqual(self.client.get(reverse("painel:home")).status_code, 200)
+
+
+class _VersaoFalsa:
+    """Só o get/incr que as versões no Redis (geo, referencia) usam."""
+
+    def __init__(self):
+        self.versoes = {}
+
+    def get(self, chave):
+        return self.versoes.get(chave)
+
+    def incr(self, chave):
+        self.versoes[chave] = self.versoes.get(chave, 0) + 1
+
+
+def _com_redis_falso(test):
+    patcher = mock.patch("rotas.services.geo.get_redis", return_value=_VersaoFalsa())
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+class RotaDetalheCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _com_redis_falso(self)
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(self.user)
+        self.origem = Loja.objects.create(nome="Origem", cidade="SP")
+        self.destino = Loja.objects.create(nome="Destino", cidade="SP")
+        self.rota = Rota.objects.create(nome="R1", status="finalizada")
+        Parada.objects.create(rota=self.rota, loja=self.origem, ordem=1)
+        Parada.objects.create(rota=self.rota, loja=self.destino, ordem=2)
+        self.t = Transferencia.objects.create(
+            tipo="saida", rota=self.rota, loja_origem=self.origem, loja_destino=self.destino,
+        )
+        self.url = reverse("painel:rota_detalhe", args=[self.rota.id])
+
+    def _queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        return resp, len(ctx.captured_queries)
+
+    def test_rota_sem_mudanca_vem_do_cache(self):
+        _, primeira = self._queries()
+        resp, segunda = self._queries()
+
+        # paradas + transferências não são consultadas de novo
+        self.assertEqual(segunda, primeira - 2)
+        self.assertContains(resp, f"#{self.t.id}")
+        self.assertNotContains(resp, "__csrf_rota_detalhe__")
+
+    def test_loja_alterada_em_outro_processo_invalida(self):
+        self._queries()
+        # o worker geocodificou/renomeou a loja: a versão no Redis muda para todos
+        Loja.objects.filter(id=self.origem.id).update(nome="Origem Nova")
+        from rotas.services import geo
+        geo.invalidar()
+        resp, _ = self._queries()
+        self.assertContains(resp, "Origem Nova")
+
+    def test_sem_redis_monta_sem_cache(self):
+        with mock.patch("rotas.services.geo.versao", return_value=None):
+            self._queries()
+            Loja.objects.filter(id=self.origem.id).update(nome="Origem Nova")
+            resp, _ = self._queries()
+        self.assertContains(resp, "Origem Nova")
+        self.assertFalse(resp.has_header("ETag"))
+
+    def test_mudanca_na_transferencia_invalida(self):
+        self._queries()
+        Transferencia.objects.create(
+            tipo="saida", rota=self.rota, loja_origem=self.origem, loja_destino=self.destino,
+            nome_produto="Produto novo",
+        )
+        resp, _ = self._queries()
+        self.assertContains(resp, "Produto novo")
+
+
+class ConditionalGetTests(TestCase):
+    # pelo Client, com toda a pilha de middleware (sessão, CSRF, autenticação)
+    def setUp(self):
+        _com_redis_falso(self)
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        self._entrar()
+        self.loja = Loja.objects.create(nome="Loja", cidade="SP")
+        self.rota = Rota.objects.create(nome="R1", status="finalizada")
+        Parada.objects.create(rota=self.rota, loja=self.loja, ordem=1)
+        Notificacao.objects.create(usuario=self.user, titulo="Oi", mensagem="...")
+
+    def _entrar(self):
+        resp = self.client.post(reverse("login"), {"username": "admin", "password": "x"})
+        self.assertEqual(resp.status_code, 302)
+
+    def _etag_e_304(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        return etag
+
+    def _304_com_uma_query(self, view, url, *args):
+        # a view sozinha: sessão e usuário são do middleware (o Client os consultaria)
+        etag = self._etag_e_304(url)
+        request = RequestFactory().get(url, HTTP_IF_NONE_MATCH=etag)
+        request.user = self.user
+        request.session = self.client.session
+        request.META["CSRF_COOKIE"] = self.client.cookies["csrftoken"].value
+        with self.assertNumQueries(1):
+            self.assertEqual(view(request, *args).status_code, 304)
+        return etag
+
+    def _sair_e_entrar_nao_reaproveita(self, url):
+        etag = self._etag_e_304(url)
+        token_antigo = self.client.cookies["csrftoken"].value
+
+        self.client.post(reverse("logout"))
+        self._entrar()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(self.client.cookies["csrftoken"].value, token_antigo)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"]).status_code, 304)
+
+    def test_rota_detalhe(self):
+        url = reverse("painel:rota_detalhe", args=[self.rota.id])
+        etag = self._304_com_uma_query(views.rota_detalhe, url, self.rota.id)
+
+        Parada.objects.create(rota=self.rota, loja=self.loja, ordem=2)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self._sair_e_entrar_nao_reaproveita(url)
+
+    def test_transferencias_lista(self):
+        url = reverse("painel:transferencias_lista")
+        etag = self._304_com_uma_query(views.transferencias_lista, url)
+
+        Transferencia.objects.create(tipo="saida", loja_origem=self.loja)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self._sair_e_entrar_nao_reaproveita(url)
+
+    def test_transferencias_lista_acompanha_a_rota(self):
+        Transferencia.objects.create(tipo="saida", loja_origem=self.loja, rota=self.rota)
+        url = reverse("painel:transferencias_lista")
+
+        etag = self._etag_e_304(url)
+        self.rota.motoboy = User.objects.create_user("moto", password="x")
+        self.rota.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(resp, "moto")
+
+        etag = resp["ETag"]
+        self.rota.status = "em_rota"
+        self.rota.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_notificacoes_lista(self):
+        url = reverse("painel:notificacoes_lista")
+        etag = self._304_com_uma_query(views.notificacoes_lista, url)
+
+        Notificacao.objects.update(lida=True)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self._sair_e_entrar_nao_reaproveita(url)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(self.user)
+        Loja.objects.bulk_create(
+            [Loja(nome=f"Filial {i:02d}", cidade="SP") for i in range(30)]
+            + [Loja(nome="Centro", cidade="SP"), Loja(nome="Loja Centro", cidade="SP"),
+               Loja(nome="Centro Velho", cidade="SP", ativa=False)]
+        )
+
+    def test_prefixo_antes_de_contem_e_filtro_de_ativas(self):
+        url = reverse("painel:autocomplete_lojas")
+
+        nomes = [r["text"] for r in self.client.get(url, {"term": "centro"}).json()["results"]]
+        self.assertEqual(nomes, ["Centro", "Centro Velho", "Loja Centro"])
+
+        nomes = [r["text"] for r in self.client.get(url, {"term": "centro", "ativas": 1}).json()["results"]]
+        self.assertEqual(nomes, ["Centro", "Loja Centro"])
+
+    def test_paginado(self):
+        url = reverse("painel:autocomplete_lojas")
+
+        p1 = self.client.get(url, {"term": "filial"}).json()
+        p2 = self.client.get(url, {"term": "filial", "page": 2}).json()
+
+        self.assertEqual((len(p1["results"]), p1["pagination"]["more"]), (20, True))
+        self.assertEqual((len(p2["results"]), p2["pagination"]["more"]), (10, False))
+
+    def test_form_so_renderiza_lojas_selecionadas(self):
+        from painel.forms import CriarRotaForm
+
+        escolhida = Loja.objects.get(nome="Loja Centro")
+        html = str(CriarRotaForm(initial={"lojas": [escolhida.id]})["lojas"])
+
+        self.assertEqual(html.count("<option"), 1)
+        self.assertIn("Loja Centro", html)
+        self.assertIn(reverse("painel:autocomplete_lojas"), html)
+
+    def test_motoristas_vem_do_cache_de_referencia(self):
+        from django.contrib.auth.models import Group
+
+        from painel.forms import CriarRotaForm
+        from rotas.services import referencia
+
+        patcher = mock.patch.object(referencia, "get_redis", return_value=_VersaoFalsa())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        referencia.limpar()
+        self.addCleanup(referencia.limpar)
+        grupo = Group.objects.create(name="Motoboy")
+        for nome in ("bruno", "ana", "joana"):
+            User.objects.create_user(nome).groups.add(grupo)
+        User.objects.create_user("anabela")
+        url = reverse("painel:autocomplete_motoristas")
+
+        self.client.get(url)
+        with self.assertNumQueries(2):  # sessão + usuário
+            nomes = [r["text"] for r in self.client.get(url, {"term": "ana"}).json()["results"]]
+        self.assertEqual(nomes, ["ana", "joana"])
+
+        ana, anabela = User.objects.get(username="ana"), User.objects.get(username="anabela")
+        self.assertTrue(CriarRotaForm({"motoboy": ana.id}).is_valid())
+        self.assertIn("motoboy", CriarRotaForm({"motoboy": anabela.id}).errors)
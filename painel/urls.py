@@ -11,8 +11,12 @@ urlpatterns = [
     path("paradas/<int:parada_id>/coletado/", views.marcar_coletado, name="marcar_coletado"),
     path("rotas/<int:rota_id>/adicionar-loja/", views.adicionar_loja_rota, name="adicionar_loja_rota"),
     path("rotas/nova/", views.criar_rota, name="criar_rota"),
+    path("lojas/proximas/", views.lojas_proximas, name="lojas_proximas"),
+    path("lojas/mapa/", views.lojas_mapa, name="lojas_mapa"),
+    path("autocomplete/lojas/", views.autocomplete_lojas, name="autocomplete_lojas"),
+    path("autocomplete/motoristas/", views.autocomplete_motoristas, name="autocomplete_motoristas"),
     path("rotas/<int:rota_id>/reordenar/", views.rota_reordenar, name="rota_reordenar"),
-    path("rotas/<int:rota_id>/reordenar/", views.reordenar_paradas, name="reordenar_paradas"),
+    path("minhas-paradas/", views.minhas_paradas, name="minhas_paradas"),
     path("transferencias/", views.transferencias_lista, name="transferencias_lista"),
     path("transferencias/novo/", views.transferencia_nova, name="transferencia_nova"),
     path("transferencias/<int:transferencia_id>/", views.transferencia_detalhe, name="transferencia_detalhe"),
@@ -26,4 +30,7 @@ urlpatterns = [
     path("transferencia/<int:pk>/confirmar-cd/", views.transferencia_confirmar_cd, name="transferencia_confirmar_cd"),
     path("rotas/<int:rota_id>/coletas/bulk/", views.bulk_confirmar_coleta, name="bulk_confirmar_coleta"),
     path("rotas/<int:rota_id>/entregas/bulk/", views.bulk_confirmar_entrega, name="bulk_confirmar_entrega"),
+    path("rotas/<int:rota_id>/sync/", views.rota_sync, name="rota_sync"),
+    path("rotas/<int:rota_id>/posicoes/", views.rota_posicoes, name="rota_posicoes"),
+    path("rotas/<int:rota_id>/rastreio/", views.rota_rastreio, name="rota_rastreio"),
 ]
@@ -1,28 +1,40 @@
+import hashlib
+import time
 from datetime import date
 
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required, permission_required, user_passes_test
 from django.db.models import Count, Prefetch, Q
 from django.http import HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.http import HttpResponseForbidden
 from django.contrib import messages
-from django.views.decorators.cache import never_cache
+from django.views.decorators.cache import cache_control
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from rotas.models import Loja, Rota, Parada,Transferencia
 from .forms import AdicionarLojaRotaForm, CriarRotaForm, TransferenciaForm
 from django.core.exceptions import PermissionDenied
 import json
-from django.db import transaction
+from django.db import connections, router, transaction
 from django.http import JsonResponse, HttpResponseForbidden
-from django.views.decorators.http import require_POST
-from django.db.models import Max
-from rotas.models import Notificacao
+from django.views.decorators.http import condition, require_POST
+from django.db.models import Case, F, IntegerField, Max, Value, When
+from rotas.db_router import usar_replica
+from rotas.models import AcaoSincronizada, Notificacao, tocar_rotas
+from rotas.services import eta, geo, particoes, rastreio, referencia
+from rotas.services.transicoes import coletar_parada, coletar_transferencias, entregar_transferencias
 from django.contrib.auth.decorators import user_passes_test
 from collections import defaultdict
+from rotas.tarefas import avisar_grupo
 
 
 def _is_motoboy(user):
-    return user.groups.filter(name="Motoboy").exists()
+    return referencia.eh_motoboy(user.id)
 
 def _is_operador(user):
     return user.groups.filter(name="Operador").exists()
@@ -71,6 +83,7 @@ def _get_date_filter(request):
 # DASHBOARD (HOME)
 # =========================
 @login_required
+@usar_replica
 def home(request):
     mode, filt = _get_date_filter(request)
 
@@ -110,12 +123,12 @@ def home(request):
         if not loja_logada: # Só filtra rotas se não for loja
             rotas_qs = rotas_qs.filter(data__range=(start, end))
             paradas_qs = paradas_qs.filter(rota__data__range=(start, end))
-        transf_qs = transf_qs.filter(criado_em__date__range=(start, end))
+        transf_qs = transf_qs.filter(particoes.entre_dias(start, end))
     elif mode != "all":
         if not loja_logada:
             rotas_qs = rotas_qs.filter(data__in=filt)
             paradas_qs = paradas_qs.filter(rota__data__in=filt)
-        transf_qs = transf_qs.filter(criado_em__date__in=filt)
+        transf_qs = transf_qs.filter(particoes.nos_dias(filt))
 
     # 4. CÁLCULOS PARA O DASHBOARD
     total_paradas = paradas_qs.count()
@@ -200,9 +213,39 @@ def rotas_hoje(request):
     return render(request, "painel/rotas_hoje.html", context)
 
 
+def _etag_sessao(request):
+    """
+    Parte da ETag ligada à sessão: toda página leva o csrfmiddlewaretoken, que
+    muda ao sair/entrar. Sem isso o celular receberia 304 e ficaria com o HTML
+    do token antigo (todo POST daquela página voltando 403).
+    """
+    get_token(request)
+    segredo = f"{request.session.session_key}:{request.META.get('CSRF_COOKIE', '')}"
+    return hashlib.sha256(segredo.encode()).hexdigest()[:16]
+
+
+def _etag_rota_detalhe(request, rota_id):
+    rota = Rota.objects.filter(id=rota_id).values_list(
+        "conteudo_versao", "versao", "status", "motoboy_id"
+    ).first()
+    if rota is None:
+        return None
+    conteudo_versao, versao, status, motoboy_id = rota
+    versao_lojas = geo.versao()
+    if versao_lojas is None:
+        return None                 # sem Redis não dá para saber se as lojas mudaram
+    # rota ativa: a previsão de chegada muda com o relógio
+    minuto = int(time.time() // 60) if status in Rota.STATUS_ATIVOS else 0
+    return (
+        f"rota-{rota_id}-{conteudo_versao}-{versao}-{status}-{motoboy_id}"
+        f"-{versao_lojas}-{minuto}-u{request.user.pk}-{_etag_sessao(request)}"
+    )
+
+
 @login_required
-@never_cache
+@cache_control(private=True, no_cache=True)
 @permission_required("rotas.view_rota", raise_exception=True)
+@condition(etag_func=_etag_rota_detalhe)
 def rota_detalhe(request, rota_id):
     rota = get_object_or_404(
         Rota.objects.select_related("motoboy"),
@@ -213,7 +256,24 @@ def rota_detalhe(request, rota_id):
     if _is_motoboy(request.user) and rota.motoboy_id != request.user.id:
         return HttpResponseForbidden("Você não pode acessar esta rota.")
 
-    paradas = rota.paradas.select_related("loja").order_by("ordem")
+    # ✅ Lista de paradas vem do cache enquanto a rota não muda (conteudo_versao)
+    html, qtd = _paradas_renderizadas(rota)
+
+    return render(request, "painel/rota_detalhe.html", {
+        "rota": rota,
+        "paradas_html": mark_safe(html.replace(CSRF_MARCADOR, get_token(request))),
+        "qtd_paradas": qtd,
+    })
+
+
+# o fragmento é compartilhado entre usuários: o token CSRF entra na hora de servir
+CSRF_MARCADOR = "__csrf_rota_detalhe__"
+ROTA_CACHE_TIMEOUT = 60 * 60
+
+
+def _paradas_agrupadas(rota):
+    """Paradas da rota (em ordem) com as transferências a coletar/entregar em cada loja."""
+    paradas = list(rota.paradas.select_related("loja").order_by("ordem"))
 
     # ✅ Puxa TODAS as transferências dessa rota 1x e agrupa por loja origem/destino
     transfs = list(
@@ -243,10 +303,47 @@ def rota_detalhe(request, rota_id):
         p.qtd_coletar = len(p.transfs_coletar)
         p.qtd_entregar = len(p.transfs_entregar)
 
-    return render(request, "painel/rota_detalhe.html", {
+    return paradas
+
+
+def _paradas_renderizadas(rota):
+    """
+    (html, qtd) da lista de paradas. Dados agrupados e HTML ficam no cache
+    com a conteudo_versao da rota na chave (e a versão das lojas, que muda
+    quando alguma loja é editada). Em rota ativa o HTML também depende do
+    minuto corrente, por causa da previsão de chegada.
+    """
+    ativa = rota.status in Rota.STATUS_ATIVOS
+    versao_lojas = geo.versao()
+    base = f"rota_detalhe:{rota.id}:{rota.conteudo_versao}:{rota.status}:{versao_lojas}"
+    chave_html = f"{base}:{int(time.time() // 60)}" if ativa else base
+    # sem Redis não dá para saber se alguma loja mudou: monta sem cache
+    usar_cache = versao_lojas is not None
+
+    pronto = cache.get(chave_html) if usar_cache else None
+    if pronto is not None:
+        return pronto
+
+    paradas = cache.get(base + ":dados") if usar_cache else None
+    if paradas is None:
+        paradas = _paradas_agrupadas(rota)
+        if usar_cache:
+            cache.set(base + ":dados", paradas, ROTA_CACHE_TIMEOUT)
+
+    # ✅ Previsão de chegada das paradas pendentes (só rota em andamento)
+    previsoes = eta.prever_rota(paradas) if ativa else {}
+    for p in paradas:
+        p.eta = previsoes.get(p.id)
+
+    html = render_to_string("painel/rota_paradas_fragment.html", {
         "rota": rota,
         "paradas": paradas,
+        "csrf_token": CSRF_MARCADOR,
     })
+    pronto = (html, len(paradas))
+    if usar_cache:
+        cache.set(chave_html, pronto, 60 if ativa else ROTA_CACHE_TIMEOUT)
+    return pronto
 
 @login_required
 @permission_required("rotas.add_parada", raise_exception=True)  # operador/admin
@@ -272,7 +369,162 @@ def adicionar_loja_rota(request, rota_id):
     else:
         form = AdicionarLojaRotaForm()
 
-    return render(request, "painel/adicionar_loja.html", {"rota": rota, "form": form})
+    return render(request, "painel/adicionar_loja.html", {
+        "rota": rota,
+        "form": form,
+        "sugestoes": _lojas_proximas_da_rota(rota),
+    })
+
+
+def _lojas_proximas_da_rota(rota, k=8):
+    """Lojas mais perto das paradas que a rota já tem (fora as que já estão nela)."""
+    paradas = list(rota.paradas.values_list("loja_id", "loja__latitude", "loja__longitude"))
+    pontos = [(lat, lng) for _, lat, lng in paradas if lat is not None and lng is not None]
+    if not pontos:
+        return []
+
+    proximas = geo.proximas_da_rota(pontos, k=k, excluir={loja_id for loja_id, _, _ in paradas})
+    lojas = Loja.objects.in_bulk([loja_id for loja_id, _ in proximas])
+
+    sugestoes = []
+    for loja_id, distancia in proximas:
+        loja = lojas.get(loja_id)
+        if loja:
+            loja.distancia_km = round(distancia, 1)
+            sugestoes.append(loja)
+    return sugestoes
+
+
+@login_required
+@permission_required("rotas.view_loja", raise_exception=True)
+def lojas_proximas(request):
+    """
+    Lojas ativas mais próximas, por GET:
+      ?rota=<id>            -> perto das paradas da rota
+      ?lojas=1,2,3          -> perto das lojas selecionadas (tela de criar rota)
+      ?lat=..&lng=..        -> perto de um ponto
+    """
+    try:
+        k = max(1, min(int(request.GET.get("k", 10)), 30))
+    except ValueError:
+        k = 10
+
+    excluir = set()
+    if request.GET.get("rota"):
+        rota = get_object_or_404(Rota, id=request.GET["rota"])
+        return JsonResponse({"lojas": [
+            {"id": l.id, "nome": l.nome, "endereco": l.endereco, "distancia_km": l.distancia_km}
+            for l in _lojas_proximas_da_rota(rota, k=k)
+        ]})
+
+    if request.GET.get("lojas"):
+        ids = [int(x) for x in request.GET["lojas"].split(",") if x.strip().isdigit()]
+        pontos = list(
+            Loja.objects.filter(id__in=ids, latitude__isnull=False, longitude__isnull=False)
+            .values_list("latitude", "longitude")
+        )
+        excluir = set(ids)
+    else:
+        try:
+            pontos = [(float(request.GET["lat"]), float(request.GET["lng"]))]
+        except (KeyError, ValueError):
+            return JsonResponse({"error": "Informe rota, lojas ou lat/lng."}, status=400)
+
+    proximas = geo.proximas_da_rota(pontos, k=k, excluir=excluir)
+    lojas = Loja.objects.in_bulk([loja_id for loja_id, _ in proximas])
+    return JsonResponse({"lojas": [
+        {"id": loja_id, "nome": lojas[loja_id].nome, "endereco": lojas[loja_id].endereco, "distancia_km": round(d, 1)}
+        for loja_id, d in proximas
+        if loja_id in lojas
+    ]})
+
+
+# =========================
+# AUTOCOMPLETE (select2 -> rotas.widgets.AutocompleteSelect)
+# =========================
+AUTOCOMPLETE_POR_PAGINA = 20
+
+
+def _termo_e_pagina(request):
+    termo = request.GET.get("term", "").strip()
+    try:
+        pagina = max(1, int(request.GET.get("page", 1)))
+    except ValueError:
+        pagina = 1
+    return termo, pagina
+
+
+def _autocomplete(request, qs, campo, detalhe=None):
+    """
+    ?term=&page= no formato do select2. Quem começa com o termo vem antes de
+    quem só contém; no máximo AUTOCOMPLETE_POR_PAGINA por página.
+    """
+    termo, pagina = _termo_e_pagina(request)
+
+    if termo:
+        qs = qs.filter(**{f"{campo}__icontains": termo}).annotate(
+            prefixo=Case(
+                When(**{f"{campo}__istartswith": termo}, then=Value(0)),
+                default=Value(1), output_field=IntegerField(),
+            )
+        ).order_by("prefixo", campo, "id")
+    else:
+        qs = qs.order_by(campo, "id")
+
+    inicio = (pagina - 1) * AUTOCOMPLETE_POR_PAGINA
+    itens = list(qs[inicio:inicio + AUTOCOMPLETE_POR_PAGINA + 1])
+    return JsonResponse({
+        "results": [
+            {"id": obj.id, "text": getattr(obj, campo), **({"detalhe": getattr(obj, detalhe)} if detalhe else {})}
+            for obj in itens[:AUTOCOMPLETE_POR_PAGINA]
+        ],
+        "pagination": {"more": len(itens) > AUTOCOMPLETE_POR_PAGINA},
+    })
+
+
+@login_required
+def autocomplete_lojas(request):
+    qs = Loja.objects.only("id", "nome", "endereco")
+    if request.GET.get("ativas"):
+        qs = qs.filter(ativa=True)
+    return _autocomplete(request, qs, "nome", detalhe="endereco")
+
+
+@login_required
+def autocomplete_motoristas(request):
+    # mesma regra do _autocomplete, em memória: a lista vem do cache de referência
+    termo, pagina = _termo_e_pagina(request)
+    motoboys = referencia.motoboys()
+    if termo:
+        t = termo.casefold()
+        motoboys = sorted(
+            (m for m in motoboys if t in m["username"].casefold()),
+            key=lambda m: (not m["username"].casefold().startswith(t), m["username"], m["id"]),
+        )
+
+    inicio = (pagina - 1) * AUTOCOMPLETE_POR_PAGINA
+    itens = motoboys[inicio:inicio + AUTOCOMPLETE_POR_PAGINA + 1]
+    return JsonResponse({
+        "results": [{"id": m["id"], "text": m["username"]} for m in itens[:AUTOCOMPLETE_POR_PAGINA]],
+        "pagination": {"more": len(itens) > AUTOCOMPLETE_POR_PAGINA},
+    })
+
+
+@login_required
+@permission_required("rotas.view_loja", raise_exception=True)
+def lojas_mapa(request):
+    """
+    Marcadores das lojas dentro da área visível do mapa, já agrupados no servidor:
+      ?bbox=oeste,sul,leste,norte&zoom=12
+    """
+    try:
+        oeste, sul, leste, norte = (float(x) for x in request.GET["bbox"].split(","))
+        zoom = int(request.GET.get("zoom", 12))
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "bbox inválido."}, status=400)
+
+    marcadores = geo.get_indice().agrupar(sul, oeste, norte, leste, zoom)
+    return JsonResponse({"marcadores": marcadores})
 
 
 # =========================
@@ -301,28 +553,9 @@ def marcar_coletado(request, parada_id):
         return HttpResponseForbidden("Sem permissão para marcar esta coleta.")
 
     with transaction.atomic():
-        # 1) Marca a parada como coletada
-        parada.status = "coletado"
-
-        # Só atualiza collected_at se existir no model
-        if hasattr(parada, "collected_at"):
-            parada.collected_at = timezone.now()
-            parada.save(update_fields=["status", "collected_at"])
-        else:
-            parada.save(update_fields=["status"])
-
-        # 2) ✅ UX: se a parada foi coletada, todas as transferências dessa ROTA
+        # ✅ Marca a parada como coletada e, pela UX, todas as transferências dessa ROTA
         # cuja ORIGEM é essa loja e ainda estão pendentes viram "em_transito"
-        Transferencia.objects.filter(
-            rota=parada.rota,
-            loja_origem=parada.loja,
-            status="pendente"
-        ).update(
-            status="em_transito",
-            motorista=request.user,              # opcional mas útil
-            confirmado_em=timezone.now(),
-            confirmado_por=request.user
-        )
+        coletar_parada(parada, request.user)
 
     messages.success(request, f"{parada.loja.nome} marcada como coletada. Transferências da origem foram atualizadas para Em Trânsito.")
     return redirect("painel:rota_detalhe", rota_id=parada.rota_id)
@@ -383,66 +616,105 @@ def criar_rota(request):
 @login_required
 @require_POST
 def rota_reordenar(request, rota_id):
+    """
+    Reordena as paradas da rota em um único UPDATE (CASE/WHEN).
+
+    O cliente envia {"ids": [...], "versao": N}. Se outra pessoa reordenou
+    antes (versão diferente), responde 409 com a versão atual para o
+    cliente recarregar a lista.
+    """
     rota = get_object_or_404(Rota, id=rota_id)
 
-    e_dono = (rota.motoboy == request.user)
+    e_dono = (rota.motoboy_id == request.user.id)
     tem_perm = request.user.has_perm("rotas.change_parada") or request.user.has_perm("rotas.change_rota")
 
     if not (tem_perm or e_dono):
         return JsonResponse({"ok": False, "error": "Sem permissão para ordenar."}, status=403)
 
-    data = json.loads(request.body.decode("utf-8"))
-    ids = data.get("ids", [])
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+        ids = [int(x) for x in payload.get("ids", [])]
+        versao = int(payload["versao"])
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return JsonResponse({"ok": False, "error": "JSON inválido (ids e versao obrigatórios)."}, status=400)
 
-    # garante que só reordena paradas dessa rota
-    paradas = list(Parada.objects.filter(rota_id=rota_id, id__in=ids))
-    if len(paradas) != len(ids):
+    if not ids or len(set(ids)) != len(ids):
         return JsonResponse({"ok": False, "error": "Lista inválida."}, status=400)
 
     with transaction.atomic():
-        for ordem, parada_id in enumerate(ids, start=1):
-            Parada.objects.filter(id=parada_id, rota_id=rota_id).update(ordem=ordem)
+        # garante que a lista cobre exatamente as paradas dessa rota
+        atuais = set(Parada.objects.filter(rota_id=rota.id).values_list("id", flat=True))
+        if atuais != set(ids):
+            return JsonResponse({"ok": False, "error": "IDs não pertencem à rota."}, status=400)
+
+        # ✅ trava otimista: só avança se ninguém mexeu desde a versão do cliente
+        rotas_qs = Rota.objects.filter(id=rota.id, versao=versao)
+        if not rotas_qs.update(versao=F("versao") + 1, conteudo_versao=F("conteudo_versao") + 1):
+            atual = Rota.objects.filter(id=rota.id).values_list("versao", flat=True).first()
+            return JsonResponse(
+                {"ok": False, "error": "A rota foi alterada por outra pessoa.", "versao": atual},
+                status=409,
+            )
 
-    return JsonResponse({"ok": True})
+        _atualizar_ordem_paradas(rota.id, ids)
 
-@login_required
-@permission_required("rotas.change_parada", raise_exception=True)  # operador/admin
-def reordenar_paradas(request, rota_id):
-    if request.method != "POST":
-        return HttpResponseForbidden("Use POST.")
+    nova_versao = Rota.objects.filter(id=rota.id).values_list("versao", flat=True).first()
+    return JsonResponse({"ok": True, "versao": nova_versao})
 
-    rota = get_object_or_404(Rota, id=rota_id)
 
-    try:
-        payload = json.loads(request.body.decode("utf-8"))
-        ids = payload.get("ids", [])
-        if not isinstance(ids, list) or not ids:
-            return JsonResponse({"ok": False, "error": "Lista inválida."}, status=400)
-    except Exception:
-        return JsonResponse({"ok": False, "error": "JSON inválido."}, status=400)
+def _atualizar_ordem_paradas(rota_id, ids):
+    # 1 statement: UPDATE ... SET ordem = CASE id WHEN ... THEN ... END
+    ordem = Case(
+        *[When(id=pid, then=Value(i)) for i, pid in enumerate(ids, start=1)],
+        output_field=IntegerField(),
+    )
+    return Parada.objects.filter(rota_id=rota_id, id__in=ids).update(ordem=ordem)
 
-    # garante que todas as paradas pertencem à rota
-    qs = Parada.objects.filter(rota_id=rota.id, id__in=ids)
-    if qs.count() != len(ids):
-        return JsonResponse({"ok": False, "error": "IDs não pertencem à rota."}, status=400)
+def _is_motoboy(user):
+    return referencia.eh_motoboy(user.id)
 
-    # atualiza ordem (1..n)
-    paradas_map = {p.id: p for p in qs}
-    for i, pid in enumerate(ids, start=1):
-        paradas_map[pid].ordem = i
+# painel/views.py
 
-    with transaction.atomic():
-        Parada.objects.bulk_update(paradas_map.values(), ["ordem"])
+def _versao_transferencias():
+    """
+    (max(atualizado_em), count) das transferências e (count, soma de
+    conteudo_versao) das rotas numa consulta só. A página também mostra
+    rota/motoboy de cada transferência e a rota ativa do motoboy: criar/excluir
+    rota muda a contagem; status/motoboy/data e qualquer mudança de conteúdo
+    incrementam conteudo_versao (só cresce, então a soma muda). Subconsultas
+    escalares porque qualquer uma das tabelas pode estar vazia.
+    """
+    conexao = connections[router.db_for_read(Transferencia)]
+    transf = conexao.ops.quote_name(Transferencia._meta.db_table)
+    rotas = conexao.ops.quote_name(Rota._meta.db_table)
+    with conexao.cursor() as cursor:
+        cursor.execute(
+            f"SELECT (SELECT MAX(atualizado_em) FROM {transf}), (SELECT COUNT(*) FROM {transf}), "
+            f"(SELECT COUNT(*) FROM {rotas}), (SELECT SUM(conteudo_versao) FROM {rotas})"
+        )
+        return cursor.fetchone()
 
-    return JsonResponse({"ok": True})
 
-def _is_motoboy(user):
-    return user.groups.filter(name="Motoboy").exists()
+def _etag_transferencias(request):
+    # qualquer criação/alteração/exclusão de transferência muda max/count
+    versao_lojas = geo.versao()
+    if versao_lojas is None:
+        return None
+    ultima, n, n_rotas, soma_rotas = _versao_transferencias()
+    if isinstance(ultima, str):      # SQLite devolve o texto da coluna
+        ultima = parse_datetime(ultima)
+    ultima = ultima.timestamp() if ultima else 0
+    return (
+        f"transf-{ultima}-{n}-r{n_rotas}-{soma_rotas or 0}-{versao_lojas}-{timezone.localdate()}"
+        f"-u{request.user.pk}-{_etag_sessao(request)}-{request.get_full_path()}"
+    )
 
-# painel/views.py
 
 @login_required
+@cache_control(private=True, no_cache=True)
 @permission_required("rotas.view_transferencia", raise_exception=True)
+@usar_replica
+@condition(etag_func=_etag_transferencias)
 def transferencias_lista(request):
     from django.utils.dateparse import parse_date
     from django.utils import timezone
@@ -487,20 +759,17 @@ def transferencias_lista(request):
     data_inicio = request.GET.get('data_inicio')
     data_fim = request.GET.get('data_fim')
 
+    # comparação direta em criado_em (não __date): o Postgres só lê as partições do período
     if data:
         parsed = parse_date(data)
         if parsed:
-            qs = qs.filter(criado_em__date=parsed)
+            qs = qs.filter(particoes.entre_dias(parsed, parsed))
     else:
         inicio = parse_date(data_inicio) if data_inicio else None
         fim = parse_date(data_fim) if data_fim else None
 
-        if inicio and fim:
-            qs = qs.filter(criado_em__date__range=(inicio, fim))
-        elif inicio:
-            qs = qs.filter(criado_em__date__gte=inicio)
-        elif fim:
-            qs = qs.filter(criado_em__date__lte=fim)
+        if inicio or fim:
+            qs = qs.filter(particoes.entre_dias(inicio, fim))
 
     # ✅ ENTREGUES (independente de ter rota ou não)
     transferencias_entregues = qs.filter(status="confirmada")
@@ -528,7 +797,7 @@ def transferencias_lista(request):
         "transferencias_disponiveis": transferencias_disponiveis,
         "transferencias_em_rota": transferencias_em_rota,
        "transferencias_entregues": transferencias_entregues,
-        "lojas": Loja.objects.filter(ativa=True).order_by('nome'),
+        "lojas": referencia.lojas_ativas(),
         "rota_ativa": rota_ativa,
         "is_motoboy": is_motoboy,
     })
@@ -596,6 +865,7 @@ def transferencia_confirmar_cd(request, pk):
 
     # ✅ Agora sim finaliza
     t.status = "confirmada"
+    t._alterado_por = request.user
     t.save(update_fields=[
         "confirmada_cd", "confirmada_cd_em", "confirmada_cd_por",
         "obs_confirmacao_cd", "status"
@@ -636,7 +906,7 @@ def paradas_loja(request):
 
 def _get_loja_usuario(user):
     # Retorna o objeto Loja se o usuário estiver vinculado a uma, senão None
-    return getattr(user, 'loja_perfil', None)
+    return referencia.loja_do_usuario(user.id)
 
 @login_required
 def minhas_paradas(request):
@@ -645,9 +915,19 @@ def minhas_paradas(request):
         return HttpResponseForbidden("Apenas lojas acessam esta página.")
         
     # Busca apenas as paradas desta loja em qualquer rota
-    paradas = Parada.objects.filter(loja=loja_logada).select_related('rota').order_by('-rota__data')
-    
-    return render(request, "painel/minhas_paradas.html", {"paradas": paradas})
+    paradas = list(
+        Parada.objects.filter(loja=loja_logada)
+        .select_related('rota', 'rota__motoboy')
+        .order_by('-rota__data', '-id')[:100]
+    )
+
+    # ✅ Previsão de chegada do motoboy para as paradas ainda pendentes
+    rotas_ativas = {p.rota_id for p in paradas if p.status == "pendente" and p.rota.status in Rota.STATUS_ATIVOS}
+    previsoes = eta.prever_rotas(rotas_ativas) if rotas_ativas else {}
+    for p in paradas:
+        p.eta = previsoes.get(p.id)
+
+    return render(request, "painel/minhas_paradas.html", {"paradas": paradas, "loja": loja_logada})
 
 from django.db import transaction
 
@@ -699,7 +979,8 @@ def criar_rota_motorista(request):
 
         # 4) Vincula todas as transferências à rota escolhida (bulk update)
         ids_para_vincular = [t.id for t in transferencias]
-        Transferencia.objects.filter(id__in=ids_para_vincular).update(rota=rota)
+        Transferencia.objects.filter(id__in=ids_para_vincular).update(rota=rota, atualizado_em=timezone.now())
+        tocar_rotas(rota.id)
 
         # 5) Garante paradas únicas e cria apenas as que faltarem
         lojas_unicas_em_ordem = {}
@@ -769,6 +1050,7 @@ def coletar_transferencia(request, pk):
     transferencia = get_object_or_404(Transferencia, pk=pk)
     # Apenas o motorista da rota ou staff pode coletar
     transferencia.status = "em_transito"
+    transferencia._alterado_por = request.user
     transferencia.save()
     messages.success(request, f"Carga {transferencia.id} marcada como Em Trânsito!")
     return redirect('painel:transferencias_lista')
@@ -779,6 +1061,7 @@ def coletar_carga(request, transferencia_id):
     t = get_object_or_404(Transferencia, id=transferencia_id)
     t.status = "em_transito"
     t.motorista = request.user
+    t._alterado_por = request.user
     t.save(update_fields=['status', 'motorista'])
     messages.success(request, "Carga coletada! Status: Em Trânsito.")
     return redirect('painel:transferencia_detalhe', transferencia_id=t.id)
@@ -799,11 +1082,7 @@ def confirmar_coleta(request, pk):
         messages.info(request, "Esta transferência já foi coletada ou está em andamento.")
         return redirect('painel:transferencia_detalhe', transferencia_id=pk)
 
-    transferencia.status = "em_transito"
-    transferencia.motorista = request.user
-    transferencia.confirmado_em = timezone.now()
-    transferencia.confirmado_por = request.user
-    transferencia.save(update_fields=["status", "motorista", "confirmado_em", "confirmado_por"])
+    coletar_transferencias(Transferencia.objects.filter(pk=pk), request.user)
 
     messages.success(request, "Carga coletada com sucesso! Status: Em Trânsito.")
     return redirect('painel:transferencia_detalhe', transferencia_id=pk)
@@ -817,10 +1096,7 @@ def confirmar_recebimento(request, pk):
         return redirect('painel:transferencia_detalhe', transferencia_id=transferencia.id)
 
     # ✅ FINALIZA aqui (sem status aguardando_cd)
-    transferencia.status = "confirmada"
-    transferencia.confirmado_em = timezone.now()
-    transferencia.confirmado_por = request.user
-    transferencia.save(update_fields=["status", "confirmado_em", "confirmado_por"])
+    entregar_transferencias(Transferencia.objects.filter(pk=transferencia.pk), request.user)
 
     messages.success(request, "Entrega confirmada. Protocolo finalizado!")
     return redirect('painel:transferencia_detalhe', transferencia_id=transferencia.id)
@@ -832,8 +1108,20 @@ def marcar_notificacao_lida(request, notificacao_id):
     notificacao.save()
     return redirect('painel:notificacoes_lista') # Ou para a home
 
+def _etag_notificacoes(request):
+    agg = request.user.notificacoes.aggregate(
+        ultima=Max("id"), n=Count("id"), nao_lidas=Count("id", filter=Q(lida=False)),
+    )
+    return (
+        f"notif-u{request.user.pk}-{agg['ultima']}-{agg['n']}-{agg['nao_lidas']}"
+        f"-{_etag_sessao(request)}"
+    )
+
+
 # painel/views.py
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_notificacoes)
 def notificacoes_lista(request):
     notificacoes = request.user.notificacoes.all()
     return render(request, 'painel/notificacoes_lista.html', {'notificacoes': notificacoes})
@@ -855,22 +1143,10 @@ def bulk_confirmar_coleta(request, rota_id):
     if not ids:
         return JsonResponse({"ok": False, "error": "Nenhum ID enviado."}, status=400)
 
-    now = timezone.now()
-
     with transaction.atomic():
-        qs = Transferencia.objects.filter(
-            id__in=ids,
-            rota=rota,
-            status="pendente"
-        )
-
-        total = qs.count()
-
-        qs.update(
-            status="em_transito",
-            motorista=request.user,
-            confirmado_em=now,
-            confirmado_por=request.user
+        total = coletar_transferencias(
+            Transferencia.objects.filter(id__in=ids, rota=rota),
+            request.user,
         )
 
     return JsonResponse({"ok": True, "updated": total})
@@ -893,21 +1169,211 @@ def bulk_confirmar_entrega(request, rota_id):
     if not ids:
         return JsonResponse({"ok": False, "error": "Nenhum ID enviado."}, status=400)
 
-    now = timezone.now()
-
     with transaction.atomic():
-        qs = Transferencia.objects.filter(
-            id__in=ids,
-            rota=rota,
-            status="em_transito"
+        total = entregar_transferencias(
+            Transferencia.objects.filter(id__in=ids, rota=rota),
+            request.user,
         )
 
-        total = qs.count()
+    return JsonResponse({"ok": True, "updated": total})
+
+# =========================
+# SYNC OFFLINE (APP DO MOTOBOY)
+# =========================
+SYNC_MAX_ACOES = 500
+
+
+def _sync_quando(valor, agora):
+    quando = parse_datetime(valor) if isinstance(valor, str) else None
+    if quando is None:
+        return agora
+    if timezone.is_naive(quando):
+        quando = timezone.make_aware(quando)
+    # relógio do celular adiantado não pode gravar horário no futuro
+    return min(quando, agora)
+
+
+def _sync_aplicar(rota, usuario, tipo, alvo_id, quando):
+    """Aplica uma ação do lote. Retorna a mensagem de erro ou "" se deu certo."""
+    if tipo == "marcar_coletado":
+        parada = Parada.objects.filter(id=alvo_id, rota=rota).first()
+        if not parada:
+            return "Parada não pertence à rota."
+        if parada.status != "pendente":
+            return "Parada já coletada."
+        coletar_parada(parada, usuario, quando)
+        return ""
+
+    transfs = Transferencia.objects.filter(id=alvo_id, rota=rota)
+    if not transfs.exists():
+        return "Transferência não pertence à rota."
+
+    if tipo == "confirmar_coleta":
+        if not coletar_transferencias(transfs, usuario, quando):
+            return "Transferência não está pendente."
+        return ""
+
+    if tipo == "confirmar_entrega":
+        if not entregar_transferencias(transfs, usuario, quando):
+            return "Transferência não está em trânsito."
+        return ""
+
+    return "Tipo de ação inválido."
+
+
+def _rota_estado_compacto(rota):
+    rota.refresh_from_db(fields=["status", "versao"])
+    return {
+        "id": rota.id,
+        "status": rota.status,
+        "versao": rota.versao,
+        # [id, ordem, loja_id, status]
+        "paradas": [
+            list(row) for row in
+            rota.paradas.order_by("ordem").values_list("id", "ordem", "loja_id", "status")
+        ],
+        # [id, status, loja_origem_id, loja_destino_id]
+        "transferencias": [
+            list(row) for row in
+            rota.transferencias.order_by("id").values_list("id", "status", "loja_origem_id", "loja_destino_id")
+        ],
+    }
 
-        qs.update(
-            status="confirmada",
-            confirmado_em=now,
-            confirmado_por=request.user
+
+@login_required
+@require_POST
+def rota_sync(request, rota_id):
+    """
+    Recebe o lote de ações enfileiradas no celular enquanto estava sem sinal:
+
+        {"acoes": [{"chave": "uuid", "tipo": "marcar_coletado", "alvo": 12,
+                    "em": "2026-10-19T14:03:00-03:00"}, ...]}
+
+    Aplica tudo em uma transação, na ordem do horário de execução. Cada ação roda
+    no seu próprio savepoint: transição inválida é rejeitada sozinha, sem derrubar
+    o lote. Chaves já recebidas devolvem o resultado anterior sem reaplicar.
+    """
+    rota = get_object_or_404(Rota, id=rota_id)
+
+    e_dono = (rota.motoboy_id == request.user.id)
+    tem_perm = request.user.has_perm("rotas.change_parada") or request.user.is_staff
+    if not (e_dono or tem_perm):
+        return JsonResponse({"ok": False, "error": "Sem permissão."}, status=403)
+
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+        acoes = payload.get("acoes", [])
+        if not isinstance(acoes, list):
+            raise ValueError
+    except (ValueError, AttributeError):
+        return JsonResponse({"ok": False, "error": "JSON inválido."}, status=400)
+
+    if len(acoes) > SYNC_MAX_ACOES:
+        return JsonResponse({"ok": False, "error": f"Máximo de {SYNC_MAX_ACOES} ações por lote."}, status=400)
+
+    agora = timezone.now()
+    normalizadas = []
+    for a in acoes:
+        if not isinstance(a, dict):
+            return JsonResponse({"ok": False, "error": "Ação inválida."}, status=400)
+        chave = str(a.get("chave") or "").strip()[:64]
+        try:
+            alvo = int(a.get("alvo"))
+        except (TypeError, ValueError):
+            alvo = None
+        if not chave or alvo is None:
+            return JsonResponse({"ok": False, "error": "Ação sem chave ou alvo."}, status=400)
+        normalizadas.append((_sync_quando(a.get("em"), agora), chave, str(a.get("tipo") or ""), alvo))
+
+    # ordem de execução no celular (sort estável mantém a fila para horários iguais)
+    normalizadas.sort(key=lambda x: x[0])
+
+    resultados = []
+    with transaction.atomic():
+        # lotes da mesma rota em fila: o reenvio do celular (rede instável) espera o
+        # primeiro terminar e encontra as chaves já gravadas, em vez de bater na
+        # unicidade (usuario, chave) no meio do lote
+        rota = Rota.objects.select_for_update().get(id=rota.id)
+        ja_recebidas = {
+            a.chave: a for a in AcaoSincronizada.objects.filter(
+                usuario=request.user, chave__in=[n[1] for n in normalizadas]
+            )
+        }
+
+        for quando, chave, tipo, alvo in normalizadas:
+            anterior = ja_recebidas.get(chave)
+            if anterior:
+                resultados.append({"chave": chave, "ok": anterior.ok, "erro": anterior.erro, "repetida": True})
+                continue
+
+            with transaction.atomic():
+                erro = _sync_aplicar(rota, request.user, tipo, alvo, quando)
+                if erro:
+                    transaction.set_rollback(True)
+
+            ja_recebidas[chave] = AcaoSincronizada.objects.create(
+                usuario=request.user,
+                rota=rota,
+                chave=chave,
+                tipo=tipo[:30],
+                alvo_id=alvo,
+                executada_em=quando,
+                ok=not erro,
+                erro=erro,
+            )
+            resultados.append({"chave": chave, "ok": not erro, "erro": erro, "repetida": False})
+
+    return JsonResponse({
+        "ok": True,
+        "resultados": resultados,
+        "rota": _rota_estado_compacto(rota),
+    })
+
+
+# =========================
+# RASTREIO GPS
+# =========================
+@login_required
+@require_POST
+def rota_posicoes(request, rota_id):
+    """
+    Recebe posições do motoboy em lote: {"pontos": [[epoch, lat, lng], ...]}.
+    Só o motoboy da rota envia, e só enquanto a rota está ativa.
+    """
+    rota = get_object_or_404(Rota, id=rota_id)
+
+    if rota.motoboy_id != request.user.id:
+        return JsonResponse({"ok": False, "error": "Sem permissão."}, status=403)
+    if rota.status not in Rota.STATUS_ATIVOS:
+        return JsonResponse({"ok": False, "error": "Rota não está ativa."}, status=409)
+
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+        brutos = payload.get("pontos", [])
+        if not isinstance(brutos, list):
+            raise ValueError
+    except (ValueError, AttributeError):
+        return JsonResponse({"ok": False, "error": "JSON inválido."}, status=400)
+
+    pontos = rastreio.validar_pontos(brutos)
+    aceitos = rastreio.registrar_pontos(rota.id, pontos)
+
+    if pontos:
+        ultimo = max(pontos)
+        avisar_grupo.enfileirar(
+            f"rota_{rota.id}_posicao",
+            {"type": "posicao", "rota_id": rota.id, "ponto": list(ultimo)},
         )
 
-    return JsonResponse({"ok": True, "updated": total})
\ No newline at end of file
+    return JsonResponse({"ok": True, "aceitos": aceitos, "rejeitados": len(brutos) - aceitos})
+
+
+@login_required
+@permission_required("rotas.view_rota", raise_exception=True)
+def rota_rastreio(request, rota_id):
+    rota = get_object_or_404(Rota, id=rota_id)
+
+    if _is_motoboy(request.user) and rota.motoboy_id != request.user.id:
+        return JsonResponse({"ok": False, "error": "Sem permissão."}, status=403)
+
+    return JsonResponse({"ok": True, "rota_id": rota.id, "pontos": rastreio.pontos_da_rota(rota.id)})
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RotasConfig(AppConfig):
     name = 'rotas'
+
+    def ready(self):
+        if "rotas.metricas.MetricasMiddleware" in settings.MIDDLEWARE:
+            from rotas import metricas
+            metricas.instrumentar()
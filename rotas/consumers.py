@@ -0,0 +1,159 @@
+import json
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from rotas.models import Rota
+from rotas.services import geocode, paletes, rastreio, referencia
+
+class PosicaoConsumer(AsyncWebsocketConsumer):
+    """
+    ws/rotas/<rota_id>/posicao/
+
+    - O motoboy da rota envia {"pontos": [[epoch, lat, lng], ...]} (ou um único ponto).
+    - Quem tem permissão de ver a rota recebe a última posição em tempo real;
+      motoboy, só a da própria rota (como painel:rota_rastreio).
+    """
+
+    async def connect(self):
+        user = self.scope["user"]
+        self.rota_id = int(self.scope["url_route"]["kwargs"]["rota_id"])
+
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        rota = await database_sync_to_async(
+            lambda: Rota.objects.filter(id=self.rota_id).values("motoboy_id", "status").first()
+        )()
+        if not rota:
+            await self.close()
+            return
+
+        self.e_motoboy = rota["motoboy_id"] == user.id
+        if not self.e_motoboy and await database_sync_to_async(referencia.eh_motoboy)(user.id):
+            await self.close()
+            return
+        pode_ver = await database_sync_to_async(user.has_perm)("rotas.view_rota")
+        if not (self.e_motoboy or pode_ver):
+            await self.close()
+            return
+
+        self.group_name = f"rota_{self.rota_id}_posicao"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    def _rota_ativa(self):
+        return Rota.objects.filter(id=self.rota_id, status__in=Rota.STATUS_ATIVOS).exists()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if not self.e_motoboy:
+            return
+
+        try:
+            data = json.loads(text_data or "")
+        except ValueError:
+            return
+
+        brutos = data.get("pontos") if isinstance(data, dict) else [data]
+        if not isinstance(brutos, list):
+            return
+
+        pontos = rastreio.validar_pontos(brutos)
+        if not pontos:
+            return
+        # a rota pode ter sido finalizada com o socket aberto: confere a cada envio,
+        # como o rota_posicoes
+        if not await database_sync_to_async(self._rota_ativa)():
+            return
+
+        await sync_to_async(rastreio.registrar_pontos)(self.rota_id, pontos)
+        await self.channel_layer.group_send(
+            self.group_name,
+            {"type": "posicao", "rota_id": self.rota_id, "ponto": list(max(pontos))},
+        )
+
+    async def posicao(self, event):
+        await self.send(text_data=json.dumps({"rota_id": event["rota_id"], "ponto": event["ponto"]}))
+
+
+class PaletesConsumer(AsyncWebsocketConsumer):
+    """
+    ws/paletes/
+
+    Recebe {"contagens": {loja_id: pendentes}} sempre que um contador do
+    monitor de paletes muda. Usuário de loja comum só recebe a própria loja.
+    """
+
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        acesso = await database_sync_to_async(self._acesso)(user)
+        if acesso is None:
+            await self.close()
+            return
+
+        self.somente_loja = acesso
+        await self.channel_layer.group_add(paletes.GRUPO, self.channel_name)
+        await self.accept()
+
+    @staticmethod
+    def _acesso(user):
+        # mesma regra do gestao.views.monitor_paletes: None = sem acesso,
+        # False = vê todas as lojas, id = só a própria loja
+        loja = getattr(user, "loja_perfil", None)
+        if user.is_staff or user.is_superuser or user.groups.filter(name="Motoboy").exists():
+            return False
+        if loja is None:
+            return None
+        return False if loja.is_cd else loja.id
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(paletes.GRUPO, self.channel_name)
+
+    async def paletes_contagem(self, event):
+        contagens = event["contagens"]
+        if self.somente_loja:
+            chave = str(self.somente_loja)
+            if chave not in contagens:
+                return
+            contagens = {chave: contagens[chave]}
+        await self.send(text_data=json.dumps({"contagens": contagens}))
+
+
+class LojasGeocodificacaoConsumer(AsyncWebsocketConsumer):
+    """
+    ws/lojas/geocodificacao/
+
+    Recebe {"loja_id", "geocodificacao", "latitude", "longitude",
+    "endereco_normalizado"} quando o worker termina de localizar uma loja
+    salva em gestao (lista/formulário de lojas). Só AdminInterno.
+    """
+
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated or not await database_sync_to_async(self._admin)(user):
+            await self.close()
+            return
+        await self.channel_layer.group_add(geocode.GRUPO, self.channel_name)
+        await self.accept()
+
+    @staticmethod
+    def _admin(user):
+        # mesma regra do gestao.decorators.admin_interno_required
+        return user.groups.filter(name="AdminInterno").exists()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(geocode.GRUPO, self.channel_name)
+
+    async def loja_geocodificada(self, event):
+        dados = {k: v for k, v in event.items() if k != "type"}
+        await self.send(text_data=json.dumps(dados))
@@ -0,0 +1,73 @@
+# rotas/db_router.py
+"""
+Leituras de relatório/dashboard na réplica.
+
+Só as views marcadas com @usar_replica leem do alias "replica"; todo o resto
+(e toda escrita) fica no "default". Depois de um POST/PUT/PATCH/DELETE o
+ReplicaMiddleware grava um cookie curto e, enquanto ele existir, as views
+marcadas também leem do "default" — assim quem acabou de alterar algo vê a
+própria alteração mesmo com a réplica atrasada.
+"""
+import contextvars
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA = "replica"
+COOKIE = "db_primario"
+
+_usar_replica = contextvars.ContextVar("usar_replica", default=False)
+
+
+def _replica_configurada():
+    return REPLICA in settings.DATABASES
+
+
+def _grudado(request):
+    return request.method not in ("GET", "HEAD") or COOKIE in request.COOKIES
+
+
+def usar_replica(view_func):
+    @wraps(view_func)
+    def _view(request, *args, **kwargs):
+        if not _replica_configurada() or _grudado(request):
+            return view_func(request, *args, **kwargs)
+        token = _usar_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _usar_replica.reset(token)
+    return _view
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.segundos = getattr(settings, "REPLICA_GRUDAR_SEGUNDOS", 10)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and request.user.is_authenticated:
+            response.set_cookie(COOKIE, "1", max_age=self.segundos, httponly=True, samesite="Lax")
+        return response
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _usar_replica.get():
+            return None
+        # dentro de transação no primário, ler dele (a réplica não vê o que não foi commitado)
+        if connections["default"].in_atomic_block:
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # réplica e primário têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
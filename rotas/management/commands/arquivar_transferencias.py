@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rotas.services import particoes
+
+
+class Command(BaseCommand):
+    help = (
+        "Desanexa as partições mensais de Transferencia mais antigas que --manter meses em que "
+        "tudo já foi confirmado e as move para o schema 'arquivo'. Sem --executar só lista."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--manter", type=int, default=particoes.MANTER_MESES, help="Meses mantidos (padrão 12).")
+        parser.add_argument("--executar", action="store_true", help="Arquiva de fato (sem isso, só mostra).")
+
+    def handle(self, *args, **options):
+        if not particoes.particionada():
+            raise CommandError("rotas_transferencia não é particionada (só no PostgreSQL, migração 0028).")
+
+        resultado = particoes.arquivar(options["manter"], executar=options["executar"])
+        for nome, situacao in resultado:
+            self.stdout.write(f"{nome}: {situacao}")
+        if not resultado:
+            self.stdout.write("Nenhuma partição anterior ao período mantido.")
+        elif not options["executar"]:
+            self.stdout.write(self.style.WARNING("Nada foi alterado: rode com --executar para arquivar."))
@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from painel.views import _atualizar_ordem_paradas
+from rotas.models import Loja, Parada, Rota
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mede a reordenação de paradas (UPDATE único x um UPDATE por parada). Nada é gravado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--paradas", type=int, default=100)
+        parser.add_argument("--repeticoes", type=int, default=20)
+
+    def handle(self, *args, **options):
+        n = options["paradas"]
+        reps = options["repeticoes"]
+
+        try:
+            with transaction.atomic():
+                self._bench(n, reps)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _bench(self, n, reps):
+        loja = Loja.objects.create(nome="BENCH", cidade="BENCH")
+        rota = Rota.objects.create(nome="BENCH")
+        Parada.objects.bulk_create(
+            [Parada(rota=rota, loja=loja, ordem=i) for i in range(1, n + 1)]
+        )
+        ids = list(Parada.objects.filter(rota=rota).values_list("id", flat=True))
+
+        def loop(ordem_ids):
+            for ordem, parada_id in enumerate(ordem_ids, start=1):
+                Parada.objects.filter(id=parada_id, rota_id=rota.id).update(ordem=ordem)
+
+        def unico(ordem_ids):
+            _atualizar_ordem_paradas(rota.id, ordem_ids)
+
+        for nome, fn in [("loop (1 UPDATE por parada)", loop), ("CASE (1 UPDATE)", unico)]:
+            tempos = []
+            queries = 0
+            for _ in range(reps):
+                random.shuffle(ids)
+                with CaptureQueriesContext(connection) as ctx:
+                    inicio = time.perf_counter()
+                    fn(ids)
+                    tempos.append(time.perf_counter() - inicio)
+                queries = len(ctx.captured_queries)
+
+            tempos.sort()
+            self.stdout.write(
+                f"{nome:<28} paradas={n} queries={queries} "
+                f"mediana={tempos[len(tempos) // 2] * 1000:.2f}ms "
+                f"min={tempos[0] * 1000:.2f}ms"
+            )
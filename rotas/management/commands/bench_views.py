@@ -0,0 +1,139 @@
+import json
+import platform
+import subprocess
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rotas.management.commands.gerar_dados import gerar
+from rotas.models import Loja
+
+ESCALAS = "1000,10000,100000"
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _views(dados):
+    """(nome, url) das views medidas — mesmas chaves em todo relatório."""
+    loja = Loja.objects.filter(is_cd=False, nome__startswith="SYN ").order_by("id").first()
+    return [
+        ("home", reverse("painel:home")),
+        ("transferencias_lista", reverse("painel:transferencias_lista")),
+        ("rota_detalhe", reverse("painel:rota_detalhe", args=[dados["rota_id"]])),
+        ("monitor_paletes", reverse("gestao:monitor_paletes")),
+        ("detalhe_separacao", reverse("gestao:detalhe_separacao", args=[loja.nome])),
+        ("chat_lista", reverse("chat:lista")),
+        ("contatos_fragment", reverse("chat:contatos_fragment")),
+    ]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark das views mais acessadas sobre dados sintéticos (gerar_dados) em várias "
+        "escalas. Mede tempo e nº de queries e grava um relatório JSON. Nada é gravado no banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--escalas", default=ESCALAS, help=f"Lista separada por vírgula (padrão {ESCALAS}).")
+        parser.add_argument("--repeticoes", type=int, default=10)
+        parser.add_argument("--saida", help="Arquivo do relatório JSON (padrão: stdout).")
+        parser.add_argument("--comparar", help="Relatório anterior para mostrar a diferença.")
+
+    def handle(self, *args, **options):
+        escalas = [int(e) for e in options["escalas"].split(",") if e.strip()]
+        relatorio = {
+            "gerado_em": timezone.now().isoformat(),
+            "commit": _git_commit(),
+            "banco": connection.vendor,
+            "python": platform.python_version(),
+            "repeticoes": options["repeticoes"],
+            "escalas": {},
+        }
+
+        for escala in escalas:
+            self.stderr.write(f"escala {escala}...")
+            try:
+                with transaction.atomic():
+                    relatorio["escalas"][str(escala)] = self._medir(escala, options["repeticoes"])
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+        texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options["saida"]:
+            with open(options["saida"], "w", encoding="utf-8") as f:
+                f.write(texto + "\n")
+            self.stderr.write(f"relatório gravado em {options['saida']}")
+        else:
+            self.stdout.write(texto)
+
+        if options["comparar"]:
+            with open(options["comparar"], encoding="utf-8") as f:
+                self._comparar(json.load(f), relatorio)
+
+    def _medir(self, escala, reps):
+        cache.clear()
+        dados = gerar(escala)
+        User = get_user_model()
+        User.objects.filter(id=dados["operador_id"]).update(is_superuser=True)
+
+        client = Client()
+        client.force_login(User.objects.get(id=dados["operador_id"]))
+
+        views = {}
+        for nome, url in _views(dados):
+            resp = client.get(url)          # aquecimento (cache, índice de lojas, etc.)
+            tempos = []
+            for _ in range(reps):
+                with CaptureQueriesContext(connection) as ctx:
+                    inicio = time.perf_counter()
+                    resp = client.get(url)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+            tempos.sort()
+            views[nome] = {
+                "status": resp.status_code,
+                "bytes": len(resp.content),
+                "queries": len(ctx.captured_queries),
+                "mediana_ms": round(tempos[len(tempos) // 2], 2),
+                "p90_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.9))], 2),
+                "min_ms": round(tempos[0], 2),
+            }
+            self.stderr.write(
+                f"  {nome:<22} {views[nome]['mediana_ms']:>9.2f}ms  queries={views[nome]['queries']}"
+            )
+        return {"dados": dados, "views": views}
+
+    def _comparar(self, antes, depois):
+        self.stderr.write(f"\ncomparação {antes.get('commit')} -> {depois.get('commit')}")
+        for escala, atual in depois["escalas"].items():
+            anterior = antes.get("escalas", {}).get(escala)
+            if not anterior:
+                continue
+            self.stderr.write(f"escala {escala}")
+            for nome, v in atual["views"].items():
+                a = anterior["views"].get(nome)
+                if not a:
+                    continue
+                pct = (v["mediana_ms"] / a["mediana_ms"] - 1) * 100 if a["mediana_ms"] else 0
+                self.stderr.write(
+                    f"  {nome:<22} {a['mediana_ms']:>9.2f} -> {v['mediana_ms']:>9.2f}ms ({pct:+.0f}%)"
+                    f"  queries {a['queries']} -> {v['queries']}"
+                )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rotas.services import particoes
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria as partições mensais de Transferencia do mês corrente até --meses à frente "
+        "(PostgreSQL; rodar no cron). Linhas que caíram na partição padrão vão para a nova."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meses", type=int, default=particoes.MESES_A_FRENTE, help="Meses à frente (padrão 3).")
+
+    def handle(self, *args, **options):
+        if not particoes.particionada():
+            raise CommandError("rotas_transferencia não é particionada (só no PostgreSQL, migração 0028).")
+
+        criadas = particoes.criar_particoes(options["meses"])
+        for nome in criadas:
+            self.stdout.write(self.style.SUCCESS(f"Criada: {nome}"))
+        self.stdout.write(f"Concluído. Partições criadas: {len(criadas)}")
@@ -1,14 +1,14 @@
 from django.core.management.base import BaseCommand
 from rotas.models import Loja
+from rotas.tarefas import geocodificar_loja
 
 class Command(BaseCommand):
-    help = "Geocodifica lojas que não têm lat/lng"
+    help = "Enfileira a geocodificação das lojas que não têm lat/lng (rodada pelo manage.py worker)"
 
     def handle(self, *args, **options):
         total = 0
-        for loja in Loja.objects.all():
-            if loja.endereco and (loja.lat is None or loja.lng is None):
-                loja.save()  # vai chamar o save() do model e geocodificar
-                total += 1
-                self.stdout.write(self.style.SUCCESS(f"OK: {loja.nome} -> {loja.lat},{loja.lng}"))
-        self.stdout.write(self.style.WARNING(f"Concluído. Lojas atualizadas: {total}"))
+        for loja in Loja.objects.filter(latitude__isnull=True).exclude(endereco=""):
+            geocodificar_loja.enfileirar(loja.id)
+            total += 1
+            self.stdout.write(self.style.SUCCESS(f"Enfileirada: {loja.nome}"))
+        self.stdout.write(self.style.WARNING(f"Concluído. Lojas enfileiradas: {total}"))
@@ -0,0 +1,199 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from chat.models import Mensagem
+from rotas.models import Loja, Parada, Rota, Transferencia
+from rotas.services import geo, paletes
+
+User = get_user_model()
+
+PREFIXO_LOJA = "SYN "
+PREFIXO_USUARIO = "syn_"
+SENHA = "sintetico"
+LOTE = 5000
+
+BAIRROS = ["Centro", "Mooca", "Pinheiros", "Santana", "Tatuapé", "Lapa", "Butantã", "Ipiranga"]
+PRODUTOS = ["Cadeira", "Mesa", "Monitor", "Teclado", "Caixa de papel", "Toner", "Notebook", "Gaveteiro"]
+
+
+def dimensionar(escala):
+    """Quantidade de cada coisa para `escala` transferências."""
+    return {
+        "lojas": max(10, escala // 100),
+        "motoboys": max(3, escala // 1000),
+        "operadores": max(2, escala // 5000),
+        "rotas": max(5, escala // 50),
+        "paradas_por_rota": 8,
+        "transferencias": escala,
+        "mensagens": escala,
+    }
+
+
+def gerar(escala, seed=42, stdout=None):
+    """
+    Cria dados sintéticos (tudo com prefixo SYN/syn_) via bulk_create.
+    Retorna o dict de quantidades e ids úteis para o benchmark.
+    """
+    rnd = random.Random(seed)
+    n = dimensionar(escala)
+    agora = timezone.now()
+    hoje = timezone.localdate()
+
+    def log(msg):
+        if stdout:
+            stdout.write(msg)
+
+    with transaction.atomic():
+        grupos = {nome: Group.objects.get_or_create(name=nome)[0] for nome in ("Motoboy", "Operador", "Loja")}
+        senha = make_password(SENHA)
+
+        # --- lojas (a primeira é o CD) ---
+        lojas = Loja.objects.bulk_create([
+            Loja(
+                nome=f"{PREFIXO_LOJA}{'CD' if i == 0 else f'Loja {i:05d}'}",
+                cidade="São Paulo",
+                bairro=rnd.choice(BAIRROS),
+                endereco=f"Rua Sintética, {i + 1}",
+                latitude=-23.55 + rnd.uniform(-0.25, 0.25),
+                longitude=-46.63 + rnd.uniform(-0.25, 0.25),
+                is_cd=(i == 0),
+            )
+            for i in range(n["lojas"])
+        ], batch_size=LOTE)
+        cd, filiais = lojas[0], lojas[1:]
+        log(f"lojas: {len(lojas)}")
+
+        # --- usuários por grupo (um usuário de acesso por loja) ---
+        usuarios = User.objects.bulk_create(
+            [User(username=f"{PREFIXO_USUARIO}moto_{i}", password=senha) for i in range(n["motoboys"])]
+            + [User(username=f"{PREFIXO_USUARIO}oper_{i}", password=senha, is_staff=True) for i in range(n["operadores"])]
+            + [User(username=f"{PREFIXO_USUARIO}loja_{l.id}", password=senha) for l in lojas],
+            batch_size=LOTE,
+        )
+        motoboys = usuarios[:n["motoboys"]]
+        operadores = usuarios[n["motoboys"]:n["motoboys"] + n["operadores"]]
+        usuarios_loja = usuarios[n["motoboys"] + n["operadores"]:]
+
+        Membro = User.groups.through
+        Membro.objects.bulk_create(
+            [Membro(user_id=u.id, group_id=grupos["Motoboy"].id) for u in motoboys]
+            + [Membro(user_id=u.id, group_id=grupos["Operador"].id) for u in operadores]
+            + [Membro(user_id=u.id, group_id=grupos["Loja"].id) for u in usuarios_loja],
+            batch_size=LOTE,
+        )
+        for loja, u in zip(lojas, usuarios_loja):
+            loja.usuario = u
+        Loja.objects.bulk_update(lojas, ["usuario"], batch_size=LOTE)
+        log(f"usuários: {len(usuarios)}")
+
+        # --- rotas e paradas (a maioria já finalizada, algumas de hoje) ---
+        rotas = Rota.objects.bulk_create([
+            Rota(
+                nome=f"SYN Rota {i}",
+                data=hoje - timedelta(days=0 if i % 10 == 0 else rnd.randint(1, 120)),
+                motoboy=rnd.choice(motoboys),
+                status="em_rota" if i % 10 == 0 else "finalizada",
+            )
+            for i in range(n["rotas"])
+        ], batch_size=LOTE)
+
+        paradas = []
+        for rota in rotas:
+            ativa = rota.status != "finalizada"
+            for ordem, loja in enumerate(rnd.sample(lojas, min(n["paradas_por_rota"], len(lojas))), start=1):
+                coletado = not ativa or ordem <= 2
+                paradas.append(Parada(
+                    rota=rota, loja=loja, ordem=ordem,
+                    status="coletado" if coletado else "pendente",
+                    collected_at=agora - timedelta(minutes=rnd.randint(5, 600)) if coletado else None,
+                ))
+        Parada.objects.bulk_create(paradas, batch_size=LOTE)
+        log(f"rotas: {len(rotas)} / paradas: {len(paradas)}")
+
+        # --- transferências (metade saindo do CD) ---
+        status = ["pendente"] * 3 + ["em_transito"] * 2 + ["confirmada"] * 5
+        transferencias = []
+        for i in range(n["transferencias"]):
+            origem = cd if i % 2 == 0 else rnd.choice(filiais)
+            destino = rnd.choice([l for l in rnd.sample(filiais, 2) if l.id != origem.id])
+            st = rnd.choice(status)
+            rota = rnd.choice(rotas) if st != "pendente" else None
+            transferencias.append(Transferencia(
+                tipo="saida",
+                nome_produto=rnd.choice(PRODUTOS),
+                quantidade=rnd.randint(1, 50),
+                loja_origem=origem,
+                loja_destino=destino,
+                numero_transferencia=f"SYN{i:08d}",
+                status=st,
+                rota=rota,
+                motorista=rota.motoboy if rota else None,
+                criado_por=rnd.choice(operadores),
+            ))
+        Transferencia.objects.bulk_create(transferencias, batch_size=LOTE)
+        log(f"transferências: {len(transferencias)}")
+
+        # --- mensagens entre operadores, motoboys e lojas ---
+        falantes = motoboys + operadores + usuarios_loja[: max(10, len(usuarios_loja) // 10)]
+        mensagens = []
+        for i in range(n["mensagens"]):
+            de, para = rnd.sample(falantes, 2)
+            mensagens.append(Mensagem(
+                remetente=de, destinatario=para,
+                conteudo=f"Mensagem sintética {i}: {rnd.choice(PRODUTOS)} para {rnd.choice(BAIRROS)}",
+                lida=rnd.random() < 0.8,
+            ))
+        # bulk_create não dispara o post_save (não há envio por WebSocket)
+        Mensagem.objects.bulk_create(mensagens, batch_size=LOTE)
+        log(f"mensagens: {len(mensagens)}")
+
+    # bulk_create não passa pelos signals: índice de lojas e contadores de palete
+    # são remontados na próxima leitura
+    geo.invalidar()
+    paletes.invalidar()
+
+    return {
+        **n,
+        "operador_id": operadores[0].id,
+        "motoboy_id": motoboys[0].id,
+        "rota_id": rotas[0].id,     # em_rota, com paradas pendentes
+    }
+
+
+def limpar():
+    Transferencia.objects.filter(numero_transferencia__startswith="SYN").delete()
+    Mensagem.objects.filter(remetente__username__startswith=PREFIXO_USUARIO).delete()
+    Rota.objects.filter(nome__startswith="SYN Rota").delete()
+    Loja.objects.filter(nome__startswith=PREFIXO_LOJA).delete()
+    User.objects.filter(username__startswith=PREFIXO_USUARIO).delete()
+    geo.invalidar()
+    paletes.invalidar()
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos (lojas, usuários por grupo, rotas, paradas, transferências, "
+        "mensagens) via bulk_create. --escala = nº de transferências."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--escala", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--limpar", action="store_true", help="Apaga os dados sintéticos antes (ou só apaga, com --escala 0).")
+
+    def handle(self, *args, **options):
+        if options["limpar"]:
+            limpar()
+            self.stdout.write("Dados sintéticos anteriores removidos.")
+        if options["escala"] > 0:
+            if User.objects.filter(username__startswith=PREFIXO_USUARIO).exists():
+                raise CommandError("Já existem dados sintéticos; rode com --limpar para recriar.")
+            gerar(options["escala"], seed=options["seed"], stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Senha dos usuários sintéticos: {SENHA}"))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rotas.models import RastreioRota
+from rotas.services import rastreio
+
+
+class Command(BaseCommand):
+    help = "Simplifica (Douglas-Peucker) os trechos de rastreio mais antigos que N dias"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=7)
+        parser.add_argument("--tolerancia", type=float, default=15.0, help="Tolerância em metros")
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options["dias"])
+        rotas_ids = (
+            RastreioRota.objects
+            .filter(simplificado=False, fim__lt=limite)
+            .values_list("rota_id", flat=True)
+            .distinct()
+        )
+
+        antes = depois = 0
+        for rota_id in list(rotas_ids):
+            a, d = rastreio.compactar_rota(rota_id, limite, options["tolerancia"])
+            antes += a
+            depois += d
+
+        self.stdout.write(self.style.SUCCESS(f"Pontos: {antes} -> {depois}"))
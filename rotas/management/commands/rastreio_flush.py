@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from rotas.services import rastreio
+
+
+class Command(BaseCommand):
+    help = "Grava no banco os pontos de GPS que ainda estão no buffer do Redis (rodar a cada minuto)"
+
+    def handle(self, *args, **options):
+        total = 0
+        for rota_id in rastreio.rotas_com_buffer():
+            trecho = rastreio.descarregar(rota_id)
+            if trecho:
+                total += trecho.qtd_pontos
+        self.stdout.write(self.style.SUCCESS(f"Pontos gravados: {total}"))
@@ -0,0 +1,38 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from rotas.services import fila
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa as tarefas em segundo plano enfileiradas em rotas.services.fila "
+        "(e-mail, geocodificação, envios pelo channel layer). Ctrl+C/SIGTERM termina "
+        "depois do job corrente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--espera", type=int, default=1, help="Segundos bloqueado esperando job (padrão 1).")
+        parser.add_argument("--uma-vez", action="store_true", help="Esvazia a fila e sai (útil em cron/testes).")
+
+    def handle(self, *args, **options):
+        self.parar = False
+        signal.signal(signal.SIGTERM, self._parar)
+        signal.signal(signal.SIGINT, self._parar)
+
+        worker = fila.Worker()
+        devolvidos = worker.iniciar()
+        self.stdout.write(f"worker {worker.nome} ouvindo {fila.FILA} ({devolvidos} job(s) recuperados)")
+        try:
+            while not self.parar:
+                processou = worker.uma_vez(espera=options["espera"])
+                if options["uma_vez"] and not processou:
+                    break
+        finally:
+            worker.publicar(forcar=True)
+            worker.encerrar()
+        self.stdout.write("worker encerrado")
+
+    def _parar(self, signum, frame):
+        self.parar = True
@@ -0,0 +1,235 @@
+# rotas/metricas.py
+"""
+Métricas por view (em memória, por processo).
+
+`MetricasMiddleware` mede cada request: tempo total, quantidade e tempo de
+queries (via connection.execute_wrapper em todos os bancos), tempo gasto
+enviando para o channel layer e acertos/erros do cache. Os números vão para
+histogramas por view_name; requests acima de METRICAS_LENTA_MS são gravados
+com o SQL no logger "rotas.lentas" (arquivo rotativo, ver LOGGING).
+
+Channel layer e cache não têm gancho próprio: `instrumentar()` (chamado no
+RotasConfig.ready) embrulha os métodos deles para somar no request corrente.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("rotas.lentas")
+
+# limites superiores dos baldes (ms ou unidades); o último balde é "acima disso"
+BALDES_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+BALDES_QUERIES = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+MAX_SQL_GUARDADO = 50
+
+_atual = contextvars.ContextVar("metricas_request", default=None)
+_lock = threading.Lock()
+_views = {}
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.baldes = [0] * (len(limites) + 1)
+        self.n = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def add(self, valor):
+        self.baldes[bisect.bisect_left(self.limites, valor)] += 1
+        self.n += 1
+        self.soma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, p):
+        """Limite superior do balde onde cai o percentil (aproximado)."""
+        if not self.n:
+            return 0
+        alvo = self.n * p / 100.0
+        acumulado = 0
+        for limite, qtd in zip(self.limites + (self.maximo,), self.baldes):
+            acumulado += qtd
+            if acumulado >= alvo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def resumo(self):
+        return {
+            "media": round(self.soma / self.n, 2) if self.n else 0,
+            "p50": self.percentil(50),
+            "p90": self.percentil(90),
+            "p99": self.percentil(99),
+            "max": round(self.maximo, 2),
+        }
+
+
+class MetricasView:
+    def __init__(self):
+        self.tempo_ms = Histograma(BALDES_MS)
+        self.db_ms = Histograma(BALDES_MS)
+        self.queries = Histograma(BALDES_QUERIES)
+        self.canal_ms = Histograma(BALDES_MS)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.lentas = 0
+        self.erros = 0
+
+    def resumo(self):
+        return {
+            "requests": self.tempo_ms.n,
+            "tempo_ms": self.tempo_ms.resumo(),
+            "db_ms": self.db_ms.resumo(),
+            "queries": self.queries.resumo(),
+            "canal_ms": self.canal_ms.resumo(),
+            "cache": {"hits": self.cache_hits, "misses": self.cache_misses},
+            "lentas": self.lentas,
+            "erros_5xx": self.erros,
+        }
+
+
+class ColetaRequest:
+    __slots__ = ("queries", "db_ms", "sql", "canal_ms", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.sql = []
+        self.canal_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # assinatura exigida por connection.execute_wrapper
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            self.queries += 1
+            self.db_ms += ms
+            if len(self.sql) < MAX_SQL_GUARDADO:
+                self.sql.append((round(ms, 2), context["connection"].alias, sql))
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lenta_ms = getattr(settings, "METRICAS_LENTA_MS", 500)
+
+    def __call__(self, request):
+        coleta = ColetaRequest()
+        token = _atual.set(coleta)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(coleta))
+                response = self.get_response(request)
+        finally:
+            _atual.reset(token)
+
+        tempo_ms = (time.perf_counter() - inicio) * 1000
+        match = getattr(request, "resolver_match", None)
+        nome = (match.view_name if match else None) or "<sem rota>"
+        lenta = tempo_ms >= self.lenta_ms
+
+        with _lock:
+            m = _views.get(nome)
+            if m is None:
+                m = _views[nome] = MetricasView()
+            m.tempo_ms.add(tempo_ms)
+            m.db_ms.add(coleta.db_ms)
+            m.queries.add(coleta.queries)
+            m.canal_ms.add(coleta.canal_ms)
+            m.cache_hits += coleta.cache_hits
+            m.cache_misses += coleta.cache_misses
+            m.lentas += lenta
+            m.erros += response.status_code >= 500
+
+        if lenta:
+            logger.warning(json.dumps({
+                "view": nome,
+                "metodo": request.method,
+                "path": request.get_full_path(),
+                "status": response.status_code,
+                "tempo_ms": round(tempo_ms, 1),
+                "queries": coleta.queries,
+                "db_ms": round(coleta.db_ms, 1),
+                "canal_ms": round(coleta.canal_ms, 1),
+                "cache": [coleta.cache_hits, coleta.cache_misses],
+                "sql": sorted(coleta.sql, reverse=True),
+            }, ensure_ascii=False))
+        return response
+
+
+def snapshot():
+    with _lock:
+        views = {nome: m.resumo() for nome, m in _views.items()}
+    return {"pid": os.getpid(), "views": dict(sorted(views.items()))}
+
+
+def zerar():
+    with _lock:
+        _views.clear()
+
+
+# =========================
+# INSTRUMENTAÇÃO (channel layer / cache)
+# =========================
+_SEM_VALOR = object()
+
+
+def _embrulhar_canal(metodo):
+    @wraps(metodo)
+    async def medido(*args, **kwargs):
+        coleta = _atual.get()
+        if coleta is None:
+            return await metodo(*args, **kwargs)
+        inicio = time.perf_counter()
+        try:
+            return await metodo(*args, **kwargs)
+        finally:
+            coleta.canal_ms += (time.perf_counter() - inicio) * 1000
+    return medido
+
+
+def _embrulhar_cache_get(metodo):
+    @wraps(metodo)
+    def medido(self, key, default=None, version=None):
+        coleta = _atual.get()
+        valor = metodo(self, key, _SEM_VALOR, version=version)
+        if valor is _SEM_VALOR:
+            if coleta is not None:
+                coleta.cache_misses += 1
+            return default
+        if coleta is not None:
+            coleta.cache_hits += 1
+        return valor
+    medido._metricas = True
+    return medido
+
+
+def instrumentar():
+    from channels.layers import get_channel_layer
+    from django.core.cache import caches
+
+    layer = get_channel_layer()
+    if layer is not None and not getattr(layer, "_metricas", False):
+        layer.send = _embrulhar_canal(layer.send)
+        layer.group_send = _embrulhar_canal(layer.group_send)
+        layer._metricas = True
+
+    # caches[...] é por thread: embrulha na classe do backend
+    for alias in settings.CACHES:
+        cls = type(caches[alias])
+        if not getattr(cls.get, "_metricas", False):
+            cls.get = _embrulhar_cache_get(cls.get)
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0019_transferencia_confirmada_cd_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rota',
+            name='versao',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
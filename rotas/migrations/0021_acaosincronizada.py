@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0020_rota_versao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcaoSincronizada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64)),
+                ('tipo', models.CharField(choices=[('marcar_coletado', 'Marcar parada coletada'), ('confirmar_coleta', 'Confirmar coleta'), ('confirmar_entrega', 'Confirmar entrega')], max_length=30)),
+                ('alvo_id', models.PositiveIntegerField()),
+                ('executada_em', models.DateTimeField()),
+                ('recebida_em', models.DateTimeField(auto_now_add=True)),
+                ('ok', models.BooleanField(default=True)),
+                ('erro', models.CharField(blank=True, default='', max_length=255)),
+                ('rota', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='acoes_sincronizadas', to='rotas.rota')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='acoes_sincronizadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'chave'), name='acao_sync_usuario_chave_unica')],
+            },
+        ),
+    ]
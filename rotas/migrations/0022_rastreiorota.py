@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0021_acaosincronizada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RastreioRota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inicio', models.DateTimeField()),
+                ('fim', models.DateTimeField()),
+                ('qtd_pontos', models.PositiveIntegerField(default=0)),
+                ('pontos', models.BinaryField()),
+                ('simplificado', models.BooleanField(default=False)),
+                ('rota', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rastreios', to='rotas.rota')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['rota', 'inicio'], name='rastreio_rota_inicio_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+def marcar_cds(apps, schema_editor):
+    # até aqui o CD era reconhecido por ter "CD" no nome
+    Loja = apps.get_model("rotas", "Loja")
+    Loja.objects.filter(nome__icontains="CD").update(is_cd=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0022_rastreiorota'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loja',
+            name='is_cd',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Centro de distribuição (CD)'),
+        ),
+        migrations.RunPython(marcar_cds, migrations.RunPython.noop),
+    ]
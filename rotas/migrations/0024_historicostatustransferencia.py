@@ -0,0 +1,55 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def historico_inicial(apps, schema_editor):
+    # o que dá para reconstruir do estado atual: criação e último status
+    Transferencia = apps.get_model("rotas", "Transferencia")
+    Historico = apps.get_model("rotas", "HistoricoStatusTransferencia")
+
+    lote = []
+    for t in Transferencia.objects.values_list(
+        "id", "status", "criado_em", "criado_por_id", "confirmado_em", "confirmado_por_id"
+    ).iterator(chunk_size=2000):
+        tid, status, criado_em, criado_por_id, confirmado_em, confirmado_por_id = t
+        lote.append(Historico(transferencia_id=tid, de="", para="pendente", em=criado_em, por_id=criado_por_id))
+        if status != "pendente":
+            lote.append(Historico(
+                transferencia_id=tid, de="pendente", para=status,
+                em=confirmado_em or criado_em, por_id=confirmado_por_id,
+            ))
+        if len(lote) >= 2000:
+            Historico.objects.bulk_create(lote)
+            lote = []
+    Historico.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0023_loja_is_cd'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoricoStatusTransferencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('de', models.CharField(blank=True, max_length=20)),
+                ('para', models.CharField(max_length=20)),
+                ('em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('transferencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_status', to='rotas.transferencia')),
+            ],
+            options={
+                'ordering': ['em', 'id'],
+                'indexes': [models.Index(fields=['em'], name='rotas_histo_em_7a8ff8_idx'), models.Index(fields=['transferencia', 'em'], name='rotas_histo_transfe_661067_idx')],
+            },
+        ),
+        migrations.RunPython(historico_inicial, migrations.RunPython.noop),
+    ]
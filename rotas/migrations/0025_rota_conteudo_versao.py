@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0024_historicostatustransferencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rota',
+            name='conteudo_versao',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
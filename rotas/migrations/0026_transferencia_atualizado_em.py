@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0025_rota_conteudo_versao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transferencia',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0026_transferencia_atualizado_em'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loja',
+            name='geocodificacao',
+            field=models.CharField(blank=True, choices=[('pendente', 'Pendente'), ('ok', 'Localizada'), ('sem_resultado', 'Endereço não encontrado')], default='', max_length=15),
+        ),
+    ]
@@ -0,0 +1,124 @@
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Transferencia vira tabela particionada por mês de criado_em (só PostgreSQL).
+# Partições futuras: manage.py criar_particoes_transferencia; arquivamento:
+# manage.py arquivar_transferencias (ver rotas/services/particoes.py).
+#
+# - a PK no banco passa a ser (id, criado_em) — exigência do Postgres para
+#   tabela particionada; para o Django continua sendo id (a sequence garante).
+# - pelo mesmo motivo nenhuma FK pode apontar para a tabela: o histórico de
+#   status perde a constraint no banco (o CASCADE continua, feito pelo Django).
+# - linhas fora das partições mensais caem na partição padrão.
+
+TABELA = "rotas_transferencia"
+ANTIGA = "rotas_transferencia_antiga"
+PADRAO = "rotas_transferencia_padrao"
+SEQUENCE = "rotas_transferencia_id_seq"
+MESES_A_FRENTE = 3
+
+
+def _definicoes(cursor, tabela):
+    """CREATE INDEX (fora PK/unique) e FKs da tabela, para recriar depois da troca."""
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(indexrelid) FROM pg_index
+        WHERE indrelid = %s::regclass AND NOT indisprimary AND NOT indisunique
+        """,
+        [tabela],
+    )
+    indices = [r[0] for r in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [tabela],
+    )
+    return indices, cursor.fetchall()
+
+
+def _trocar(cursor, criar_tabela, pk, depois_de_criar=lambda: None):
+    indices, fks = _definicoes(cursor, TABELA)
+    cursor.execute(f"ALTER TABLE {TABELA} RENAME TO {ANTIGA}")
+    cursor.execute(f"ALTER SEQUENCE IF EXISTS {SEQUENCE} RENAME TO {SEQUENCE}_antiga")
+    cursor.execute(criar_tabela)
+    cursor.execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {TABELA}.id")
+    cursor.execute(f"ALTER TABLE {TABELA} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+    depois_de_criar()
+
+    cursor.execute(f"INSERT INTO {TABELA} SELECT * FROM {ANTIGA}")
+    cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT max(id) FROM {TABELA}), 0) + 1, false)")
+    cursor.execute(f"DROP TABLE {ANTIGA} CASCADE")
+    cursor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}_antiga")
+
+    # PK e índices só agora: nomes livres e o INSERT acima não precisou mantê-los
+    cursor.execute(f"ALTER TABLE {TABELA} ADD CONSTRAINT {TABELA}_pkey PRIMARY KEY ({pk})")
+    for sql in indices:
+        cursor.execute(sql)
+    for nome, definicao in fks:
+        cursor.execute(f"ALTER TABLE {TABELA} ADD CONSTRAINT {nome} {definicao}")
+
+
+def _mes_seguinte(d):
+    return (d.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def particionar(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(criado_em), max(criado_em) FROM {TABELA}")
+        primeiro, ultimo = cursor.fetchone()
+
+        def criar_particoes():
+            hoje = datetime.datetime.now(datetime.timezone.utc).date()
+            mes = (primeiro.date() if primeiro else hoje).replace(day=1)
+            fim = max(ultimo.date() if ultimo else hoje, hoje)
+            for _ in range(MESES_A_FRENTE):
+                fim = _mes_seguinte(fim)
+            while mes <= fim:
+                proximo = _mes_seguinte(mes)
+                cursor.execute(
+                    f"CREATE TABLE {TABELA}_p{mes:%Y_%m} PARTITION OF {TABELA} "
+                    f"FOR VALUES FROM ('{mes:%Y-%m-%d} 00:00:00+00') TO ('{proximo:%Y-%m-%d} 00:00:00+00')"
+                )
+                mes = proximo
+            cursor.execute(f"CREATE TABLE {PADRAO} PARTITION OF {TABELA} DEFAULT")
+
+        _trocar(
+            cursor,
+            f"CREATE TABLE {TABELA} (LIKE {ANTIGA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (criado_em)",
+            "id, criado_em",
+            criar_particoes,
+        )
+
+
+def desparticionar(apps, schema_editor):
+    # partições já arquivadas (desanexadas) não voltam: ficam no schema de arquivo
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        _trocar(
+            cursor,
+            f"CREATE TABLE {TABELA} (LIKE {ANTIGA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+            "id",
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0027_loja_geocodificacao'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historicostatustransferencia',
+            name='transferencia',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='historico_status', to='rotas.transferencia'),
+        ),
+        migrations.RunPython(particionar, desparticionar),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rotas', '0028_transferencia_particionada'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loja',
+            name='geocodificacao',
+            field=models.CharField(blank=True, choices=[('pendente', 'Pendente'), ('ok', 'Localizada'), ('sem_resultado', 'Endereço não encontrado'), ('indisponivel', 'Serviço de mapas indisponível')], default='', max_length=15),
+        ),
+    ]
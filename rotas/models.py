@@ -1,7 +1,9 @@
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
-from django.contrib.auth.models import User
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
 
 class Loja(models.Model):
     # Novo campo para o login da loja
@@ -26,10 +28,47 @@ class Loja(models.Model):
     latitude = models.FloatField(blank=True, null=True)
     longitude = models.FloatField(blank=True, null=True)
     ativa = models.BooleanField(default=True)
+    is_cd = models.BooleanField("Centro de distribuição (CD)", default=False, db_index=True)
+
+    # geocodificação roda no worker (rotas/tarefas.py); "" = nunca pedida
+    GEOCODIFICACAO_CHOICES = [
+        ("pendente", "Pendente"),
+        ("ok", "Localizada"),
+        ("sem_resultado", "Endereço não encontrado"),
+        ("indisponivel", "Serviço de mapas indisponível"),
+    ]
+    geocodificacao = models.CharField(max_length=15, choices=GEOCODIFICACAO_CHOICES, blank=True, default="")
 
     def __str__(self):
         return f"{self.nome} - {self.cidade}/{self.uf}"
 
+
+@receiver([post_save, post_delete], sender=Loja)
+def invalidar_indice_lojas(sender, **kwargs):
+    # índice espacial em memória (rotas/services/geo.py) precisa ser remontado
+    from rotas.services import geo, paletes, referencia
+    geo.invalidar()
+    paletes.invalidar()
+    referencia.invalidar(referencia.LOJAS)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidar_motoboys_usuario(sender, instance, update_fields=None, **kwargs):
+    # login só grava last_login: não muda a lista de motoboys
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    from rotas.services import referencia
+    referencia.invalidar(referencia.MOTOBOYS)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver([post_save, post_delete], sender=Group)
+def invalidar_motoboys_grupos(sender, action=None, **kwargs):
+    if action is not None and not action.startswith("post_"):
+        return
+    from rotas.services import referencia
+    referencia.invalidar(referencia.MOTOBOYS)
+
 class Coleta(models.Model):
     STATUS_CHOICES = [
     ("pendente", "Pendente"),
@@ -49,6 +88,8 @@ class Rota(models.Model):
         ("em_rota", "Em rota"),
         ("finalizada", "Finalizada"),
     ]
+    STATUS_ATIVOS = ["aberta", "em_rota"]
+
     # Adicionado null=True e blank=True para destravar a migração
     nome = models.CharField(max_length=120, null=True, blank=True)
     data = models.DateField(default=timezone.now)
@@ -64,10 +105,47 @@ class Rota(models.Model):
         verbose_name="Criada por",
     )
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
-    
+
+    # Incrementado a cada reordenação das paradas (controle de concorrência otimista)
+    versao = models.PositiveIntegerField(default=0)
+
+    # Incrementado em qualquer mudança de parada/transferência da rota (chave do cache do rota_detalhe)
+    conteudo_versao = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"{self.nome} ({self.data})"
 
+
+def tocar_rotas(*rota_ids):
+    """Invalida o cache do detalhe das rotas (incrementa conteudo_versao)."""
+    ids = {i for i in rota_ids if i}
+    if ids:
+        Rota.objects.filter(id__in=ids).update(conteudo_versao=models.F("conteudo_versao") + 1)
+
+
+_CAMPOS_ROTA_VISIVEIS = ("status", "motoboy_id", "data")
+
+
+def _estado_rota(instance):
+    d = instance.__dict__
+    return tuple(d.get(campo) for campo in _CAMPOS_ROTA_VISIVEIS)
+
+
+@receiver(post_init, sender=Rota)
+def guardar_estado_rota(sender, instance, **kwargs):
+    instance._estado_antes = _estado_rota(instance)
+
+
+@receiver(post_save, sender=Rota)
+def rota_salva(sender, instance, created, **kwargs):
+    # status/motoboy/data aparecem em outras páginas (lista de transferências):
+    # a mudança conta como mudança de conteúdo da rota
+    depois = _estado_rota(instance)
+    if not created and depois != getattr(instance, "_estado_antes", depois):
+        tocar_rotas(instance.pk)
+        instance.conteudo_versao += 1
+    instance._estado_antes = depois
+
 class Parada(models.Model):
     # Opções de status
     STATUS_CHOICES = [
@@ -93,6 +171,11 @@ class Parada(models.Model):
     def __str__(self):
         return f"{self.rota} - {self.loja} (#{self.ordem})"
 
+
+@receiver([post_save, post_delete], sender=Parada)
+def parada_alterada(sender, instance, **kwargs):
+    tocar_rotas(instance.rota_id)
+
 class Protocolo(models.Model):
     STATUS_CHOICES = [
         ("pendente", "Pendente"),
@@ -182,6 +265,8 @@ class Transferencia(models.Model):
     # --- Status e Auditoria ---
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pendente")
     criado_em = models.DateTimeField(auto_now_add=True)
+    # UPDATEs em lote (.update) precisam setar na mão — base do ETag da lista
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
     criado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name="transferencias_criadas")
     confirmado_em = models.DateTimeField(blank=True, null=True)
     confirmado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name="transferencias_confirmadas")
@@ -212,8 +297,114 @@ class Transferencia(models.Model):
         related_name="transferencias_confirmadas_cd"
     )
     obs_confirmacao_cd = models.TextField(blank=True, default="")
-    
-    
+
+
+_CAMPOS_ESTADO = ("status", "loja_origem_id", "loja_destino_id")
+
+
+def _estado_transferencia(instance, gravado=None):
+    # lido do __dict__ para não disparar query em campo adiado (.only/.defer);
+    # o que não foi carregado vem de `gravado` (estado no banco), se houver
+    d = instance.__dict__
+    if gravado is not None:
+        return tuple(d.get(campo, valor) for campo, valor in zip(_CAMPOS_ESTADO, gravado))
+    if not set(_CAMPOS_ESTADO) <= d.keys():
+        return None
+    return tuple(d[campo] for campo in _CAMPOS_ESTADO)
+
+
+@receiver(post_init, sender=Transferencia)
+def guardar_estado_transferencia(sender, instance, **kwargs):
+    instance._estado_antes = _estado_transferencia(instance) if instance.pk else ("", None, None)
+    instance._rota_antes = instance.__dict__.get("rota_id")
+
+
+@receiver(pre_save, sender=Transferencia)
+def ler_estado_gravado(sender, instance, raw=False, using=None, **kwargs):
+    # instância de .only()/.defer() sem status/lojas: uma leitura do estado gravado,
+    # em vez de tratar como desconhecido (histórico com de="" e recontagem dos paletes)
+    if raw or instance._state.adding or getattr(instance, "_estado_antes", None) is not None:
+        return
+    instance._estado_gravado = (
+        Transferencia.objects.using(using or instance._state.db)
+        .filter(pk=instance.pk)
+        .values_list(*_CAMPOS_ESTADO)
+        .first()
+    )
+    instance._estado_antes = instance._estado_gravado
+
+
+@receiver(post_save, sender=Transferencia)
+def transferencia_salva(sender, instance, created, **kwargs):
+    from rotas.services import paletes
+    antes = ("", None, None) if created else getattr(instance, "_estado_antes", None)
+    depois = _estado_transferencia(instance, instance.__dict__.pop("_estado_gravado", None))
+
+    # contadores do monitor de paletes (rotas/services/paletes.py)
+    if antes is None or depois is None:
+        paletes.invalidar()
+    else:
+        paletes.aplicar(paletes.delta_transicao(antes, depois))
+
+    # histórico de status; quem alterou vem de `_alterado_por`, quando a view informa
+    if depois is not None and (antes is None or antes[0] != depois[0]):
+        por = getattr(instance, "_alterado_por", None)
+        HistoricoStatusTransferencia.objects.create(
+            transferencia_id=instance.pk,
+            de=antes[0] if antes else "",
+            para=depois[0],
+            em=instance.criado_em if created else timezone.now(),
+            por_id=por.pk if por else (instance.criado_por_id if created else None),
+        )
+    instance._estado_antes = depois
+
+    tocar_rotas(getattr(instance, "_rota_antes", None), instance.__dict__.get("rota_id"))
+    instance._rota_antes = instance.__dict__.get("rota_id")
+
+
+@receiver(post_delete, sender=Transferencia)
+def transferencia_excluida(sender, instance, **kwargs):
+    from rotas.services import paletes
+    antes = getattr(instance, "_estado_antes", None)
+    if antes is None:
+        paletes.invalidar()
+    else:
+        paletes.aplicar(paletes.delta_transicao(antes, ("", None, None)))
+    tocar_rotas(getattr(instance, "_rota_antes", None))
+
+
+class HistoricoStatusTransferencia(models.Model):
+    """
+    Log append-only das mudanças de status de Transferencia (uma linha por
+    transição, nunca atualizada). Base para os tempos de ciclo em
+    rotas/services/lead_time.py.
+    """
+    # sem constraint no banco: Transferencia é particionada (migração 0028) e o
+    # Postgres não aceita FK apontando para tabela particionada só por id
+    transferencia = models.ForeignKey(
+        Transferencia, on_delete=models.CASCADE, related_name="historico_status", db_constraint=False,
+    )
+    de = models.CharField(max_length=20, blank=True)
+    para = models.CharField(max_length=20)
+    em = models.DateTimeField(default=timezone.now)
+    por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+
+    class Meta:
+        ordering = ["em", "id"]
+        indexes = [
+            models.Index(fields=["em"]),
+            models.Index(fields=["transferencia", "em"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Histórico de status não pode ser alterado.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"#{self.transferencia_id}: {self.de or '-'} -> {self.para}"
+
+
 class Notificacao(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notificacoes')
     titulo = models.CharField(max_length=100)
@@ -239,4 +430,55 @@ class Perfil(models.Model):
     telefone = models.CharField(max_length=20, blank=True, null=True)
 
     def __str__(self):
-        return f"Perfil de {self.user.username}"
\ No newline at end of file
+        return f"Perfil de {self.user.username}"
+
+class AcaoSincronizada(models.Model):
+    """
+    Ação do app do motoboy recebida pelo sync offline.
+    A chave (gerada no celular) garante que reenviar o mesmo lote não aplica nada duas vezes.
+    """
+    TIPO_CHOICES = [
+        ("marcar_coletado", "Marcar parada coletada"),
+        ("confirmar_coleta", "Confirmar coleta"),
+        ("confirmar_entrega", "Confirmar entrega"),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name="acoes_sincronizadas")
+    rota = models.ForeignKey(Rota, on_delete=models.CASCADE, related_name="acoes_sincronizadas")
+    chave = models.CharField(max_length=64)
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    alvo_id = models.PositiveIntegerField()
+    executada_em = models.DateTimeField()
+    recebida_em = models.DateTimeField(auto_now_add=True)
+    ok = models.BooleanField(default=True)
+    erro = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["usuario", "chave"], name="acao_sync_usuario_chave_unica"),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario} - {self.tipo} #{self.alvo_id} ({self.chave})"
+
+
+class RastreioRota(models.Model):
+    """
+    Trecho do rastreio GPS de uma rota (append-only).
+    `pontos` guarda os pontos empacotados em binário: struct "<Iii" = (epoch sem sinal, lat*1e6, lng*1e6).
+    Ver rotas/services/rastreio.py.
+    """
+    rota = models.ForeignKey(Rota, on_delete=models.CASCADE, related_name="rastreios")
+    inicio = models.DateTimeField()
+    fim = models.DateTimeField()
+    qtd_pontos = models.PositiveIntegerField(default=0)
+    pontos = models.BinaryField()
+    simplificado = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["rota", "inicio"], name="rastreio_rota_inicio_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.rota} - {self.qtd_pontos} pontos ({self.inicio:%H:%M}-{self.fim:%H:%M})"
@@ -0,0 +1,8 @@
+from django.urls import re_path
+from . import consumers
+
+websocket_urlpatterns = [
+    re_path(r'ws/rotas/(?P<rota_id>\d+)/posicao/$', consumers.PosicaoConsumer.as_asgi()),
+    re_path(r'ws/paletes/$', consumers.PaletesConsumer.as_asgi()),
+    re_path(r'ws/lojas/geocodificacao/$', consumers.LojasGeocodificacaoConsumer.as_asgi()),
+]
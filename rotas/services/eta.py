@@ -0,0 +1,164 @@
+# rotas/services/eta.py
+"""
+Previsão de chegada (ETA) das paradas pendentes.
+
+O modelo é aprendido do histórico de `Parada.collected_at`: para cada rota,
+o intervalo entre duas coletas consecutivas (loja A -> loja B) é o tempo de
+deslocamento até B somado ao atendimento em B. Como não registramos a
+chegada na loja, os dois não dá para separar — por isso guardamos:
+
+- por trecho (A -> B): mediana dos intervalos, quando há amostras suficientes;
+- por loja (B): mediana de todos os intervalos que terminam em B
+  (tempo típico para "concluir" a loja vindo de qualquer lugar);
+- geral: mediana de todos os intervalos, como último recurso.
+
+Tudo é calculado com NumPy sobre o histórico inteiro e o modelo fica no cache.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from rotas.models import Parada
+
+CACHE_KEY = "eta:modelo:v1"
+CACHE_TIMEOUT = 60 * 60          # 1h — o histórico muda devagar
+MIN_AMOSTRAS = 3
+INTERVALO_MAX = 4 * 60 * 60      # intervalos > 4h são pausa/almoço, não deslocamento
+INTERVALO_PADRAO = 20 * 60       # sem histórico nenhum
+
+
+def _medianas_por_grupo(grupos, valores):
+    """
+    Mediana de `valores` para cada grupo, vetorizado.
+    Retorna (grupos_unicos, medianas, contagens).
+    """
+    ordem = np.lexsort((valores, grupos))
+    g = grupos[ordem]
+    v = valores[ordem]
+
+    unicos, inicio, contagem = np.unique(g, return_index=True, return_counts=True)
+    baixo = v[inicio + (contagem - 1) // 2]
+    alto = v[inicio + contagem // 2]
+    return unicos, (baixo + alto) / 2.0, contagem
+
+
+def treinar():
+    """Monta o modelo a partir de todo o histórico de coletas."""
+    linhas = list(
+        Parada.objects
+        .filter(collected_at__isnull=False)
+        .values_list("rota_id", "loja_id", "collected_at")
+    )
+
+    modelo = {"trechos": {}, "lojas": {}, "geral": float(INTERVALO_PADRAO), "amostras": 0}
+    if len(linhas) < 2:
+        return modelo
+
+    n = len(linhas)
+    rotas = np.fromiter((l[0] for l in linhas), dtype=np.int64, count=n)
+    lojas = np.fromiter((l[1] for l in linhas), dtype=np.int64, count=n)
+    tempos = np.fromiter((l[2].timestamp() for l in linhas), dtype=np.float64, count=n)
+
+    ordem = np.lexsort((tempos, rotas))
+    rotas, lojas, tempos = rotas[ordem], lojas[ordem], tempos[ordem]
+
+    # pares consecutivos dentro da mesma rota
+    mesma_rota = rotas[1:] == rotas[:-1]
+    delta = tempos[1:] - tempos[:-1]
+    valido = mesma_rota & (delta > 0) & (delta <= INTERVALO_MAX)
+
+    origem = lojas[:-1][valido]
+    destino = lojas[1:][valido]
+    delta = delta[valido]
+
+    if not len(delta):
+        return modelo
+
+    modelo["amostras"] = int(len(delta))
+    modelo["geral"] = float(np.median(delta))
+
+    lojas_u, med_lojas, _ = _medianas_por_grupo(destino, delta)
+    modelo["lojas"] = dict(zip(lojas_u.tolist(), med_lojas.tolist()))
+
+    # chave única do trecho: origem * 2^32 + destino
+    chave = (origem << 32) | destino
+    trechos_u, med_trechos, cont = _medianas_por_grupo(chave, delta)
+    suficiente = cont >= MIN_AMOSTRAS
+    modelo["trechos"] = {
+        (int(k >> 32), int(k & 0xFFFFFFFF)): float(m)
+        for k, m in zip(trechos_u[suficiente], med_trechos[suficiente])
+    }
+    return modelo
+
+
+def get_modelo():
+    modelo = cache.get(CACHE_KEY)
+    if modelo is None:
+        modelo = treinar()
+        cache.set(CACHE_KEY, modelo, CACHE_TIMEOUT)
+    return modelo
+
+
+def estimar_segundos(modelo, origem_id, destino_id):
+    if origem_id is not None:
+        t = modelo["trechos"].get((origem_id, destino_id))
+        if t is not None:
+            return t
+    return modelo["lojas"].get(destino_id, modelo["geral"])
+
+
+def prever_rota(paradas, agora=None, modelo=None):
+    """
+    `paradas`: lista da rota em ordem (com loja_id, status e collected_at).
+    Retorna {parada_id: datetime previsto} para as pendentes.
+    """
+    agora = agora or timezone.now()
+    modelo = modelo or get_modelo()
+
+    coletadas = [p for p in paradas if p.status == "coletado" and p.collected_at]
+    if coletadas:
+        ultima = max(coletadas, key=lambda p: p.collected_at)
+        base, anterior = ultima.collected_at, ultima.loja_id
+    else:
+        base, anterior = agora, None
+
+    previsoes = {}
+    acumulado = 0.0
+    for p in paradas:
+        if p.status != "pendente":
+            continue
+        acumulado += estimar_segundos(modelo, anterior, p.loja_id)
+        previsoes[p.id] = acumulado
+        anterior = p.loja_id
+
+    if not previsoes:
+        return {}
+
+    # motoboy atrasado em relação ao histórico: a próxima parada é "agora"
+    primeira = base + timedelta(seconds=min(previsoes.values()))
+    atraso = max(timedelta(0), agora - primeira)
+
+    return {
+        pid: base + atraso + timedelta(seconds=seg)
+        for pid, seg in previsoes.items()
+    }
+
+
+def prever_rotas(rota_ids, agora=None):
+    """ETA das paradas pendentes de várias rotas com uma única query."""
+    por_rota = {}
+    for p in (
+        Parada.objects
+        .filter(rota_id__in=rota_ids)
+        .only("id", "rota_id", "loja_id", "status", "collected_at", "ordem")
+        .order_by("rota_id", "ordem")
+    ):
+        por_rota.setdefault(p.rota_id, []).append(p)
+
+    modelo = get_modelo()
+    previsoes = {}
+    for paradas in por_rota.values():
+        previsoes.update(prever_rota(paradas, agora=agora, modelo=modelo))
+    return previsoes
@@ -0,0 +1,316 @@
+# rotas/services/fila.py
+"""
+Fila de tarefas em segundo plano (Redis — o mesmo do Channels).
+
+Efeitos colaterais lentos (e-mail, geocodificação, envios pelo channel layer)
+não rodam mais dentro do request: a view chama `tarefa.enfileirar(...)`, o job
+vai para a lista do Redis depois do commit e o `manage.py worker` executa.
+
+    @fila.tarefa(tentativas=5)
+    def enviar_link_senha(user_id, dominio, https=False): ...
+
+    enviar_link_senha.enfileirar(u.id, request.get_host(), request.is_secure())
+
+Argumentos precisam ser serializáveis em JSON. Tarefas ficam em <app>/tarefas.py
+(descobertas automaticamente). Falhou -> volta para a fila depois de um
+backoff exponencial com jitter (zset de agendados); esgotou as tentativas ->
+lista de mortos e o `ao_desistir` da tarefa. Sem Redis, o job roda na hora,
+no próprio processo, com as mesmas tentativas (sem o backoff: não há onde
+deixá-lo esperando) e o mesmo `ao_desistir`.
+
+O worker tira o job da fila com BLMOVE para a sua lista fila:processando:<nome>
+e só o remove de lá depois de executar. Cada worker renova seu prazo no zset
+fila:workers; quem passou de VIVO_TTL sem renovar (morto no meio de um job)
+tem a lista devolvida à fila pelo próximo worker que notar. Ou seja, entrega
+"ao menos uma vez": tarefas precisam aguentar rodar de novo.
+
+Sem nenhum worker vivo (ninguém subiu `manage.py worker`) o job vai para a
+fila do mesmo jeito, com aviso no log: SMTP e Nominatim não voltam para o
+request, e o primeiro worker que subir processa.
+
+Cada worker publica espera na fila / tempo de execução por tarefa e o estado
+dos serviços externos que chamou (resiliente.py) em `fila:metricas` (ver
+gestao:metricas).
+"""
+import json
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import autodiscover_modules
+from redis.exceptions import RedisError
+
+from rotas.metricas import BALDES_MS, Histograma
+from rotas.services import resiliente
+from rotas.services.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+FILA = "fila:jobs"
+AGENDADOS = "fila:agendados"
+MORTOS = "fila:mortos"
+METRICAS = "fila:metricas"
+WORKERS = "fila:workers"          # zset nome -> instante em que o worker é dado como morto
+PROCESSANDO = "fila:processando:{nome}"
+VIVO_TTL = 5 * 60             # segundos sem sinal (maior que o job mais lento)
+RECUPERAR_A_CADA = 60         # segundos entre buscas por workers mortos
+MAX_MORTOS = 1000
+BACKOFF_BASE = 5              # segundos; dobra a cada tentativa
+BACKOFF_MAX = 10 * 60
+PUBLICAR_A_CADA = 10          # segundos entre publicações das métricas do worker
+
+_tarefas = {}
+_descobertas = False
+
+
+class Tarefa:
+    def __init__(self, func, nome, tentativas):
+        self.func = func
+        self.nome = nome
+        self.tentativas = tentativas
+        self.desistir = None
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enfileirar(self, *args, **kwargs):
+        enfileirar(self.nome, *args, **kwargs)
+
+    def ao_desistir(self, func):
+        """
+        Decorador: `func(*args, **kwargs)` roda quando o job esgota as
+        tentativas (no worker ou no processo, sem Redis) — para não deixar
+        estado "em andamento".
+        """
+        self.desistir = func
+        return func
+
+
+def tarefa(tentativas=3):
+    def registrar(func):
+        t = Tarefa(func, f"{func.__module__}.{func.__name__}", tentativas)
+        _tarefas[t.nome] = t
+        return t
+    return registrar
+
+
+def _tarefa(nome):
+    global _descobertas
+    if nome not in _tarefas and not _descobertas:
+        autodiscover_modules("tarefas")
+        _descobertas = True
+    return _tarefas[nome]
+
+
+def backoff(tentativa):
+    """Segundos até a próxima tentativa (exponencial, com jitter)."""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** tentativa) * random.uniform(0.5, 1.0)
+
+
+# =========================
+# ENFILEIRAR
+# =========================
+def enfileirar(nome, *args, **kwargs):
+    """Agenda a tarefa para depois do commit da transação corrente."""
+    agora = time.time()
+    job = {
+        "id": uuid.uuid4().hex,
+        "tarefa": nome,
+        "args": list(args),
+        "kwargs": kwargs,
+        "tentativa": 0,
+        "enfileirado_em": agora,
+        "disponivel_em": agora,
+    }
+    json.dumps(job)       # argumento não serializável estoura aqui, não no worker
+    transaction.on_commit(lambda: _empurrar(job))
+
+
+def _empurrar(job):
+    agora = job["disponivel_em"] = time.time()
+    try:
+        r = get_redis()
+        r.lpush(FILA, json.dumps(job))
+        if not r.zcount(WORKERS, agora, "+inf"):
+            logger.warning("fila: nenhum worker vivo, %s aguarda na fila", job["tarefa"])
+        return
+    except RedisError:
+        logger.warning("fila: Redis indisponível, executando %s no processo", job["tarefa"])
+    _rodar_no_processo(job)
+
+
+def _rodar_no_processo(job):
+    t = _tarefa(job["tarefa"])
+    while True:
+        try:
+            t(*job["args"], **job["kwargs"])
+            return
+        except Exception:
+            logger.exception("fila: %s (tentativa %s, no processo) falhou", job["tarefa"], job["tentativa"] + 1)
+        job["tentativa"] += 1
+        if job["tentativa"] >= t.tentativas:
+            _desistir(t, job)
+            return
+
+
+def _desistir(t, job):
+    if t is None or t.desistir is None:
+        return
+    try:
+        t.desistir(*job["args"], **job["kwargs"])
+    except Exception:
+        logger.exception("fila: ao_desistir de %s falhou", job["tarefa"])
+
+
+# =========================
+# WORKER
+# =========================
+class Worker:
+    def __init__(self, redis=None):
+        self.redis = redis or get_redis()
+        self.nome = f"{socket.gethostname()}:{os.getpid()}"
+        self.processando = PROCESSANDO.format(nome=self.nome)
+        self.metricas = {}
+        self.publicado_em = 0.0
+        self.recuperado_em = 0.0
+
+    def iniciar(self):
+        """
+        Registra o worker e devolve à fila o que ficou na própria lista de
+        processamento (mesmo nome = mesmo host/pid, comum em container) e nas
+        de workers mortos.
+        """
+        self.renovar()
+        devolvidos = self._devolver(self.processando)
+        return devolvidos + self.recuperar()
+
+    def renovar(self):
+        self.redis.zadd(WORKERS, {self.nome: time.time() + VIVO_TTL})
+
+    def encerrar(self):
+        self.redis.zrem(WORKERS, self.nome)
+
+    def recuperar(self):
+        """Devolve à fila os jobs de workers que pararam de renovar. Retorna quantos."""
+        self.recuperado_em = time.monotonic()
+        devolvidos = 0
+        for nome in self.redis.zrangebyscore(WORKERS, 0, time.time()):
+            nome = nome.decode() if isinstance(nome, bytes) else nome
+            devolvidos += self._devolver(PROCESSANDO.format(nome=nome))
+            self.redis.zrem(WORKERS, nome)
+        return devolvidos
+
+    def _devolver(self, lista):
+        # LMOVE é atômico: dois workers recuperando a mesma lista não duplicam o job
+        devolvidos = 0
+        while self.redis.lmove(lista, FILA, "RIGHT", "RIGHT") is not None:
+            devolvidos += 1
+        if devolvidos:
+            logger.warning("fila: %s job(s) de %s devolvidos à fila", devolvidos, lista)
+        return devolvidos
+
+    def promover_agendados(self):
+        """Move para a fila os jobs agendados cujo backoff já passou."""
+        agora = time.time()
+        for payload in self.redis.zrangebyscore(AGENDADOS, 0, agora, start=0, num=100):
+            # zrem só devolve 1 para um worker: o job não é duplicado
+            if self.redis.zrem(AGENDADOS, payload):
+                self.redis.lpush(FILA, payload)
+
+    def uma_vez(self, espera=1):
+        """Processa no máximo um job. Retorna False se a fila estava vazia."""
+        self.promover_agendados()
+        if time.monotonic() - self.recuperado_em >= RECUPERAR_A_CADA:
+            self.recuperar()
+        # o job só sai da lista de processamento depois de rodar: se o worker
+        # morrer no meio, outro devolve à fila (recuperar)
+        payload = self.redis.blmove(FILA, self.processando, espera, "RIGHT", "LEFT")
+        if payload is None:
+            self.publicar()
+            return False
+        self.rodar(json.loads(payload))
+        self.redis.lrem(self.processando, 1, payload)
+        self.publicar()
+        return True
+
+    def rodar(self, job):
+        m = self._metricas(job["tarefa"])
+        m["espera_ms"].add((time.time() - job["disponivel_em"]) * 1000)
+
+        close_old_connections()
+        inicio = time.perf_counter()
+        try:
+            _tarefa(job["tarefa"])(*job["args"], **job["kwargs"])
+        except Exception:
+            logger.exception("fila: %s (tentativa %s) falhou", job["tarefa"], job["tentativa"] + 1)
+            self._falhou(job, m)
+        else:
+            m["ok"] += 1
+        finally:
+            m["execucao_ms"].add((time.perf_counter() - inicio) * 1000)
+            close_old_connections()
+
+    def _falhou(self, job, m):
+        job["tentativa"] += 1
+        try:
+            t = _tarefa(job["tarefa"])
+        except KeyError:
+            t = None
+        if t is not None and job["tentativa"] < t.tentativas:
+            job["disponivel_em"] = time.time() + backoff(job["tentativa"])
+            self.redis.zadd(AGENDADOS, {json.dumps(job): job["disponivel_em"]})
+            m["retentativas"] += 1
+            return
+
+        self.redis.lpush(MORTOS, json.dumps(job))
+        self.redis.ltrim(MORTOS, 0, MAX_MORTOS - 1)
+        m["mortos"] += 1
+        _desistir(t, job)
+
+    def _metricas(self, nome):
+        m = self.metricas.get(nome)
+        if m is None:
+            m = self.metricas[nome] = {
+                "espera_ms": Histograma(BALDES_MS),
+                "execucao_ms": Histograma(BALDES_MS),
+                "ok": 0, "retentativas": 0, "mortos": 0,
+            }
+        return m
+
+    def publicar(self, forcar=False):
+        if not forcar and time.monotonic() - self.publicado_em < PUBLICAR_A_CADA:
+            return
+        self.publicado_em = time.monotonic()
+        self.renovar()
+        resumo = {
+            nome: {
+                "espera_ms": m["espera_ms"].resumo(),
+                "execucao_ms": m["execucao_ms"].resumo(),
+                "ok": m["ok"], "retentativas": m["retentativas"], "mortos": m["mortos"],
+            }
+            for nome, m in self.metricas.items()
+        }
+        self.redis.hset(METRICAS, self.nome, json.dumps({
+            "em": time.time(), "tarefas": resumo, "http": resiliente.estatisticas(),
+        }))
+
+
+def estatisticas():
+    """Tamanho das filas e métricas publicadas pelos workers (None sem Redis)."""
+    try:
+        r = get_redis()
+        return {
+            "fila": r.llen(FILA),
+            "agendados": r.zcard(AGENDADOS),
+            "mortos": r.llen(MORTOS),
+            "workers_vivos": r.zcount(WORKERS, time.time(), "+inf"),
+            "workers": {
+                k.decode(): json.loads(v) for k, v in sorted(r.hgetall(METRICAS).items())
+            },
+        }
+    except RedisError:
+        return None
@@ -0,0 +1,253 @@
+# rotas/services/geo.py
+"""
+Índice espacial das lojas ativas (grade fixa em memória).
+
+Cada processo mantém o índice montado e confere no Redis uma "versão" que é
+incrementada sempre que uma Loja é salva/excluída (ver rotas/models.py) —
+inclusive pelo worker, quando termina de geocodificar uma loja. Versão
+diferente -> o índice é remontado na próxima consulta. A mesma versão entra
+nas chaves de cache/ETag das páginas que mostram lojas (painel/views.py).
+
+Sem Redis não há como saber a versão: o índice é montado a cada consulta e
+versao() devolve None (quem a usa em chave de cache não guarda nada).
+"""
+import logging
+import math
+import threading
+
+import numpy as np
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from rotas.models import Loja
+from rotas.services.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+VERSAO_KEY = "geo:lojas:versao"
+CELULA_GRAUS = 0.02          # ~2,2 km de lado na latitude de SP
+RAIO_TERRA_KM = 6371.0
+
+_lock = threading.Lock()
+_indice = None
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distância em km; aceita escalares ou arrays NumPy."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(a))
+
+
+def _celula(lat, lng):
+    return int(math.floor(lat / CELULA_GRAUS)), int(math.floor(lng / CELULA_GRAUS))
+
+
+class IndiceLojas:
+    def __init__(self, lojas, versao=None):
+        # lojas: lista de dicts com id, nome, latitude, longitude
+        self.versao = versao
+        self.ids = np.array([l["id"] for l in lojas], dtype=np.int64)
+        self.nomes = [l["nome"] for l in lojas]
+        self.lat = np.array([l["latitude"] for l in lojas], dtype=np.float64)
+        self.lng = np.array([l["longitude"] for l in lojas], dtype=np.float64)
+
+        celulas = {}
+        for i, (la, ln) in enumerate(zip(self.lat, self.lng)):
+            celulas.setdefault(_celula(la, ln), []).append(i)
+        self.celulas = {k: np.array(v, dtype=np.int64) for k, v in celulas.items()}
+
+        ys = [c[0] for c in celulas] or [0]
+        xs = [c[1] for c in celulas] or [0]
+        self.limites = (min(ys), max(ys), min(xs), max(xs))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _anel(self, centro, r):
+        cy, cx = centro
+        if r == 0:
+            yield centro
+            return
+        for dy in range(-r, r + 1):
+            for dx in (-r, r) if abs(dy) != r else range(-r, r + 1):
+                yield cy + dy, cx + dx
+
+    def proximas(self, lat, lng, k=10, raio_km=None, excluir=()):
+        """
+        As k lojas mais próximas do ponto. Visita anéis de células em volta da
+        célula do ponto; qualquer loja do anel r+1 está a pelo menos r lados de
+        célula de distância, então dá para parar assim que o k-ésimo candidato
+        estiver mais perto que isso. Retorna [(loja_id, distancia_km)].
+        """
+        if not len(self):
+            return []
+
+        excluir = np.array(list(excluir), dtype=np.int64)
+        cy, cx = _celula(lat, lng)
+        # menor lado da célula em km (a longitude encolhe com a latitude)
+        lado_km = CELULA_GRAUS * 111.32 * max(math.cos(math.radians(min(abs(lat) + 1, 89))), 0.01)
+
+        max_anel = max(
+            abs(cy - self.limites[0]), abs(cy - self.limites[1]),
+            abs(cx - self.limites[2]), abs(cx - self.limites[3]),
+        )
+        if raio_km is not None:
+            max_anel = min(max_anel, int(math.ceil(raio_km / lado_km)) + 1)
+
+        partes = []
+        todos = np.array([], dtype=np.int64)
+        for r in range(max_anel + 1):
+            novos = [self.celulas[c] for c in self._anel((cy, cx), r) if c in self.celulas]
+            if novos:
+                partes.extend(novos)
+                todos = np.concatenate(partes)
+                if len(excluir):
+                    todos = todos[~np.isin(self.ids[todos], excluir)]
+            if len(todos) >= k:
+                dist = haversine_km(lat, lng, self.lat[todos], self.lng[todos])
+                if np.partition(dist, k - 1)[k - 1] <= r * lado_km:
+                    break
+
+        if not len(todos):
+            return []
+
+        dist = haversine_km(lat, lng, self.lat[todos], self.lng[todos])
+        ordem = np.argsort(dist)[:k]
+        return [
+            (int(self.ids[i]), float(d))
+            for i, d in zip(todos[ordem], dist[ordem])
+            if raio_km is None or d <= raio_km
+        ]
+
+    def na_caixa(self, sul, oeste, norte, leste):
+        """Índices (posições internas) das lojas dentro do retângulo."""
+        y0, x0 = _celula(sul, oeste)
+        y1, x1 = _celula(norte, leste)
+
+        # caixa enorme (zoom muito afastado): varrer tudo é mais barato
+        if (y1 - y0 + 1) * (x1 - x0 + 1) > len(self.celulas):
+            idx = np.arange(len(self))
+        else:
+            partes = [
+                self.celulas[(y, x)]
+                for y in range(y0, y1 + 1)
+                for x in range(x0, x1 + 1)
+                if (y, x) in self.celulas
+            ]
+            if not partes:
+                return np.array([], dtype=np.int64)
+            idx = np.concatenate(partes)
+
+        dentro = (
+            (self.lat[idx] >= sul) & (self.lat[idx] <= norte)
+            & (self.lng[idx] >= oeste) & (self.lng[idx] <= leste)
+        )
+        return idx[dentro]
+
+    def agrupar(self, sul, oeste, norte, leste, zoom):
+        """
+        Marcadores para o mapa: lojas da caixa agrupadas numa grade que
+        acompanha o zoom (~60px por grupo). Grupo com 1 loja vira marcador simples.
+        """
+        idx = self.na_caixa(sul, oeste, norte, leste)
+        if not len(idx):
+            return []
+
+        passo = 360.0 / (2 ** max(0, min(int(zoom), 22))) / 4
+        gy = np.floor(self.lat[idx] / passo).astype(np.int64)
+        gx = np.floor(self.lng[idx] / passo).astype(np.int64)
+
+        chaves = np.stack([gy, gx], axis=1)
+        _, grupo, contagem = np.unique(chaves, axis=0, return_inverse=True, return_counts=True)
+        grupo = grupo.ravel()
+
+        soma_lat = np.bincount(grupo, weights=self.lat[idx])
+        soma_lng = np.bincount(grupo, weights=self.lng[idx])
+
+        saida = []
+        for g, n in enumerate(contagem):
+            if n == 1:
+                i = idx[grupo == g][0]
+                saida.append({
+                    "id": int(self.ids[i]),
+                    "nome": self.nomes[i],
+                    "lat": float(self.lat[i]),
+                    "lng": float(self.lng[i]),
+                    "qtd": 1,
+                })
+            else:
+                saida.append({
+                    "lat": float(soma_lat[g] / n),
+                    "lng": float(soma_lng[g] / n),
+                    "qtd": int(n),
+                })
+        return saida
+
+
+def _montar(versao):
+    lojas = list(
+        Loja.objects
+        .filter(ativa=True, latitude__isnull=False, longitude__isnull=False)
+        .values("id", "nome", "latitude", "longitude")
+    )
+    return IndiceLojas(lojas, versao=versao)
+
+
+def versao():
+    """Versão atual do conjunto de lojas, a mesma em todos os processos; None sem Redis."""
+    try:
+        return int(get_redis().get(VERSAO_KEY) or 0)
+    except RedisError:
+        logger.warning("geo: Redis indisponível, índice de lojas sem cache")
+        return None
+
+
+def get_indice():
+    global _indice
+    atual_versao = versao()
+    if atual_versao is None:
+        return _montar(None)
+
+    atual = _indice
+    if atual is not None and atual.versao == atual_versao:
+        return atual
+
+    with _lock:
+        if _indice is None or _indice.versao != atual_versao:
+            _indice = _montar(atual_versao)
+        return _indice
+
+
+def _incrementar():
+    try:
+        get_redis().incr(VERSAO_KEY)
+    except RedisError:
+        logger.warning("geo: Redis indisponível ao invalidar o índice de lojas")
+
+
+def invalidar():
+    """
+    Chamado quando uma Loja muda: força todos os processos a remontar o índice.
+    Incrementa na hora e de novo no commit (quem remontou durante a transação
+    leu o dado antigo), como referencia.invalidar.
+    """
+    _incrementar()
+    transaction.on_commit(_incrementar)
+
+
+def proximas_da_rota(pontos, k=10, excluir=()):
+    """
+    Lojas mais próximas de qualquer um dos pontos (lat, lng) — usado para sugerir
+    paradas perto das que já estão na rota. Retorna [(loja_id, distancia_km)].
+    """
+    indice = get_indice()
+    melhor = {}
+    for lat, lng in pontos:
+        for loja_id, d in indice.proximas(lat, lng, k=k, excluir=excluir):
+            if d < melhor.get(loja_id, float("inf")):
+                melhor[loja_id] = d
+    return sorted(melhor.items(), key=lambda x: x[1])[:k]
@@ -1,9 +1,13 @@
 # rotas/services/geocode.py
 import re
-import requests
+
+from rotas.services import resiliente
 
 NOMINATIM_SEARCH = "https://nominatim.openstreetmap.org/search"
 
+# grupo do Channels que recebe o resultado da geocodificação em segundo plano
+GRUPO = "lojas_geocodificacao"
+
 HEADERS = {
     "User-Agent": "rotas_cd/1.0 (contato: cadastro01@lojasmarkem.com.br)",
     "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
@@ -59,7 +63,7 @@ def geocode_nominatim(query: str, *, expected_number: str = "", debug: bool = Fa
         "countrycodes": "br",
     }
 
-    r = requests.get(NOMINATIM_SEARCH, params=params, headers=HEADERS, timeout=25)
+    r = resiliente.get(NOMINATIM_SEARCH, params=params, headers=HEADERS)
 
     if debug:
         print("STATUS:", r.status_code)
@@ -135,11 +139,14 @@ def geocode_loja_com_fallback(loja, debug: bool = False):
     1) loja.endereco (como está no banco)
     2) loja.endereco limpo (sem complementos)
     3) query curta e forte: logradouro + numero + cidade/uf + cep
+
+    None = o Nominatim respondeu e não achou. Fora do ar/limitando, levanta
+    resiliente.Indisponivel na primeira query (não adianta tentar as outras).
     """
     tentativas = []
 
-        # 0) tentativa estruturada (mais assertiva)
-    if loja.logradouro or loja.endereco:
+    # 0) tentativa estruturada (mais assertiva) — só se houver logradouro separado
+    if getattr(loja, "logradouro", ""):
         street = f"{(loja.logradouro or '').strip()} {(loja.numero or '').strip()}".strip()
         city = (loja.cidade or "").strip()
         state = (loja.uf or "").strip()
@@ -199,7 +206,7 @@ def geocode_nominatim_structured(*, street="", city="", state="", postalcode="",
         "countrycodes": "br",
     }
 
-    r = requests.get(NOMINATIM_SEARCH, params=params, headers=HEADERS, timeout=25)
+    r = resiliente.get(NOMINATIM_SEARCH, params=params, headers=HEADERS)
 
     if debug:
         print("STATUS:", r.status_code)
@@ -0,0 +1,137 @@
+# rotas/services/lead_time.py
+"""
+Tempos de ciclo das transferências, a partir do HistoricoStatusTransferencia.
+
+Para cada transferência pegamos o primeiro instante em que entrou em cada
+etapa (pendente, em_transito, confirmada) e medimos:
+
+- coleta:  pendente -> em_transito
+- entrega: em_transito -> confirmada
+- total:   pendente -> confirmada
+
+Percentis por loja de destino e por motorista, calculados com NumPy sobre o
+log inteiro da janela. O resultado fica no cache até o fim do dia.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from rotas.models import HistoricoStatusTransferencia
+
+CACHE_KEY = "lead_time:{dia}:{dias}"
+JANELA_DIAS = 90
+PERCENTIS = (50, 90, 95)
+ETAPAS = ("pendente", "em_transito", "confirmada")
+MEDIDAS = {"coleta": (0, 1), "entrega": (1, 2), "total": (0, 2)}
+
+
+def _percentis_por_grupo(grupos, valores, percentis=PERCENTIS):
+    """
+    Percentis (nearest-rank) de `valores` para cada grupo, vetorizado.
+    Retorna (grupos_unicos, matriz [grupo x percentil], contagens).
+    """
+    ordem = np.lexsort((valores, grupos))
+    g = grupos[ordem]
+    v = valores[ordem]
+
+    unicos, inicio, contagem = np.unique(g, return_index=True, return_counts=True)
+    p = np.asarray(percentis, dtype=np.float64) / 100.0
+    posicao = np.ceil(np.outer(contagem, p)).astype(np.int64) - 1
+    posicao = np.clip(posicao, 0, (contagem - 1)[:, None])
+    return unicos, v[inicio[:, None] + posicao], contagem
+
+
+def _tempos_por_transferencia(linhas):
+    """
+    linhas: [(transferencia_id, para, epoch, loja_destino_id, motorista_id)]
+    Retorna (lojas, motoristas, tempos[n x 3]) — NaN onde a etapa não ocorreu.
+    """
+    n = len(linhas)
+    etapa_idx = {e: i for i, e in enumerate(ETAPAS)}
+
+    tid = np.fromiter((l[0] for l in linhas), dtype=np.int64, count=n)
+    etapa = np.fromiter((etapa_idx.get(l[1], -1) for l in linhas), dtype=np.int64, count=n)
+    epoch = np.fromiter((l[2] for l in linhas), dtype=np.float64, count=n)
+    loja = np.fromiter((l[3] or 0 for l in linhas), dtype=np.int64, count=n)
+    motorista = np.fromiter((l[4] or 0 for l in linhas), dtype=np.int64, count=n)
+
+    ok = etapa >= 0
+    tid, etapa, epoch, loja, motorista = tid[ok], etapa[ok], epoch[ok], loja[ok], motorista[ok]
+
+    unicos, primeira, pos = np.unique(tid, return_index=True, return_inverse=True)
+    tempos = np.full((len(unicos), len(ETAPAS)), np.nan)
+    # primeiro instante de cada etapa: fmin ignora o NaN inicial
+    np.fmin.at(tempos, (pos.ravel(), etapa), epoch)
+    return loja[primeira], motorista[primeira], tempos
+
+
+def _resumo(grupos, tempos):
+    saida = {}
+    for medida, (a, b) in MEDIDAS.items():
+        dur = tempos[:, b] - tempos[:, a]
+        ok = ~np.isnan(dur) & (dur >= 0)
+        if not ok.any():
+            continue
+        unicos, valores, contagem = _percentis_por_grupo(grupos[ok], dur[ok])
+        for g, linha, c in zip(unicos.tolist(), valores.tolist(), contagem.tolist()):
+            item = {"n": c}
+            item.update({f"p{p}": v for p, v in zip(PERCENTIS, linha)})
+            saida.setdefault(g, {})[medida] = item
+    return saida
+
+
+def calcular(desde=None, ate=None):
+    """
+    Percentis (em segundos) por loja de destino, por motorista e geral, para
+    as transferências criadas na janela.
+    """
+    ate = ate or timezone.now()
+    desde = desde or ate - timedelta(days=JANELA_DIAS)
+
+    linhas = [
+        (tid, para, em.timestamp(), loja, motorista)
+        for tid, para, em, loja, motorista in (
+            HistoricoStatusTransferencia.objects
+            .filter(transferencia__criado_em__gte=desde, transferencia__criado_em__lt=ate)
+            .values_list(
+                "transferencia_id", "para", "em",
+                "transferencia__loja_destino_id", "transferencia__motorista_id",
+            )
+            .iterator(chunk_size=5000)
+        )
+    ]
+
+    vazio = {"lojas": {}, "motoristas": {}, "geral": {}, "transferencias": 0}
+    if not linhas:
+        return vazio
+
+    lojas, motoristas, tempos = _tempos_por_transferencia(linhas)
+    geral = _resumo(np.zeros(len(tempos), dtype=np.int64), tempos)
+
+    lojas_r = _resumo(lojas, tempos)
+    lojas_r.pop(0, None)            # sem loja de destino
+    motoristas_r = _resumo(motoristas, tempos)
+    motoristas_r.pop(0, None)       # sem motorista
+
+    return {
+        "lojas": lojas_r,
+        "motoristas": motoristas_r,
+        "geral": geral.get(0, {}),
+        "transferencias": int(len(tempos)),
+    }
+
+
+def get_lead_times(dias=JANELA_DIAS):
+    """Mesmo que calcular(), mas calculado uma vez por dia (cache até a meia-noite)."""
+    agora = timezone.localtime()
+    chave = CACHE_KEY.format(dia=agora.date().isoformat(), dias=dias)
+
+    resultado = cache.get(chave)
+    if resultado is None:
+        inicio_dia = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+        resultado = calcular(desde=inicio_dia - timedelta(days=dias), ate=inicio_dia)
+        fim_dia = inicio_dia + timedelta(days=1)
+        cache.set(chave, resultado, max(60, int((fim_dia - agora).total_seconds())))
+    return resultado
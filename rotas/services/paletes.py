@@ -0,0 +1,126 @@
+# rotas/services/paletes.py
+"""
+Contadores do monitor de paletes: transferências pendentes saindo de um CD,
+por loja de destino.
+
+Ficam num hash do Redis (loja_destino_id -> total) atualizado a cada mudança
+de status — pelos signals de Transferencia (save/delete) e pelas transições
+em lote de rotas/services/transicoes.py. O hash tem validade: quando expira
+(ou é invalidado porque uma Loja mudou) a próxima leitura reconta no banco,
+o que também corrige qualquer desvio. Sem Redis, o monitor conta no banco.
+
+Cada mudança aplicada é enviada ao grupo "monitor_paletes" do Channels (pela
+fila de tarefas).
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count
+from redis.exceptions import RedisError
+
+from rotas.models import Transferencia
+from rotas.services import referencia
+from rotas.services.redis_conn import get_redis
+from rotas.tarefas import avisar_grupo
+
+logger = logging.getLogger(__name__)
+
+HASH_KEY = "paletes:pendentes"
+PRONTO_KEY = "paletes:pendentes:pronto"
+PRONTO_TTL = 60 * 60          # reconta do zero a cada 1h
+GRUPO = "monitor_paletes"
+
+
+def ids_cd():
+    # cache de lojas versionado no Redis: a mudança de is_cd vale para todos os processos
+    return referencia.ids_cd()
+
+
+def invalidar():
+    """Loja mudou (ou não dá para saber o delta): força recontagem na próxima leitura."""
+    try:
+        get_redis().delete(PRONTO_KEY)
+    except RedisError:
+        logger.warning("paletes: Redis indisponível ao invalidar contadores")
+
+
+def delta_transicao(antes, depois):
+    """
+    antes/depois: (status, loja_origem_id, loja_destino_id) da transferência.
+    Retorna {loja_destino_id: +1/-1} para o que mudou no monitor.
+    """
+    cds = ids_cd()
+    delta = {}
+    for (status, origem, destino), sinal in ((antes, -1), (depois, +1)):
+        if status == "pendente" and origem in cds and destino is not None:
+            delta[destino] = delta.get(destino, 0) + sinal
+    return {k: v for k, v in delta.items() if v}
+
+
+def pendentes_por_destino(qs=None):
+    """Contagem no banco — usada na recontagem e para calcular o delta das transições em lote."""
+    if qs is None:
+        qs = Transferencia.objects.all()
+    return dict(
+        qs.filter(status="pendente", loja_origem_id__in=ids_cd(), loja_destino__isnull=False)
+        .values("loja_destino_id")
+        .annotate(c=Count("id"))
+        .values_list("loja_destino_id", "c")
+    )
+
+
+def recontar():
+    # sempre no primário: monitor_paletes lê da réplica, e uma contagem atrasada
+    # ficaria no hash até PRONTO_TTL
+    mapa = pendentes_por_destino(Transferencia.objects.using("default"))
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.delete(HASH_KEY)
+    if mapa:
+        pipe.hset(HASH_KEY, mapping=mapa)
+    pipe.set(PRONTO_KEY, 1, ex=PRONTO_TTL)
+    pipe.execute()
+    return mapa
+
+
+def contagens():
+    """{loja_destino_id: pendentes} — do Redis, recontando se preciso."""
+    try:
+        r = get_redis()
+        if not r.exists(PRONTO_KEY):
+            return recontar()
+        return {int(k): int(v) for k, v in r.hgetall(HASH_KEY).items()}
+    except RedisError:
+        logger.warning("paletes: Redis indisponível, contando no banco")
+        return pendentes_por_destino()
+
+
+def aplicar(delta):
+    """Soma o delta no hash depois do commit e avisa o monitor."""
+    if delta:
+        transaction.on_commit(lambda: _incrementar(delta))
+
+
+def _incrementar(delta):
+    try:
+        r = get_redis()
+        pipe = r.pipeline(transaction=True)
+        pipe.exists(PRONTO_KEY)
+        for loja_id, n in delta.items():
+            pipe.hincrby(HASH_KEY, loja_id, n)
+        pronto, *novos = pipe.execute()
+    except RedisError:
+        logger.warning("paletes: Redis indisponível, delta %s descartado", delta)
+        return
+
+    if not pronto:
+        # hash ainda não foi montado: a recontagem da próxima leitura já inclui o delta
+        return
+
+    _avisar(dict(zip(delta.keys(), (max(0, int(v)) for v in novos))))
+
+
+def _avisar(mapa):
+    # envio pelo channel layer fica com o worker (rotas/tarefas.py)
+    avisar_grupo.enfileirar(
+        GRUPO, {"type": "paletes_contagem", "contagens": {str(k): v for k, v in mapa.items()}},
+    )
@@ -0,0 +1,161 @@
+# rotas/services/particoes.py
+"""
+Partições mensais de Transferencia (PostgreSQL, ver migração 0028).
+
+Uma partição por mês de criado_em (rotas_transferencia_pAAAA_MM) mais a
+padrão, que recebe o que cair fora delas. O Postgres só lê as partições do
+intervalo consultado — desde que o filtro compare criado_em direto:
+`criado_em__date__range` vira criado_em::date e lê todas. Nas views use
+`entre_dias`/`nos_dias`.
+
+- `criar_particoes`: garante o mês corrente e os próximos (cron diário/semanal,
+  manage.py criar_particoes_transferencia). Linhas que já tinham caído na
+  padrão são movidas para a partição nova.
+- `arquivar`: desanexa meses antigos em que tudo já foi confirmado e move a
+  tabela para o schema "arquivo" (manage.py arquivar_transferencias). Os
+  dados continuam no banco, só saem da tabela consultada pelo sistema.
+"""
+import datetime
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+TABELA = "rotas_transferencia"
+PADRAO = f"{TABELA}_padrao"
+ESQUEMA_ARQUIVO = "arquivo"
+MESES_A_FRENTE = 3
+MANTER_MESES = 12
+
+
+# =========================
+# FILTROS QUE PODAM PARTIÇÕES
+# =========================
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min))
+
+
+def entre_dias(inicio, fim, campo="criado_em"):
+    """
+    Q de `campo` nos dias [inicio, fim] (fuso corrente), como `__date__range`.
+    None em uma das pontas = sem limite daquele lado.
+    """
+    filtro = {}
+    if inicio is not None:
+        filtro[f"{campo}__gte"] = _inicio_do_dia(inicio)
+    if fim is not None:
+        filtro[f"{campo}__lt"] = _inicio_do_dia(fim + datetime.timedelta(days=1))
+    return Q(**filtro)
+
+
+def nos_dias(dias, campo="criado_em"):
+    """Q de `campo` em qualquer um dos dias, como `__date__in`."""
+    dias = list(dias)
+    if not dias:
+        return Q(pk__in=[])
+    return reduce(or_, (entre_dias(d, d, campo) for d in dias))
+
+
+# =========================
+# MANUTENÇÃO
+# =========================
+def _mes(d):
+    return d.replace(day=1)
+
+
+def _mes_seguinte(d):
+    return (d.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def nome_particao(mes):
+    return f"{TABELA}_p{mes:%Y_%m}"
+
+
+def _limites(mes):
+    return f"{mes:%Y-%m-%d} 00:00:00+00", f"{_mes_seguinte(mes):%Y-%m-%d} 00:00:00+00"
+
+
+def particionada():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABELA])
+        linha = cursor.fetchone()
+    return bool(linha) and linha[0] == "p"
+
+
+def particoes():
+    """Nomes das partições mensais anexadas, em ordem."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass AND c.relname <> %s ORDER BY c.relname
+            """,
+            [TABELA, PADRAO],
+        )
+        return [r[0] for r in cursor.fetchall()]
+
+
+def criar_particoes(meses_a_frente=MESES_A_FRENTE, hoje=None):
+    """Cria as partições que faltam do mês corrente até `meses_a_frente`. Devolve os nomes criados."""
+    hoje = hoje or timezone.now().date()
+    existentes = set(particoes())
+    criadas = []
+
+    mes = _mes(hoje)
+    for _ in range(meses_a_frente + 1):
+        nome = nome_particao(mes)
+        if nome not in existentes:
+            _criar(nome, *_limites(mes))
+            criadas.append(nome)
+        mes = _mes_seguinte(mes)
+    return criadas
+
+
+def _criar(nome, de, ate):
+    # com linhas do intervalo na padrão o Postgres recusa a partição nova:
+    # tira as linhas, cria, devolve (o roteamento põe na partição certa)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE _mover (LIKE {TABELA})")
+        cursor.execute(
+            f"WITH m AS (DELETE FROM {PADRAO} WHERE criado_em >= %s AND criado_em < %s RETURNING *) "
+            f"INSERT INTO _mover SELECT * FROM m",
+            [de, ate],
+        )
+        cursor.execute(f"CREATE TABLE {nome} PARTITION OF {TABELA} FOR VALUES FROM (%s) TO (%s)", [de, ate])
+        cursor.execute(f"INSERT INTO {TABELA} SELECT * FROM _mover")
+        cursor.execute("DROP TABLE _mover")
+
+
+def arquivar(manter_meses=MANTER_MESES, hoje=None, executar=False):
+    """
+    Partições anteriores aos últimos `manter_meses` -> [(nome, situação)].
+    Só desanexa (executar=True) as que não têm nada fora de "confirmada".
+    """
+    limite = _mes(hoje or timezone.now().date())
+    for _ in range(manter_meses):
+        limite = _mes(limite - datetime.timedelta(days=1))
+    limite_nome = nome_particao(limite)
+
+    resultado = []
+    for nome in particoes():
+        if nome >= limite_nome:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FILTER (WHERE status <> 'confirmada'), count(*) FROM {nome}")
+            abertas, total = cursor.fetchone()
+        if abertas:
+            resultado.append((nome, f"mantida: {abertas} de {total} ainda não confirmadas"))
+            continue
+        if executar:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ESQUEMA_ARQUIVO}")
+                cursor.execute(f"ALTER TABLE {TABELA} DETACH PARTITION {nome}")
+                cursor.execute(f"ALTER TABLE {nome} SET SCHEMA {ESQUEMA_ARQUIVO}")
+            resultado.append((nome, f"arquivada em {ESQUEMA_ARQUIVO}.{nome} ({total} linhas)"))
+        else:
+            resultado.append((nome, f"seria arquivada ({total} linhas)"))
+    return resultado
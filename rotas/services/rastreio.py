@@ -0,0 +1,222 @@
+# rotas/services/rastreio.py
+"""
+Rastreio GPS dos motoboys.
+
+Os pontos chegam em alta frequência (HTTP ou WebSocket), ficam num buffer no
+Redis e são descarregados em lote como um único RastreioRota por trecho,
+com os pontos empacotados em binário (12 bytes por ponto). Trechos antigos
+são compactados com Douglas-Peucker pelo comando `rastreio_compactar`.
+"""
+import math
+import struct
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from rotas.models import RastreioRota
+from rotas.services.redis_conn import get_redis
+
+# (epoch em segundos sem sinal — vai até 2106, lat * 1e6, lng * 1e6).
+# Até 2038 os bytes são os mesmos do int32 com sinal: trechos já gravados
+# continuam legíveis.
+PONTO = struct.Struct("<Iii")
+ESCALA = 1_000_000
+
+BUFFER_KEY = "rastreio:buf:{rota_id}"
+DESCARREGAR_A_CADA = 60      # pontos no buffer antes de gravar no banco
+MAX_PONTOS_POR_ENVIO = 1000
+JANELA_PASSADO = timedelta(hours=24)
+JANELA_FUTURO = timedelta(seconds=60)
+
+
+def empacotar(pontos):
+    """pontos: iterável de (epoch, lat, lng) -> bytes"""
+    return b"".join(
+        PONTO.pack(int(t), round(lat * ESCALA), round(lng * ESCALA))
+        for t, lat, lng in pontos
+    )
+
+
+def desempacotar(blob):
+    blob = bytes(blob or b"")
+    return [
+        (t, lat / ESCALA, lng / ESCALA)
+        for t, lat, lng in PONTO.iter_unpack(blob)
+    ]
+
+
+def validar_pontos(brutos, agora=None):
+    """
+    Aceita [[epoch, lat, lng], ...] e devolve só os pontos válidos
+    (coordenadas dentro do globo e horário dentro da janela aceita).
+    """
+    agora = (agora or timezone.now()).timestamp()
+    minimo = agora - JANELA_PASSADO.total_seconds()
+    maximo = agora + JANELA_FUTURO.total_seconds()
+
+    validos = []
+    for item in brutos[:MAX_PONTOS_POR_ENVIO]:
+        try:
+            t, lat, lng = (float(v) for v in item[:3])
+        except (TypeError, ValueError):
+            continue
+        if not (minimo <= t <= maximo):
+            continue
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            continue
+        validos.append((int(t), lat, lng))
+    return validos
+
+
+def registrar_pontos(rota_id, pontos):
+    """Empilha os pontos no buffer da rota; descarrega no banco quando enche."""
+    if not pontos:
+        return 0
+
+    r = get_redis()
+    key = BUFFER_KEY.format(rota_id=rota_id)
+    tamanho = r.rpush(key, *(empacotar([p]) for p in pontos))
+
+    if tamanho >= DESCARREGAR_A_CADA:
+        descarregar(rota_id)
+    return len(pontos)
+
+
+def descarregar(rota_id):
+    """Move o buffer da rota (de forma atômica) para um novo RastreioRota."""
+    r = get_redis()
+    key = BUFFER_KEY.format(rota_id=rota_id)
+
+    pipe = r.pipeline(transaction=True)
+    pipe.lrange(key, 0, -1)
+    pipe.delete(key)
+    itens, _ = pipe.execute()
+
+    if not itens:
+        return None
+
+    pontos = sorted(desempacotar(b"".join(itens)))
+    return RastreioRota.objects.create(
+        rota_id=rota_id,
+        inicio=_dt(pontos[0][0]),
+        fim=_dt(pontos[-1][0]),
+        qtd_pontos=len(pontos),
+        pontos=empacotar(pontos),
+    )
+
+
+def rotas_com_buffer():
+    r = get_redis()
+    prefixo = BUFFER_KEY.format(rota_id="")
+    return [
+        int(k.decode()[len(prefixo):])
+        for k in r.scan_iter(match=prefixo + "*")
+    ]
+
+
+def pontos_da_rota(rota_id, incluir_buffer=True):
+    pontos = []
+    for blob in (
+        RastreioRota.objects
+        .filter(rota_id=rota_id)
+        .order_by("inicio")
+        .values_list("pontos", flat=True)
+    ):
+        pontos.extend(desempacotar(blob))
+
+    if incluir_buffer:
+        itens = get_redis().lrange(BUFFER_KEY.format(rota_id=rota_id), 0, -1)
+        pontos.extend(desempacotar(b"".join(itens)))
+
+    pontos.sort()
+    return pontos
+
+
+def _dt(epoch):
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+# =========================
+# DOUGLAS-PEUCKER
+# =========================
+def _xy(lat, lng, lat0):
+    # projeção equiretangular local (metros) — suficiente para trechos urbanos
+    r = 6_371_000
+    return (
+        math.radians(lng) * r * math.cos(math.radians(lat0)),
+        math.radians(lat) * r,
+    )
+
+
+def _distancia_segmento(p, a, b):
+    (px, py), (ax, ay), (bx, by) = p, a, b
+    dx, dy = bx - ax, by - ay
+    if dx == 0 and dy == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def douglas_peucker(pontos, tolerancia_m=15.0):
+    """
+    Simplifica a trilha mantendo os pontos que se afastam mais de
+    `tolerancia_m` metros da reta entre os vizinhos mantidos.
+    Iterativo (pilha) para não estourar recursão em trilhas longas.
+    """
+    if len(pontos) < 3:
+        return list(pontos)
+
+    lat0 = pontos[0][1]
+    xy = [_xy(lat, lng, lat0) for _, lat, lng in pontos]
+
+    manter = [False] * len(pontos)
+    manter[0] = manter[-1] = True
+    pilha = [(0, len(pontos) - 1)]
+
+    while pilha:
+        ini, fim = pilha.pop()
+        maior, idx = 0.0, None
+        for i in range(ini + 1, fim):
+            d = _distancia_segmento(xy[i], xy[ini], xy[fim])
+            if d > maior:
+                maior, idx = d, i
+        if idx is not None and maior > tolerancia_m:
+            manter[idx] = True
+            pilha.append((ini, idx))
+            pilha.append((idx, fim))
+
+    return [p for p, m in zip(pontos, manter) if m]
+
+
+def compactar_rota(rota_id, antes_de, tolerancia_m=15.0):
+    """
+    Junta os trechos não simplificados que terminaram antes de `antes_de`
+    num único trecho simplificado. Retorna (pontos_antes, pontos_depois).
+    """
+    trechos = list(
+        RastreioRota.objects
+        .filter(rota_id=rota_id, simplificado=False, fim__lt=antes_de)
+        .order_by("inicio")
+    )
+    if not trechos:
+        return 0, 0
+
+    pontos = []
+    for t in trechos:
+        pontos.extend(desempacotar(t.pontos))
+    pontos.sort()
+
+    simplificados = douglas_peucker(pontos, tolerancia_m)
+    with transaction.atomic():
+        RastreioRota.objects.create(
+            rota_id=rota_id,
+            inicio=_dt(simplificados[0][0]),
+            fim=_dt(simplificados[-1][0]),
+            qtd_pontos=len(simplificados),
+            pontos=empacotar(simplificados),
+            simplificado=True,
+        )
+        RastreioRota.objects.filter(id__in=[t.id for t in trechos]).delete()
+    return len(pontos), len(simplificados)
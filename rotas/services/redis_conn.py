@@ -0,0 +1,11 @@
+# rotas/services/redis_conn.py
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+
+@lru_cache(maxsize=1)
+def get_redis():
+    """Conexão compartilhada com o Redis (o mesmo servidor usado pelo Channels)."""
+    return redis.Redis.from_url(settings.REDIS_URL)
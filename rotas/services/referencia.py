@@ -0,0 +1,146 @@
+# rotas/services/referencia.py
+"""
+Dados de referência (lojas e motoboys) em memória, por processo.
+
+Quase toda view precisa da lista de lojas ativas, de saber se o usuário é
+motoboy ou de qual loja ele é — coisas que mudam pouco. Cada processo guarda
+a última leitura junto com a versão do conjunto; a versão fica numa chave do
+Redis (referencia:<nome>:versao), incrementada pelos signals de Loja, User e
+grupos (ver rotas/models.py). Versão diferente da guardada -> relê do banco.
+
+A invalidação incrementa na hora (os outros processos largam a cópia) e de
+novo no commit (quem releu durante a transação pegou o dado antigo). Sem
+Redis não há como saber a versão: lê direto do banco.
+"""
+import copy
+import logging
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from rotas.models import Loja
+from rotas.services.redis_conn import get_redis
+
+logger = logging.getLogger(__name__)
+
+LOJAS = "lojas"
+MOTOBOYS = "motoboys"
+GRUPO_MOTOBOY = "Motoboy"
+
+_lock = threading.Lock()
+_dados = {}                                   # nome -> (versao, dados)
+_contadores = {}                              # nome -> {"hits": n, "misses": n}
+
+
+def _chave(nome):
+    return f"referencia:{nome}:versao"
+
+
+# As cargas vão sempre ao primário: uma leitura atrasada da réplica ficaria
+# guardada com a versão nova até a próxima invalidação.
+def _carregar_lojas():
+    lojas = list(Loja.objects.using("default").order_by("nome", "id"))
+    return {
+        "todas": lojas,
+        "ativas": [l for l in lojas if l.ativa],
+        "por_usuario": {l.usuario_id: l for l in lojas if l.usuario_id},
+        "ids_cd": frozenset(l.id for l in lojas if l.is_cd),
+    }
+
+
+def _carregar_motoboys():
+    usuarios = list(
+        get_user_model().objects.using("default")
+        .filter(groups__name=GRUPO_MOTOBOY)
+        .order_by("username")
+        .values("id", "username", "is_active")
+        .distinct()
+    )
+    return {
+        "ativos": [u for u in usuarios if u["is_active"]],
+        "ids": frozenset(u["id"] for u in usuarios),
+    }
+
+
+_CARREGAR = {LOJAS: _carregar_lojas, MOTOBOYS: _carregar_motoboys}
+
+
+def _contar(nome, campo):
+    with _lock:
+        c = _contadores.setdefault(nome, {"hits": 0, "misses": 0})
+        c[campo] += 1
+
+
+def _obter(nome):
+    try:
+        versao = get_redis().get(_chave(nome))
+    except RedisError:
+        logger.warning("referencia: Redis indisponível, lendo %s do banco", nome)
+        _contar(nome, "misses")
+        return _CARREGAR[nome]()
+
+    atual = _dados.get(nome)
+    if atual is not None and atual[0] == versao:
+        _contar(nome, "hits")
+        return atual[1]
+
+    _contar(nome, "misses")
+    dados = _CARREGAR[nome]()
+    with _lock:
+        _dados[nome] = (versao, dados)
+    return dados
+
+
+def _incrementar(nome):
+    try:
+        get_redis().incr(_chave(nome))
+    except RedisError:
+        logger.warning("referencia: Redis indisponível ao invalidar %s", nome)
+
+
+def invalidar(nome):
+    with _lock:
+        _dados.pop(nome, None)
+    _incrementar(nome)
+    transaction.on_commit(lambda: _incrementar(nome))
+
+
+# =========================
+# LEITURA
+# =========================
+def lojas_ativas():
+    """Lojas ativas por nome. Compartilhadas entre requests: não alterar."""
+    return _obter(LOJAS)["ativas"]
+
+
+def loja_do_usuario(user_id):
+    """Loja vinculada ao usuário (cópia — pode ser alterada/salva) ou None."""
+    loja = _obter(LOJAS)["por_usuario"].get(user_id)
+    return copy.copy(loja) if loja is not None else None
+
+
+def ids_cd():
+    """frozenset dos ids das lojas marcadas como CD (ativas ou não)."""
+    return _obter(LOJAS)["ids_cd"]
+
+
+def motoboys():
+    """[{id, username, is_active}] dos motoboys ativos, por username."""
+    return _obter(MOTOBOYS)["ativos"]
+
+
+def eh_motoboy(user_id):
+    return user_id in _obter(MOTOBOYS)["ids"]
+
+
+def estatisticas():
+    with _lock:
+        return {nome: dict(c) for nome, c in sorted(_contadores.items())}
+
+
+def limpar():
+    with _lock:
+        _dados.clear()
+        _contadores.clear()
@@ -0,0 +1,239 @@
+# rotas/services/resiliente.py
+"""
+Chamadas HTTP a serviços externos (hoje, o Nominatim) que não travam o worker
+quando o serviço cai ou passa a nos limitar.
+
+Estado por host, em memória (cada processo decide sozinho):
+
+- disjuntor: FALHAS_PARA_ABRIR falhas seguidas (5xx, timeout, erro de conexão)
+  abrem o circuito e as chamadas falham na hora com `Indisponivel`. Passada a
+  PAUSA_ABERTO, uma única chamada vai como sonda (meio aberto): deu certo,
+  fecha; falhou, reabre.
+- Retry-After: 429/503 põem o host em pausa pelo tempo pedido. Pausa curta
+  (até ESPERA_MAX) é aguardada dentro da chamada; longa vira `Indisponivel`
+  e o job da fila volta depois, com backoff.
+- orçamento de retentativas: cada chamada deposita RAZAO_RETENTATIVA de ficha e
+  cada retentativa gasta uma inteira. Com o serviço fora do ar, retentativa
+  não multiplica a carga.
+- timeout adaptativo: leitura = latência média (EWMA) x FATOR_TIMEOUT, entre
+  TIMEOUT_MIN e TIMEOUT_MAX (antes eram 25s fixos).
+
+Contadores por resultado em `estatisticas()` (ver gestao:metricas).
+"""
+import email.utils
+import logging
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+FALHAS_PARA_ABRIR = 5
+PAUSA_ABERTO = 60              # segundos de circuito aberto até a sonda
+CONNECT_TIMEOUT = 3
+TIMEOUT_MIN = 2
+TIMEOUT_MAX = 10
+FATOR_TIMEOUT = 4
+EWMA_PESO = 0.3
+TENTATIVAS = 3
+RETENTATIVA_BASE = 0.5         # segundos; dobra a cada retentativa
+ESPERA_MAX = 5                 # Retry-After até isso é aguardado na própria chamada
+RAZAO_RETENTATIVA = 0.2
+SALDO_INICIAL = 2
+SALDO_MAX = 10
+
+FECHADO, ABERTO, MEIO_ABERTO = "fechado", "aberto", "meio_aberto"
+
+_lock = threading.Lock()
+_hosts = {}
+
+
+class Indisponivel(Exception):
+    """O host não deve ser chamado agora. `espera`: segundos sugeridos (ou None)."""
+
+    def __init__(self, host, motivo, espera=None):
+        super().__init__(f"{host}: {motivo}")
+        self.host = host
+        self.motivo = motivo
+        self.espera = espera
+
+
+def retry_after(valor):
+    """Segundos pedidos num cabeçalho Retry-After (número ou data HTTP), ou None."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        quando = email.utils.parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, quando.timestamp() - time.time())
+
+
+def _classificar(r):
+    if r.status_code == 429:
+        return "limitado"
+    if r.status_code >= 500:
+        return "erro_servidor"
+    # 2xx/3xx/4xx: o serviço respondeu; quem chamou decide o que fazer
+    return "ok"
+
+
+class Host:
+    def __init__(self, nome):
+        self.nome = nome
+        self.lock = threading.Lock()
+        self.estado = FECHADO
+        self.falhas = 0
+        self.aberto_em = 0.0
+        self.sonda_em_voo = False
+        self.pausa_ate = 0.0
+        self.saldo = float(SALDO_INICIAL)
+        self.latencia = None
+        self.contadores = Counter()
+
+    def timeout(self):
+        if self.latencia is None:
+            leitura = TIMEOUT_MAX
+        else:
+            leitura = min(TIMEOUT_MAX, max(TIMEOUT_MIN, self.latencia * FATOR_TIMEOUT))
+        return (CONNECT_TIMEOUT, leitura)
+
+    def get(self, url, **kwargs):
+        """requests.get com disjuntor, Retry-After e retentativas. Levanta `Indisponivel`."""
+        with self.lock:
+            self.saldo = min(SALDO_MAX, self.saldo + RAZAO_RETENTATIVA)
+
+        tentativa = 0
+        while True:
+            self._liberar()
+            timeout = self.timeout()
+            inicio = time.monotonic()
+            r = None
+            try:
+                r = requests.get(url, timeout=timeout, **kwargs)
+            except requests.Timeout:
+                resultado = "timeout"
+            except requests.RequestException:
+                resultado = "erro_conexao"
+            except Exception:
+                with self.lock:
+                    self.sonda_em_voo = False
+                raise
+            else:
+                resultado = _classificar(r)
+
+            # timeout entra na média como o próprio limite: serviço lento alarga o próximo
+            latencia = timeout[1] if resultado == "timeout" else time.monotonic() - inicio
+            self._registrar(resultado, latencia, r)
+            if resultado == "ok":
+                return r
+
+            tentativa += 1
+            if tentativa >= TENTATIVAS:
+                raise Indisponivel(self.nome, resultado)
+            if not self._gastar_ficha():
+                raise Indisponivel(self.nome, f"{resultado}, sem orçamento de retentativa")
+            time.sleep(RETENTATIVA_BASE * 2 ** (tentativa - 1))
+
+    def _liberar(self):
+        """Espera uma pausa curta ou levanta `Indisponivel`; reserva a sonda se meio aberto."""
+        with self.lock:
+            pausa = self.pausa_ate - time.monotonic()
+            if pausa > ESPERA_MAX:
+                self.contadores["em_pausa"] += 1
+                raise Indisponivel(self.nome, "Retry-After", pausa)
+        if pausa > 0:
+            time.sleep(pausa)
+
+        with self.lock:
+            if self.estado == ABERTO:
+                resta = PAUSA_ABERTO - (time.monotonic() - self.aberto_em)
+                if resta > 0:
+                    self.contadores["circuito_aberto"] += 1
+                    raise Indisponivel(self.nome, "circuito aberto", resta)
+                self.estado = MEIO_ABERTO
+                self.sonda_em_voo = False
+            if self.estado == MEIO_ABERTO:
+                if self.sonda_em_voo:
+                    self.contadores["circuito_aberto"] += 1
+                    raise Indisponivel(self.nome, "circuito meio aberto (sonda em andamento)")
+                self.sonda_em_voo = True
+                self.contadores["sondas"] += 1
+
+    def _registrar(self, resultado, latencia, r):
+        with self.lock:
+            self.contadores[resultado] += 1
+            self.sonda_em_voo = False
+            if self.latencia is None:
+                self.latencia = latencia
+            else:
+                self.latencia = EWMA_PESO * latencia + (1 - EWMA_PESO) * self.latencia
+
+            espera = retry_after(r.headers.get("Retry-After")) if r is not None else None
+            if espera is not None:
+                self.pausa_ate = max(self.pausa_ate, time.monotonic() + espera)
+
+            if resultado in ("ok", "limitado"):
+                # 429 é o serviço de pé pedindo calma: a pausa resolve, não conta como falha
+                if self.estado != FECHADO:
+                    logger.info("resiliente: %s respondeu, circuito fechado", self.nome)
+                self.estado = FECHADO
+                self.falhas = 0
+                return
+
+            self.falhas += 1
+            if self.estado == MEIO_ABERTO or self.falhas >= FALHAS_PARA_ABRIR:
+                if self.estado != ABERTO:
+                    logger.warning("resiliente: %s com %s falha(s) (%s), circuito aberto",
+                                   self.nome, self.falhas, resultado)
+                self.estado = ABERTO
+                self.aberto_em = time.monotonic()
+
+    def _gastar_ficha(self):
+        with self.lock:
+            if self.saldo < 1:
+                self.contadores["sem_orcamento"] += 1
+                return False
+            self.saldo -= 1
+            self.contadores["retentativas"] += 1
+            return True
+
+    def resumo(self):
+        with self.lock:
+            return {
+                "estado": self.estado,
+                "falhas_seguidas": self.falhas,
+                "saldo_retentativas": round(self.saldo, 2),
+                "timeout_leitura": round(self.timeout()[1], 3),
+                "contadores": dict(sorted(self.contadores.items())),
+            }
+
+
+def host(nome):
+    with _lock:
+        h = _hosts.get(nome)
+        if h is None:
+            h = _hosts[nome] = Host(nome)
+        return h
+
+
+def get(url, **kwargs):
+    return host(urlsplit(url).netloc).get(url, **kwargs)
+
+
+def estatisticas():
+    with _lock:
+        hosts = dict(_hosts)
+    return {nome: h.resumo() for nome, h in sorted(hosts.items())}
+
+
+def limpar():
+    with _lock:
+        _hosts.clear()
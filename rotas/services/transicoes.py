@@ -0,0 +1,83 @@
+# rotas/services/transicoes.py
+"""
+Transições de status de Parada/Transferencia usadas pelas telas do painel
+e pelo sync offline do motoboy. Cada função faz UPDATE filtrado pelo status
+de origem, então o retorno (linhas afetadas) já diz se a transição valeu.
+As de Transferencia também gravam o HistoricoStatusTransferencia.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from rotas.models import HistoricoStatusTransferencia, Parada, Transferencia, tocar_rotas
+from rotas.services import paletes
+
+
+def coletar_parada(parada, usuario, quando=None):
+    """
+    Marca a parada como coletada e leva para "em_transito" as transferências
+    pendentes da rota cuja origem é a loja da parada.
+    Retorna quantas transferências mudaram de status.
+    """
+    quando = quando or timezone.now()
+
+    Parada.objects.filter(id=parada.id).update(status="coletado", collected_at=quando)
+    tocar_rotas(parada.rota_id)
+    parada.status = "coletado"
+    parada.collected_at = quando
+
+    return coletar_transferencias(
+        Transferencia.objects.filter(rota_id=parada.rota_id, loja_origem_id=parada.loja_id),
+        usuario,
+        quando,
+    )
+
+
+def coletar_transferencias(qs, usuario, quando=None):
+    """pendente -> em_transito"""
+    return _transicionar(qs, "pendente", "em_transito", usuario, quando, motorista=usuario)
+
+
+def entregar_transferencias(qs, usuario, quando=None):
+    """em_transito -> confirmada"""
+    return _transicionar(qs, "em_transito", "confirmada", usuario, quando)
+
+
+def _transicionar(qs, de, para, usuario, quando=None, **campos):
+    """
+    UPDATE único das transferências em `de`, mais uma linha de histórico por
+    transferência (um INSERT em lote) e o delta dos contadores de palete —
+    tudo na mesma transação.
+    """
+    quando = quando or timezone.now()
+    with transaction.atomic():
+        # trava as linhas para histórico e contadores baterem com o UPDATE
+        alvo = list(
+            qs.filter(status=de)
+            .select_for_update()
+            .values_list("id", "loja_origem_id", "loja_destino_id", "rota_id")
+        )
+        if not alvo:
+            return 0
+
+        total = Transferencia.objects.filter(id__in=[a[0] for a in alvo]).update(
+            status=para,
+            confirmado_em=quando,
+            confirmado_por=usuario,
+            atualizado_em=timezone.now(),
+            **campos,
+        )
+
+        HistoricoStatusTransferencia.objects.bulk_create([
+            HistoricoStatusTransferencia(
+                transferencia_id=tid, de=de, para=para, em=quando, por=usuario,
+            )
+            for tid, _, _, _ in alvo
+        ])
+
+        delta = {}
+        for _, origem, destino, _ in alvo:
+            for loja_id, n in paletes.delta_transicao((de, origem, destino), (para, origem, destino)).items():
+                delta[loja_id] = delta.get(loja_id, 0) + n
+        paletes.aplicar(delta)
+        tocar_rotas(*{a[3] for a in alvo})
+    return total
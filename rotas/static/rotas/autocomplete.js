@@ -0,0 +1,27 @@
+// Selects com busca no servidor (rotas/widgets.py): select2 + endpoint JSON paginado
+$(function () {
+  $('select.js-autocomplete').each(function () {
+    const $el = $(this)
+    $el.select2({
+      width: '100%',
+      placeholder: $el.data('placeholder'),
+      allowClear: !$el.prop('multiple'),
+      language: {
+        noResults: () => 'Nada encontrado',
+        searching: () => 'Buscando…',
+        loadingMore: () => 'Carregando mais…',
+        errorLoading: () => 'Não foi possível buscar',
+      },
+      ajax: {
+        url: $el.data('autocomplete-url'),
+        dataType: 'json',
+        delay: 250,
+        data: (params) => ({ term: params.term || '', page: params.page || 1 }),
+      },
+      templateResult: (item) => {
+        if (!item.id || !item.detalhe) return item.text
+        return $('<div>').text(item.text).append($('<div class="small muted">').text(item.detalhe))
+      },
+    })
+  })
+})
@@ -0,0 +1,23 @@
+# rotas/storage.py
+"""
+Storage dos estáticos.
+
+O collectstatic grava cada arquivo com o hash do conteúdo no nome
+(rota_detalhe.3f2a….js) e gera as versões .gz e .br ao lado; o WhiteNoise
+serve a versão comprimida que o navegador aceitar e manda os nomes com hash
+com cache de longa duração (immutable) — mudou o arquivo, muda a URL.
+
+Sem collectstatic (testes, máquina nova) o {% static %} devolve o nome sem
+hash em vez de quebrar a página.
+"""
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class EstaticosComprimidos(CompressedManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
@@ -0,0 +1,78 @@
+# rotas/tarefas.py
+"""Tarefas em segundo plano do app rotas (ver rotas/services/fila.py)."""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from rotas.models import Loja
+from rotas.services import fila, geo, geocode, referencia
+
+logger = logging.getLogger(__name__)
+
+
+@fila.tarefa(tentativas=3)
+def geocodificar_loja(loja_id):
+    """
+    Resolve a loja marcada como "pendente" (gestao.loja_nova/loja_editar) e
+    grava coordenadas + endereço normalizado num único UPDATE. O UPDATE só
+    vale se o endereço ainda for o geocodificado — editou de novo no meio do
+    caminho, o job seguinte é quem grava. O resultado vai para quem está com
+    a lista/o formulário de lojas aberto (grupo geocode.GRUPO).
+
+    Sem resultado apaga as coordenadas: eram do endereço anterior.
+
+    Nominatim indisponível (resiliente.Indisponivel) não é "sem resultado": a
+    exceção sobe, a loja continua pendente e a fila tenta de novo mais tarde.
+    Esgotadas as tentativas (no worker, ou no processo quando o Redis está
+    fora), fica "indisponivel" (ver _geocodificacao_desistiu).
+    """
+    loja = Loja.objects.filter(id=loja_id).first()
+    if loja is None:
+        return
+    res = geocode.geocode_loja_com_fallback(loja)
+
+    if res is None:
+        logger.info("geocodificação sem resultado para a loja %s", loja_id)
+        campos = {"geocodificacao": "sem_resultado", "latitude": None, "longitude": None}
+    else:
+        lat, lon, display_name, addr = res
+        campos = {
+            "geocodificacao": "ok",
+            "latitude": lat,
+            "longitude": lon,
+            "endereco_normalizado": (geocode.endereco_curto(addr) or display_name)[:255],
+        }
+
+    _gravar(Loja.objects.filter(id=loja.id, endereco=loja.endereco, cidade=loja.cidade), loja.id, campos)
+
+
+@geocodificar_loja.ao_desistir
+def _geocodificacao_desistiu(loja_id):
+    # Nominatim fora do ar em todas as tentativas: sai de "pendente" (a página
+    # mostraria "Localizando…" para sempre). Salvar a loja de novo ou rodar
+    # manage.py geocode_lojas tenta outra vez. Só se ninguém gravou depois.
+    campos = {"geocodificacao": "indisponivel", "latitude": None, "longitude": None}
+    _gravar(Loja.objects.filter(id=loja_id, geocodificacao="pendente"), loja_id, campos)
+
+
+def _gravar(lojas, loja_id, campos):
+    if not lojas.update(**campos):
+        return
+
+    # update() não dispara o post_save: mesmas invalidações do signal de Loja
+    geo.invalidar()
+    referencia.invalidar(referencia.LOJAS)
+    try:
+        avisar_grupo(geocode.GRUPO, {"type": "loja_geocodificada", "loja_id": loja_id, **campos})
+    except Exception:
+        # o dado já está gravado; a página mostra na próxima carga
+        logger.warning("geocodificação: falha ao avisar a loja %s", loja_id, exc_info=True)
+
+
+@fila.tarefa(tentativas=3)
+def avisar_grupo(grupo, evento):
+    """group_send fora do request (mensagens do chat, avisos)."""
+    layer = get_channel_layer()
+    if layer is not None:
+        async_to_sync(layer.group_send)(grupo, evento)
@@ -1,3 +1,703 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from rotas.models import HistoricoStatusTransferencia, Loja, Parada, Rota, Transferencia
+from rotas.services import eta, fila, geocode, lead_time, particoes, rastreio, referencia, resiliente
+from rotas.services.redis_conn import get_redis
+from rotas.services.transicoes import coletar_transferencias, entregar_transferencias
+
+User = get_user_model()
+
+
+class RastreioTests(SimpleTestCase):
+    def test_empacotar_ida_e_volta(self):
+        pontos = [(1_700_000_000, -23.550520, -46.633308), (1_700_000_005, -23.550600, -46.633400)]
+        blob = rastreio.empacotar(pontos)
+
+        self.assertEqual(len(blob), 12 * len(pontos))
+        self.assertEqual(rastreio.desempacotar(blob), pontos)
+
+    def test_epoch_depois_de_2038(self):
+        pontos = [(4_102_444_800, -23.5, -46.6)]          # 2100-01-01
+        self.assertEqual(rastreio.desempacotar(rastreio.empacotar(pontos)), pontos)
+
+    def test_douglas_peucker_remove_pontos_colineares(self):
+        # reta de ~1km com ruído < 1m, mais um desvio de ~100m no meio
+        reta = [(i, -23.55 + i * 0.0001, -46.63) for i in range(100)]
+        reta[50] = (50, reta[50][1], -46.629)
+
+        simplificado = rastreio.douglas_peucker(reta, tolerancia_m=15)
+
+        self.assertEqual([p[0] for p in simplificado], [0, 49, 50, 51, 99])
+
+    def test_validar_pontos_descarta_invalidos(self):
+        from django.utils import timezone
+
+        agora = timezone.now()
+        t = int(agora.timestamp())
+        validos = rastreio.validar_pontos(
+            [[t, -23.5, -46.6], [t, 91, 0], ["x", 1, 1], [t - 3 * 86400, -23.5, -46.6]],
+            agora=agora,
+        )
+        self.assertEqual(validos, [(t, -23.5, -46.6)])
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class PosicaoConsumerTests(TransactionTestCase):
+    # database_sync_to_async fecha a conexão: TestCase perderia a transação do teste
+    async def test_rota_finalizada_com_socket_aberto_para_de_aceitar(self):
+        from channels.testing import WebsocketCommunicator
+        from django.utils import timezone
+
+        from rotas.consumers import PosicaoConsumer
+
+        moto = await User.objects.acreate(username="moto")
+        rota = await Rota.objects.acreate(nome="R1", motoboy=moto, status="em_rota")
+        ws = WebsocketCommunicator(PosicaoConsumer.as_asgi(), f"/ws/rotas/{rota.id}/posicao/")
+        ws.scope["user"] = moto
+        ws.scope["url_route"] = {"kwargs": {"rota_id": rota.id}}
+        conectado, _ = await ws.connect()
+        self.assertTrue(conectado)
+        ponto = [int(timezone.now().timestamp()), -23.5, -46.6]
+
+        with mock.patch.object(rastreio, "registrar_pontos") as registrar:
+            await ws.send_json_to({"pontos": [ponto]})
+            await ws.receive_json_from()
+            await Rota.objects.filter(id=rota.id).aupdate(status="finalizada")
+            await ws.send_json_to({"pontos": [ponto]})
+            self.assertTrue(await ws.receive_nothing())
+        self.assertEqual(registrar.call_count, 1)
+        await ws.disconnect()
+
+    async def test_motoboy_nao_acompanha_a_rota_de_outro(self):
+        from channels.testing import WebsocketCommunicator
+        from django.contrib.auth.models import Permission
+
+        from rotas.consumers import PosicaoConsumer
+
+        motoboys = await Group.objects.acreate(name="Motoboy")
+        await motoboys.permissions.aadd(await Permission.objects.aget(codename="view_rota"))
+        dono = await User.objects.acreate(username="dono")
+        outro = await User.objects.acreate(username="outro")
+        await motoboys.user_set.aadd(dono, outro)
+        rota = await Rota.objects.acreate(nome="R1", motoboy=dono, status="em_rota")
+
+        for usuario, conecta in ((outro, False), (dono, True)):
+            ws = WebsocketCommunicator(PosicaoConsumer.as_asgi(), f"/ws/rotas/{rota.id}/posicao/")
+            ws.scope["user"] = usuario
+            ws.scope["url_route"] = {"kwargs": {"rota_id": rota.id}}
+            conectado, _ = await ws.connect()
+            self.assertEqual(conectado, conecta)
+            await ws.disconnect()
+
+
+class EtaTests(TestCase):
+    def setUp(self):
+        cache.delete(eta.CACHE_KEY)
+        self.a = Loja.objects.create(nome="A", cidade="SP")
+        self.b = Loja.objects.create(nome="B", cidade="SP")
+        self.c = Loja.objects.create(nome="C", cidade="SP")
+        inicio = datetime(2026, 1, 5, 8, tzinfo=dt_timezone.utc)
+
+        # histórico: A -> B leva 10, 12, 14 min; B -> C leva 30 min
+        for dia, minutos in enumerate([10, 12, 14]):
+            rota = Rota.objects.create(nome=f"H{dia}")
+            t0 = inicio + timedelta(days=dia)
+            for ordem, (loja, t) in enumerate([
+                (self.a, t0),
+                (self.b, t0 + timedelta(minutes=minutos)),
+                (self.c, t0 + timedelta(minutes=minutos + 30)),
+            ], start=1):
+                Parada.objects.create(rota=rota, loja=loja, ordem=ordem, status="coletado", collected_at=t)
+
+    def test_treinar_mediana_por_trecho(self):
+        modelo = eta.treinar()
+
+        self.assertEqual(modelo["amostras"], 6)
+        self.assertEqual(modelo["trechos"][(self.a.id, self.b.id)], 12 * 60)
+        self.assertEqual(modelo["trechos"][(self.b.id, self.c.id)], 30 * 60)
+        self.assertEqual(modelo["lojas"][self.c.id], 30 * 60)
+
+    def test_prever_rota_a_partir_da_ultima_coleta(self):
+        agora = datetime(2026, 2, 1, 9, tzinfo=dt_timezone.utc)
+        rota = Rota.objects.create(nome="Hoje")
+        pa = Parada.objects.create(rota=rota, loja=self.a, ordem=1, status="coletado",
+                                   collected_at=agora - timedelta(minutes=5))
+        pb = Parada.objects.create(rota=rota, loja=self.b, ordem=2)
+        pc = Parada.objects.create(rota=rota, loja=self.c, ordem=3)
+
+        previsoes = eta.prever_rotas([rota.id], agora=agora)
+
+        self.assertNotIn(pa.id, previsoes)
+        self.assertEqual(previsoes[pb.id], agora + timedelta(minutes=7))
+        self.assertEqual(previsoes[pc.id], agora + timedelta(minutes=37))
+
+
+class IndiceVersaoTests(TestCase):
+    def setUp(self):
+        from rotas.services import geo
+
+        self.geo = geo
+        geo._indice = None
+        patcher = mock.patch.object(geo, "get_redis", return_value=_VersaoFalsa())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_loja_salva_em_outro_processo_remonta_o_indice(self):
+        Loja.objects.create(nome="A", cidade="SP", latitude=-23.55, longitude=-46.63)
+        antes = self.geo.get_indice()
+        self.assertIs(self.geo.get_indice(), antes)
+
+        # o worker geocodificou uma loja: só a versão no Redis é compartilhada
+        Loja.objects.bulk_create([Loja(nome="B", cidade="SP", latitude=-23.56, longitude=-46.64)])
+        self.assertIs(self.geo.get_indice(), antes)
+        self.geo.invalidar()
+        self.assertEqual(len(self.geo.get_indice().ids), 2)
+
+    def test_sem_redis_monta_a_cada_consulta(self):
+        from redis.exceptions import ConnectionError as RedisConnectionError
+
+        self.geo.get_redis.return_value = mock.Mock(get=mock.Mock(side_effect=RedisConnectionError))
+        with self.assertLogs("rotas.services.geo", level="WARNING"):
+            self.assertIsNone(self.geo.versao())
+            self.assertIsNot(self.geo.get_indice(), self.geo.get_indice())
+
+
+class IndiceLojasTests(SimpleTestCase):
+    def setUp(self):
+        from rotas.services.geo import IndiceLojas
+
+        # grade 20x20 de lojas a cada ~1km em volta do centro de SP
+        self.lojas = [
+            {"id": i * 20 + j + 1, "nome": f"L{i}-{j}", "latitude": -23.6 + i * 0.009, "longitude": -46.7 + j * 0.009}
+            for i in range(20) for j in range(20)
+        ]
+        self.indice = IndiceLojas(self.lojas)
+
+    def test_proximas_igual_forca_bruta(self):
+        from rotas.services.geo import haversine_km
+
+        for lat, lng in [(-23.55, -46.63), (-23.61, -46.71), (-23.40, -46.50)]:
+            esperado = sorted(
+                self.lojas,
+                key=lambda l: haversine_km(lat, lng, l["latitude"], l["longitude"]),
+            )[:7]
+            obtido = self.indice.proximas(lat, lng, k=7)
+            self.assertEqual([i for i, _ in obtido], [l["id"] for l in esperado])
+
+    def test_proximas_exclui_e_respeita_raio(self):
+        obtido = self.indice.proximas(-23.6, -46.7, k=5, raio_km=1.5, excluir={1})
+        self.assertNotIn(1, [i for i, _ in obtido])
+        self.assertTrue(all(d <= 1.5 for _, d in obtido))
+
+    def test_agrupar_conserva_total(self):
+        marcadores = self.indice.agrupar(-24, -47, -23, -46, zoom=11)
+        self.assertEqual(sum(m["qtd"] for m in marcadores), 400)
+        self.assertLess(len(marcadores), 400)
+
+        soltos = self.indice.agrupar(-23.6, -46.7, -23.59, -46.69, zoom=18)
+        self.assertTrue(all(m["qtd"] == 1 and "id" in m for m in soltos))
+
+
+class HistoricoStatusTests(TestCase):
+    def setUp(self):
+        # CDs vêm do cache de lojas versionado no Redis (sem Redis, cada delta relê as lojas)
+        patcher = mock.patch.object(referencia, "get_redis", return_value=_VersaoFalsa())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        referencia.limpar()
+        self.addCleanup(referencia.limpar)
+        self.destino = Loja.objects.create(nome="Destino", cidade="SP")
+        self.origem = Loja.objects.create(nome="Origem", cidade="SP")
+        self.t0 = datetime(2026, 3, 2, 8, tzinfo=dt_timezone.utc)
+
+    def _transferencias(self, n):
+        ts = [
+            Transferencia.objects.create(tipo="saida", loja_origem=self.origem, loja_destino=self.destino)
+            for _ in range(n)
+        ]
+        # criado_em é auto_now_add: fixa o início do ciclo (e o registro de criação)
+        Transferencia.objects.filter(id__in=[t.id for t in ts]).update(criado_em=self.t0)
+        HistoricoStatusTransferencia.objects.filter(transferencia__in=ts).update(em=self.t0)
+        return ts
+
+    def test_transicao_em_lote_grava_uma_linha_por_transferencia(self):
+        ts = self._transferencias(3)
+        qs = Transferencia.objects.filter(id__in=[t.id for t in ts])
+
+        with self.assertNumQueries(5):  # savepoint + select for update + UPDATE + INSERT + release
+            coletar_transferencias(qs, None, self.t0 + timedelta(minutes=30))
+
+        self.assertEqual(
+            list(HistoricoStatusTransferencia.objects.filter(transferencia=ts[0]).values_list("de", "para")),
+            [("", "pendente"), ("pendente", "em_transito")],
+        )
+        with self.assertRaises(ValueError):
+            HistoricoStatusTransferencia.objects.first().save()
+
+    def test_instancia_adiada_le_o_estado_gravado(self):
+        (t,) = self._transferencias(1)
+        adiada = Transferencia.objects.only("id", "nome_produto").get(id=t.id)
+        adiada.nome_produto = "Outro"
+        with mock.patch("rotas.services.paletes.invalidar") as invalidar:
+            adiada.save()
+        invalidar.assert_not_called()
+        self.assertEqual(HistoricoStatusTransferencia.objects.filter(transferencia=t).count(), 1)
+
+        adiada = Transferencia.objects.only("id").get(id=t.id)
+        adiada.status = "em_transito"
+        adiada.save(update_fields=["status"])
+        self.assertEqual(
+            list(HistoricoStatusTransferencia.objects.filter(transferencia=t).order_by("id").values_list("de", "para")),
+            [("", "pendente"), ("pendente", "em_transito")],
+        )
+
+    def test_percentis_por_loja_e_motorista(self):
+        motoboy = User.objects.create_user("moto")
+        ts = self._transferencias(10)
+        # coleta leva 10, 20, ..., 100 min; entrega sempre 30 min depois
+        for i, t in enumerate(ts, start=1):
+            coletado = self.t0 + timedelta(minutes=10 * i)
+            coletar_transferencias(Transferencia.objects.filter(id=t.id), motoboy, coletado)
+            entregar_transferencias(Transferencia.objects.filter(id=t.id), motoboy, coletado + timedelta(minutes=30))
+
+        r = lead_time.calcular(desde=self.t0 - timedelta(days=1), ate=self.t0 + timedelta(days=1))
+
+        self.assertEqual(r["transferencias"], 10)
+        loja = r["lojas"][self.destino.id]
+        self.assertEqual(loja["coleta"]["n"], 10)
+        self.assertEqual(loja["coleta"]["p50"], 50 * 60)
+        self.assertEqual(loja["coleta"]["p90"], 90 * 60)
+        self.assertEqual(loja["entrega"]["p95"], 30 * 60)
+        self.assertEqual(r["motoristas"][motoboy.id]["total"]["p50"], 80 * 60)
+
+
+class GerarDadosTests(TestCase):
+    def test_gera_quantidades_da_escala(self):
+        from chat.models import Mensagem
+        from rotas.management.commands.gerar_dados import dimensionar, gerar
+
+        dados = gerar(300)
+        n = dimensionar(300)
+
+        self.assertEqual(Loja.objects.filter(nome__startswith="SYN ").count(), n["lojas"])
+        self.assertEqual(Loja.objects.filter(is_cd=True).count(), 1)
+        self.assertEqual(Transferencia.objects.count(), 300)
+        self.assertEqual(Mensagem.objects.count(), 300)
+        self.assertEqual(Parada.objects.filter(rota_id=dados["rota_id"]).count(), n["paradas_por_rota"])
+        self.assertTrue(User.objects.filter(id=dados["motoboy_id"], groups__name="Motoboy").exists())
+
+
+class _VersaoFalsa:
+    """Só o get/incr que o cache de referência usa do Redis."""
+
+    def __init__(self):
+        self.versoes = {}
+
+    def get(self, chave):
+        return self.versoes.get(chave)
+
+    def incr(self, chave):
+        self.versoes[chave] = self.versoes.get(chave, 0) + 1
+
+
+class ReferenciaTests(TestCase):
+    def setUp(self):
+        self.redis = _VersaoFalsa()
+        patcher = mock.patch.object(referencia, "get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        referencia.limpar()
+        self.addCleanup(referencia.limpar)
+
+    def test_acerta_ate_a_versao_mudar(self):
+        Loja.objects.create(nome="B", cidade="SP")
+        Loja.objects.create(nome="Inativa", cidade="SP", ativa=False)
+
+        with self.assertNumQueries(1):
+            self.assertEqual([l.nome for l in referencia.lojas_ativas()], ["B"])
+            referencia.lojas_ativas()
+
+        # outro processo salvou uma loja
+        self.redis.incr("referencia:lojas:versao")
+        with self.assertNumQueries(1):
+            referencia.lojas_ativas()
+        self.assertEqual(referencia.estatisticas()["lojas"], {"hits": 1, "misses": 2})
+
+    def test_signals_invalidam_lojas_e_motoboys(self):
+        u = User.objects.create_user("moto")
+        self.assertFalse(referencia.eh_motoboy(u.id))
+        self.assertIsNone(referencia.loja_do_usuario(u.id))
+
+        u.groups.add(Group.objects.create(name="Motoboy"))
+        Loja.objects.create(nome="A", cidade="SP", usuario=u)
+
+        self.assertTrue(referencia.eh_motoboy(u.id))
+        self.assertEqual(referencia.loja_do_usuario(u.id).nome, "A")
+        self.assertEqual([m["username"] for m in referencia.motoboys()], ["moto"])
+
+
+_executadas = []
+
+
+@fila.tarefa(tentativas=2)
+def _tarefa_teste(valor, falhar=False):
+    if falhar:
+        raise RuntimeError("falhou")
+    _executadas.append(valor)
+
+
+@override_settings(REDIS_URL="redis://127.0.0.1:1/0")
+class FilaTests(TestCase):
+    def setUp(self):
+        get_redis.cache_clear()
+        self.addCleanup(get_redis.cache_clear)
+        _executadas.clear()
+
+    def test_so_enfileira_no_commit_e_sem_redis_roda_no_processo(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            _tarefa_teste.enfileirar("a")
+            self.assertEqual(_executadas, [])
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(_executadas, ["a"])
+
+    def test_falha_reagenda_com_backoff_e_depois_vai_para_mortos(self):
+        redis = mock.MagicMock()
+        worker = fila.Worker(redis=redis)
+        job = {
+            "id": "x", "tarefa": _tarefa_teste.nome, "args": ["b"], "kwargs": {"falhar": True},
+            "tentativa": 0, "enfileirado_em": 0, "disponivel_em": 0,
+        }
+        antes = time.time()
+
+        with self.assertLogs("rotas.services.fila", level="ERROR"):
+            worker.rodar(job)
+        (chave, agendado), _ = redis.zadd.call_args
+        self.assertEqual(chave, fila.AGENDADOS)
+        self.assertEqual(list(agendado), [json.dumps(job)])
+        self.assertGreaterEqual(agendado[json.dumps(job)], antes + fila.BACKOFF_BASE)
+
+        with self.assertLogs("rotas.services.fila", level="ERROR"):
+            worker.rodar(job)
+        redis.lpush.assert_called_once_with(fila.MORTOS, json.dumps(job))
+        self.assertEqual(worker.metricas[_tarefa_teste.nome]["retentativas"], 1)
+        self.assertEqual(worker.metricas[_tarefa_teste.nome]["mortos"], 1)
+
+
+class _FilaFalsa:
+    """Listas e sorted sets, o bastante para o Worker de rotas/services/fila.py."""
+
+    def __init__(self):
+        self.listas = {}
+        self.zsets = {}
+
+    def lpush(self, chave, valor):
+        self.listas.setdefault(chave, []).insert(0, valor)
+
+    def _mover(self, origem, destino, de, para):
+        lista = self.listas.get(origem)
+        if not lista:
+            return None
+        item = lista.pop() if de == "RIGHT" else lista.pop(0)
+        alvo = self.listas.setdefault(destino, [])
+        alvo.append(item) if para == "RIGHT" else alvo.insert(0, item)
+        return item
+
+    def lmove(self, origem, destino, de, para):
+        return self._mover(origem, destino, de, para)
+
+    def blmove(self, origem, destino, espera, de, para):
+        return self._mover(origem, destino, de, para)
+
+    def lrem(self, chave, n, valor):
+        self.listas.get(chave, []).remove(valor)
+
+    def zadd(self, chave, membros):
+        self.zsets.setdefault(chave, {}).update(membros)
+
+    def zrem(self, chave, membro):
+        self.zsets.get(chave, {}).pop(membro, None)
+
+    def zrangebyscore(self, chave, minimo, maximo, start=None, num=None):
+        return [m for m, score in self.zsets.get(chave, {}).items() if minimo <= score <= maximo]
+
+    def zcount(self, chave, minimo, maximo):
+        return sum(1 for score in self.zsets.get(chave, {}).values() if score >= minimo)
+
+    def hset(self, *args, **kwargs):
+        pass
+
+
+class WorkerRecuperacaoTests(SimpleTestCase):
+    def setUp(self):
+        _executadas.clear()
+        self.redis = _FilaFalsa()
+
+    def _job(self, valor):
+        return json.dumps({
+            "id": valor, "tarefa": _tarefa_teste.nome, "args": [valor], "kwargs": {},
+            "tentativa": 0, "enfileirado_em": 0, "disponivel_em": 0,
+        })
+
+    def test_job_so_sai_do_processamento_depois_de_rodar(self):
+        worker = fila.Worker(redis=self.redis)
+        self.redis.lpush(fila.FILA, self._job("a"))
+
+        with mock.patch.object(worker, "rodar", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                worker.uma_vez()
+        self.assertEqual(len(self.redis.listas[worker.processando]), 1)
+
+        worker.uma_vez()      # o job interrompido não está mais na fila
+        self.assertEqual(_executadas, [])
+
+        # o worker sobe de novo com o mesmo nome (mesmo host/pid no container)
+        self.assertEqual(fila.Worker(redis=self.redis).iniciar(), 1)
+        worker.uma_vez()
+        self.assertEqual(_executadas, ["a"])
+        self.assertEqual(self.redis.listas[worker.processando], [])
+
+    def test_lista_de_worker_morto_volta_para_a_fila(self):
+        morto = fila.Worker(redis=self.redis)
+        morto.nome, morto.processando = "morto:1", fila.PROCESSANDO.format(nome="morto:1")
+        morto.renovar()
+        self.redis.lpush(fila.FILA, self._job("b"))
+        self.redis.blmove(fila.FILA, morto.processando, 1, "RIGHT", "LEFT")   # morreu aqui
+
+        vivo = fila.Worker(redis=self.redis)
+        self.assertEqual(vivo.iniciar(), 0)               # ainda dentro do prazo
+
+        self.redis.zsets[fila.WORKERS]["morto:1"] = time.time() - 1
+        with self.assertLogs("rotas.services.fila", level="WARNING"):
+            self.assertEqual(vivo.recuperar(), 1)
+        vivo.uma_vez()
+        self.assertEqual(_executadas, ["b"])
+        self.assertNotIn("morto:1", self.redis.zsets[fila.WORKERS])
+
+    def test_sem_worker_vivo_o_job_espera_na_fila(self):
+        with mock.patch.object(fila, "get_redis", return_value=self.redis):
+            with self.assertLogs("rotas.services.fila", level="WARNING"):
+                fila._empurrar(json.loads(self._job("c")))
+            self.assertEqual(_executadas, [])
+
+            worker = fila.Worker(redis=self.redis)
+            worker.iniciar()
+            fila._empurrar(json.loads(self._job("d")))
+        self.assertEqual(len(self.redis.listas[fila.FILA]), 2)
+        while worker.uma_vez():
+            pass
+        self.assertEqual(_executadas, ["c", "d"])
+
+    @override_settings(REDIS_URL="redis://127.0.0.1:1/0")
+    def test_sem_redis_roda_no_processo_com_tentativas_e_desistencia(self):
+        get_redis.cache_clear()
+        self.addCleanup(get_redis.cache_clear)
+        job = json.loads(self._job("e"))
+        job["kwargs"] = {"falhar": True}
+
+        with mock.patch.object(_tarefa_teste, "func", wraps=_tarefa_teste.func) as func, \
+                mock.patch.object(_tarefa_teste, "desistir") as desistir, \
+                self.assertLogs("rotas.services.fila", level="WARNING"):
+            fila._empurrar(job)
+
+        self.assertEqual(func.call_count, _tarefa_teste.tentativas)
+        desistir.assert_called_once_with("e", falhar=True)
+
+
+class _ServidorFalso:
+    """Nominatim de mentira em 127.0.0.1: responde o roteiro [(status, headers, corpo, atraso)]."""
+
+    def __init__(self, roteiro):
+        self.roteiro = list(roteiro)
+        self.chamadas = 0
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                servidor.chamadas += 1
+                status, headers, corpo, atraso = servidor.roteiro.pop(0) if servidor.roteiro else (200, {}, [], 0)
+                time.sleep(atraso)
+                dados = json.dumps(corpo).encode()
+                try:
+                    self.send_response(status)
+                    for nome, valor in headers.items():
+                        self.send_header(nome, valor)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(dados)))
+                    self.end_headers()
+                    self.wfile.write(dados)
+                except OSError:
+                    pass            # cliente desistiu (timeout)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/search"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def fechar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_ACHOU = [{"lat": "-23.5", "lon": "-46.6", "display_name": "Rua A, 10", "type": "house", "address": {}}]
+
+
+class ResilienteTests(SimpleTestCase):
+    def setUp(self):
+        resiliente.limpar()
+        self.addCleanup(resiliente.limpar)
+        for nome, valor in {"RETENTATIVA_BASE": 0, "FALHAS_PARA_ABRIR": 2, "TIMEOUT_MIN": 0.2}.items():
+            p = mock.patch.object(resiliente, nome, valor)
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _servidor(self, *roteiro):
+        s = _ServidorFalso(roteiro)
+        self.addCleanup(s.fechar)
+        return s
+
+    def test_retentativa_depois_de_429_com_retry_after_curto(self):
+        s = self._servidor((429, {"Retry-After": "0"}, [], 0), (200, {}, _ACHOU, 0))
+
+        r = resiliente.get(s.url)
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(s.chamadas, 2)
+        contadores = resiliente.estatisticas()[f"127.0.0.1:{s.httpd.server_port}"]["contadores"]
+        self.assertEqual((contadores["limitado"], contadores["retentativas"], contadores["ok"]), (1, 1, 1))
+
+    def test_retry_after_longo_pausa_o_host_sem_chamar_de_novo(self):
+        s = self._servidor((429, {"Retry-After": "120"}, [], 0))
+
+        with self.assertRaises(resiliente.Indisponivel) as erro:
+            resiliente.get(s.url)
+        self.assertGreater(erro.exception.espera, 100)
+        with self.assertRaises(resiliente.Indisponivel):
+            resiliente.get(s.url)
+        self.assertEqual(s.chamadas, 1)
+
+    def test_disjuntor_abre_e_sonda_meio_aberto_fecha_ou_reabre(self):
+        s = self._servidor((500, {}, [], 0), (500, {}, [], 0), (500, {}, [], 0), (200, {}, _ACHOU, 0))
+        h = resiliente.host(f"127.0.0.1:{s.httpd.server_port}")
+
+        with self.assertLogs("rotas.services.resiliente", level="WARNING"):
+            with self.assertRaisesMessage(resiliente.Indisponivel, "circuito aberto"):
+                resiliente.get(s.url)
+        self.assertEqual((s.chamadas, h.estado), (2, resiliente.ABERTO))
+
+        with mock.patch.object(resiliente, "PAUSA_ABERTO", 0):
+            # sonda falhou: reabre sem retentativa
+            with self.assertLogs("rotas.services.resiliente", level="WARNING"), \
+                    self.assertRaises(resiliente.Indisponivel):
+                resiliente.get(s.url)
+            self.assertEqual((s.chamadas, h.estado), (3, resiliente.ABERTO))
+
+            with self.assertLogs("rotas.services.resiliente", level="INFO"):
+                self.assertEqual(resiliente.get(s.url).status_code, 200)
+        self.assertEqual((s.chamadas, h.estado), (4, resiliente.FECHADO))
+        self.assertEqual(h.contadores["sondas"], 2)
+
+    def test_sem_orcamento_nao_tenta_de_novo(self):
+        s = self._servidor((503, {}, [], 0))
+
+        with mock.patch.object(resiliente, "SALDO_INICIAL", 0):
+            with self.assertRaisesMessage(resiliente.Indisponivel, "sem orçamento"):
+                resiliente.get(s.url)
+        self.assertEqual(s.chamadas, 1)
+
+    def test_timeout_adapta_a_latencia(self):
+        s = self._servidor(*[(200, {}, [], 0)] * 3, (200, {}, [], 0.5))
+        h = resiliente.host(f"127.0.0.1:{s.httpd.server_port}")
+        self.assertEqual(h.timeout()[1], resiliente.TIMEOUT_MAX)
+
+        for _ in range(3):
+            resiliente.get(s.url)
+        self.assertEqual(h.timeout()[1], 0.2)
+
+        with mock.patch.object(resiliente, "TENTATIVAS", 1):
+            with self.assertRaisesMessage(resiliente.Indisponivel, "timeout"):
+                resiliente.get(s.url)
+        self.assertEqual(h.contadores["timeout"], 1)
+
+    def test_geocode_distingue_sem_resultado_de_fora_do_ar(self):
+        s = self._servidor((200, {}, [], 0), (200, {}, _ACHOU, 0), *[(502, {}, [], 0)] * 2)
+        loja = Loja(nome="Loja Sul", endereco="Rua A, 10, Shopping Sul", cidade="SP")
+
+        with mock.patch.object(geocode, "NOMINATIM_SEARCH", s.url):
+            # 1a query vazia, 2a (sem o shopping) acha
+            self.assertEqual(geocode.geocode_loja_com_fallback(loja)[:2], (-23.5, -46.6))
+            with self.assertLogs("rotas.services.resiliente", level="WARNING"), \
+                    self.assertRaises(resiliente.Indisponivel):
+                geocode.geocode_loja_com_fallback(loja)
+        # fora do ar: para na primeira query, sem passar pelas outras
+        self.assertEqual(s.chamadas, 4)
+
+
+class ParticoesTests(TestCase):
+    def setUp(self):
+        self.origem = Loja.objects.create(nome="Origem", cidade="SP")
+        self.destino = Loja.objects.create(nome="Destino", cidade="SP")
+
+    def _transferencia(self, criado_em, status="pendente"):
+        t = Transferencia.objects.create(tipo="saida", loja_origem=self.origem, loja_destino=self.destino, status=status)
+        Transferencia.objects.filter(id=t.id).update(criado_em=criado_em)
+        return t.id
+
+    def _particao_de(self, tid):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM rotas_transferencia WHERE id = %s", [tid])
+            return cursor.fetchone()[0]
+
+    def test_filtro_por_dias_equivale_ao_date(self):
+        ids = [
+            self._transferencia(datetime(2026, 3, d, h, tzinfo=dt_timezone.utc))
+            for d, h in [(1, 0), (1, 23), (2, 12), (3, 0), (4, 8)]
+        ]
+        qs = Transferencia.objects.filter(id__in=ids)
+        inicio, fim = date(2026, 3, 1), date(2026, 3, 3)
+
+        def mesmo(filtro, esperado):
+            self.assertEqual(set(qs.filter(filtro)), set(qs.filter(**esperado)))
+
+        mesmo(particoes.entre_dias(inicio, fim), {"criado_em__date__range": (inicio, fim)})
+        mesmo(particoes.entre_dias(inicio, None), {"criado_em__date__gte": inicio})
+        mesmo(particoes.entre_dias(None, fim), {"criado_em__date__lte": fim})
+        mesmo(particoes.nos_dias([date(2026, 3, 1), date(2026, 3, 4)]),
+              {"criado_em__date__in": [date(2026, 3, 1), date(2026, 3, 4)]})
+        self.assertFalse(qs.filter(particoes.nos_dias([])).exists())
+
+    @skipUnless(connection.vendor == "postgresql", "particionamento só no PostgreSQL")
+    def test_cria_particoes_movendo_da_padrao_e_arquiva_meses_confirmados(self):
+        maio = self._transferencia(datetime(2031, 5, 20, tzinfo=dt_timezone.utc), status="confirmada")
+        junho = self._transferencia(datetime(2031, 6, 15, tzinfo=dt_timezone.utc))
+        self.assertEqual(self._particao_de(junho), particoes.PADRAO)
+
+        criadas = particoes.criar_particoes(meses_a_frente=1, hoje=date(2031, 5, 10))
+
+        self.assertEqual(criadas, ["rotas_transferencia_p2031_05", "rotas_transferencia_p2031_06"])
+        self.assertEqual(self._particao_de(junho), "rotas_transferencia_p2031_06")
+        self.assertEqual(particoes.criar_particoes(meses_a_frente=1, hoje=date(2031, 5, 10)), [])
+
+        situacao = dict(particoes.arquivar(manter_meses=0, hoje=date(2031, 7, 1)))
+        self.assertIn("seria arquivada", situacao["rotas_transferencia_p2031_05"])
+        self.assertTrue(Transferencia.objects.filter(id=maio).exists())
+
+        situacao = dict(particoes.arquivar(manter_meses=0, hoje=date(2031, 7, 1), executar=True))
+        self.assertIn("arquivada em arquivo.", situacao["rotas_transferencia_p2031_05"])
+        self.assertIn("mantida: 1 de 1", situacao["rotas_transferencia_p2031_06"])
+        self.assertFalse(Transferencia.objects.filter(id=maio).exists())
+        self.assertTrue(Transferencia.objects.filter(id=junho).exists())
@@ -0,0 +1,61 @@
+# rotas/widgets.py
+"""
+Select2 com busca no servidor.
+
+Um <select> comum de ModelChoiceField manda a tabela inteira como <option>
+em todo carregamento do formulário. Aqui só as opções já selecionadas vão no
+HTML; o resto vem sob demanda da URL `url_name` (JSON no formato do select2,
+ver painel.views.autocomplete_lojas). A validação continua sendo a do
+queryset do campo — o endpoint só sugere.
+"""
+from urllib.parse import urlencode
+
+from django import forms
+from django.urls import reverse
+
+SELECT2_CSS = "https://cdn.jsdelivr.net/npm/select2@4.1.0-rc.0/dist/css/select2.min.css"
+SELECT2_JS = "https://cdn.jsdelivr.net/npm/select2@4.1.0-rc.0/dist/js/select2.min.js"
+JQUERY_JS = "https://code.jquery.com/jquery-3.6.0.min.js"
+
+
+class AutocompleteSelect(forms.Select):
+    def __init__(self, url_name, attrs=None, params=None, placeholder="Digite para buscar..."):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.params = params or {}
+        self.placeholder = placeholder
+
+    class Media:
+        css = {"all": (SELECT2_CSS,)}
+        js = (JQUERY_JS, SELECT2_JS, "rotas/autocomplete.js")
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        url = reverse(self.url_name)
+        if self.params:
+            url += "?" + urlencode(self.params)
+        attrs["data-autocomplete-url"] = url
+        attrs["data-placeholder"] = self.placeholder
+        attrs["class"] = f"{attrs.get('class', '')} js-autocomplete".strip()
+        return attrs
+
+    def use_required_attribute(self, initial):
+        # o <select> fica escondido pelo select2; "required" nele só trava o submit
+        return False
+
+    def optgroups(self, name, value, attrs=None):
+        selecionados = [v for v in value if str(v).isdigit()]
+        opcoes = []
+        if not self.allow_multiple_selected:
+            opcoes.append(self.create_option(name, "", "", not selecionados, 0))
+        if selecionados:
+            campo = self.choices.field
+            for obj in self.choices.queryset.filter(pk__in=selecionados):
+                opcoes.append(self.create_option(
+                    name, campo.prepare_value(obj), campo.label_from_instance(obj), True, len(opcoes),
+                ))
+        return [(None, [opcao], i) for i, opcao in enumerate(opcoes)]
+
+
+class AutocompleteSelectMultiple(AutocompleteSelect, forms.SelectMultiple):
+    pass